@@ -9,7 +9,6 @@ import math
 import os
 import json
 import uuid
-from requests.adapters import HTTPAdapter, Retry
 
 
 st.markdown("""
@@ -54,32 +53,26 @@ def _load_data():
         st.error(f"Import error loading ecm_scheduler_logic: {e}")
         st.stop()
 
-    for name in ("load_all_data_from_sheets", "load_data_from_sheets", "load_all_data", "load_data"):
+    for name in ("ensure_master_data", "load_all_data_from_sheets", "load_data_from_sheets", "load_all_data", "load_data"):
         if hasattr(ecm, name):
             return getattr(ecm, name)()
 
     st.error(
         "Couldn’t find a data-loading function in ecm_scheduler_logic.py.\n"
-        "Expected one of: load_all_data_from_sheets | load_data_from_sheets | load_all_data | load_data"
+        "Expected one of: ensure_master_data | load_all_data_from_sheets | load_data_from_sheets | load_all_data | load_data"
     )
     st.stop()
 
 import streamlit as st
-if not st.session_state.get("data_loaded", False):
-    _load_data()
-    st.session_state["data_loaded"] = True
+# Master data is loaded once per process and shared by every session; this is a
+# cheap lookup after the first load and picks up versions swapped in by a refresh.
+_load_data()
+st.session_state["data_loaded"] = True
 # === END: DATA LOADER ===
-from geopy.geocoders import Nominatim
 from datetime import timezone
-from reportlab.lib.pagesizes import letter
 import calendar
-from reportlab.lib import colors
 from io import BytesIO
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics.charts.barcharts import VerticalBarChart
-from reportlab.graphics.charts.piecharts import Pie
+# reportlab / PyPDF2 are imported inside the PDF builders so they load only when a PDF is made.
 
 st.set_page_config(layout="wide")
 
@@ -453,9 +446,12 @@ def generate_daily_planner_pdf(report_date, jobs_for_day):
     Daily planner PDF with correct font name and all previous fixes.
     """
     from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
     from reportlab.lib.units import inch
     from datetime import time as _time, datetime as _dt, timedelta as _td
     from collections import Counter
+    from typing import Optional
 
     # --- HELPER FUNCTION (Correctly nested inside) ---
     def get_location_abbr(job, direction):
@@ -518,8 +514,7 @@ def generate_daily_planner_pdf(report_date, jobs_for_day):
     if ref_ramp_id:
         ramp_obj = ecm.get_ramp_details(ref_ramp_id)
         if ramp_obj and getattr(ramp_obj, "noaa_station_id", None):
-            tide_map = ecm.fetch_noaa_tides_for_range(ramp_obj.noaa_station_id, report_date, report_date) or {}
-            readings = tide_map.get(report_date, [])
+            readings = ecm.get_tides_for_day(ramp_obj.noaa_station_id, report_date)
             highs = [t for t in readings if t.get("type") == "H"]
             lows = [t for t in readings if t.get("type") == "L"]
             if highs:
@@ -569,27 +564,21 @@ def generate_daily_planner_pdf(report_date, jobs_for_day):
     c.line(margin, top_y, margin, bottom_y); c.line(width - margin, top_y, width - margin, bottom_y)
     c.line(margin, bottom_y, width - margin, bottom_y); c.line(margin, top_y, width - margin, top_y)
     
-    _window_cache: dict[tuple[str, datetime.date], list[tuple[datetime.time, datetime.time]]] = {}
-    def tide_windows_for_day(ramp_id: str, day: datetime.date):
-        key = (str(ramp_id), day)
-        if key in _window_cache: return _window_cache[key]
+    _window_cache: dict[tuple, list[tuple[datetime.time, datetime.time]]] = {}
+    def tide_windows_for_day(ramp_id: str, day: datetime.date, boat=None, service_type=None):
+        """Legal start windows for a job, from the same season window table the slot search uses.
+        Returns None when there is no ramp to check against."""
         ramp = ecm.get_ramp_details(str(ramp_id)) if ramp_id else None
-        if not ramp: _window_cache[key] = []; return _window_cache[key]
-        station = getattr(ramp, "noaa_station_id", None)
-        method = (getattr(ramp, "tide_method", None) or getattr(ramp, "tide_rule", None) or "AnyTide")
-        if not station or str(method) == "AnyTide": _window_cache[key] = [(_time(0, 0), _time(23, 59))]; return _window_cache[key]
-        tide_map = ecm.fetch_noaa_tides_for_range(str(station), day, day) or {}; readings = tide_map.get(day, [])
-        pad = getattr(ramp, "window_minutes_each_side", 60); use_high = getattr(ramp, "uses_high_tide", True)
-        windows: list[tuple[_time, _time]] = []
-        for t in readings:
-            if (use_high and t.get("type") != "H") or (not use_high and t.get("type") != "L"): continue
-            tt = t.get("time")
-            if not isinstance(tt, _time): continue
-            center = _dt.combine(day, tt); start = (center - _td(minutes=pad)).time(); end = (center + _td(minutes=pad)).time()
-            windows.append((start, end))
-        _window_cache[key] = windows; return windows
-    def time_within_any_window(check_time: _time, windows: list[tuple[_time, _time]]):
-        if not windows: return True
+        if not ramp: return None
+        shallow = ecm.is_shallow_draft(boat)
+        is_sail = "sail" in (getattr(boat, "boat_type", "") or "").lower()
+        key = (str(ramp_id), day, shallow, service_type, is_sail)
+        if key not in _window_cache:
+            ramp_windows = ecm.ramp_tide_windows(ramp, shallow, day)
+            _window_cache[key] = ecm.minute_windows_to_times(ecm.legal_start_windows(ramp_windows, service_type, is_sail))
+        return _window_cache[key]
+    def time_within_any_window(check_time: _time, windows: Optional[list[tuple[_time, _time]]]):
+        if windows is None: return True
         for a, b in windows:
             if a <= b and a <= check_time <= b: return True
             if a > b and (check_time >= a or check_time <= b): return True
@@ -597,10 +586,24 @@ def generate_daily_planner_pdf(report_date, jobs_for_day):
 
     # ---- Draw jobs ----
     sorted_jobs = sorted(jobs_for_day, key=lambda j: j.scheduled_start_datetime)
-    last_truck_locs = {}
     yard_coords = ecm.get_location_coords(address=ecm.YARD_ADDRESS)
     def _mins_between(t1, t2): return (t2.hour * 60 + t2.minute) - (t1.hour * 60 + t1.minute)
 
+    # Travel to each job's pickup from its truck's previous drop-off (or the yard), all legs in one call
+    last_truck_locs, leg_jobs, leg_starts, leg_ends = {}, [], [], []
+    for job in sorted_jobs:
+        hauling_truck_name = id_to_name_map.get(str(job.assigned_hauling_truck_id))
+        if not (hauling_truck_name and hauling_truck_name in column_map):
+            continue
+        prev_loc = last_truck_locs.get(hauling_truck_name, yard_coords)
+        pickup_loc = ecm.get_location_coords(address=job.pickup_street_address, ramp_id=job.pickup_ramp_id, boat_id=job.boat_id)
+        if prev_loc and pickup_loc:
+            leg_jobs.append(job); leg_starts.append(prev_loc); leg_ends.append(pickup_loc)
+        dropoff_loc = ecm.get_location_coords(address=job.dropoff_street_address, ramp_id=job.dropoff_ramp_id, boat_id=job.boat_id)
+        if dropoff_loc:
+            last_truck_locs[hauling_truck_name] = dropoff_loc
+    travel_miles = dict(zip(map(id, leg_jobs), ecm.haversine_miles_legs(leg_starts, leg_ends).tolist())) if leg_jobs else {}
+
     for job in sorted_jobs:
         start_time = max(job.scheduled_start_datetime.time(), start_time_obj)
         end_time   = job.scheduled_end_datetime.time()
@@ -626,26 +629,20 @@ def generate_daily_planner_pdf(report_date, jobs_for_day):
             origin_abbr = get_location_abbr(job, "origin")
             dest_abbr = get_location_abbr(job, "destination")
             c.drawCentredString(text_x, line3_y, f"{origin_abbr}-{dest_abbr}")
-            prev_loc = last_truck_locs.get(hauling_truck_name, yard_coords)
-            pickup_loc = ecm.get_location_coords(address=job.pickup_street_address, ramp_id=job.pickup_ramp_id, boat_id=job.boat_id)
             distance_str = "Travel: -- mi"
-            if prev_loc and pickup_loc:
-                dist_miles = ecm._calculate_distance_miles(prev_loc, pickup_loc)
-                distance_str = f"Travel: {dist_miles:.1f} mi"
+            if id(job) in travel_miles:
+                distance_str = f"Travel: {travel_miles[id(job)]:.1f} mi"
             
             # ------------------- THIS IS THE FIX -------------------
             c.setFont("Helvetica-Oblique", 7)
             # -------------------------------------------------------
 
             c.drawCentredString(text_x, line4_y, distance_str)
-            dropoff_loc = ecm.get_location_coords(address=job.dropoff_street_address, ramp_id=job.dropoff_ramp_id, boat_id=job.boat_id)
-            if dropoff_loc:
-                last_truck_locs[hauling_truck_name] = dropoff_loc
             c.setLineWidth(lw); c.line(text_x, y0, text_x, y_end)
             c.setLineWidth(JOB_OUTLINE_W); c.line(text_x - 10, y_end, text_x + 10, y_end)
             ramp_id = job.dropoff_ramp_id or job.pickup_ramp_id
-            job_windows = tide_windows_for_day(ramp_id, report_date)
-            if not time_within_any_window(start_time, job_windows):
+            job_windows = tide_windows_for_day(ramp_id, report_date, boat, job.service_type)
+            if not time_within_any_window(job.scheduled_start_datetime.time(), job_windows):
                 c.saveState(); c.setFillColor(colors.Color(1, 0.85, 0.85, alpha=0.9))
                 c.rect(text_x - 48, y0 - 62, 96, 12, fill=1, stroke=0)
                 c.setFillColorRGB(0.8, 0, 0)
@@ -706,14 +703,19 @@ def generate_multi_day_planner_pdf(start_date, end_date, jobs):
 
 #### Detailed report generation
 
-from reportlab.graphics.charts.legends import Legend
-from reportlab.graphics.shapes import Rect
-
 def generate_progress_report_pdf(stats, eff_analysis):
     """
     MODIFIED: Generates a multi-page PDF progress report. The detailed boat status list has been removed.
     BUG FIX: Replaced chart data source to correctly show all weekdays.
     """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.graphics.shapes import Drawing, Rect
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.charts.piecharts import Pie
+    from reportlab.graphics.charts.legends import Legend
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
     story = []
@@ -1091,8 +1093,7 @@ def show_scheduler_page():
                     try:
                         sid = getattr(ecm, "_station_for_ramp_or_scituate", None)
                         station_id = sid(str(selected_ramp_id)) if (sid and selected_ramp_id) else None
-                        tides_by_day = ecm.fetch_noaa_tides_for_range(station_id, req_date, req_date) if station_id else {}
-                        events = tides_by_day.get(req_date, []) or []
+                        events = ecm.get_tides_for_day(station_id, req_date) if station_id else []
                         highs = [e.get("time") for e in events if e.get("type") == "H" and hasattr(e.get("time"), "hour")]
                         if highs:
                             primary = min(highs, key=lambda t: abs((t.hour * 60 + t.minute) - 12 * 60))
@@ -1502,6 +1503,35 @@ def show_reporting_page():
                 clear_cancel_prompt()
 
 
+def show_settings_page():
+    """Settings page: the batch job generator, optionally as a what-if run that saves nothing."""
+    st.header("Settings")
+    st.subheader("Job Generator")
+    st.info("Generates requests for boats with no job yet and books the best slot for each. "
+            "A what-if run keeps its bookings in this session only; commit or discard them "
+            "from the debug log on the Schedule New Boat page.")
+
+    g_col1, g_col2, g_col3 = st.columns(3)
+    total_jobs = g_col1.number_input("Jobs to generate:", min_value=1, max_value=500, value=25, step=5)
+    service_type = g_col2.selectbox("Service:", ["Launch", "Haul"], key="generator_service_type")
+    season = g_col3.selectbox("Season:", ["Spring", "Fall"], key="generator_season")
+    y_col, s_col, w_col = st.columns(3)
+    year = y_col.number_input("Year:", min_value=2024, max_value=2100, value=datetime.date.today().year)
+    seed = s_col.number_input("Random seed (0 = none):", min_value=0, value=0)
+    what_if = w_col.checkbox("What-if (don't save)", value=True, key="generator_what_if")
+
+    if st.button("Run Generator", key="run_generator_button"):
+        with st.spinner("Scheduling generated requests..."):
+            summary, failures = ecm.simulate_job_requests(
+                int(total_jobs), service_type, int(year), seed=int(seed) or None,
+                season=season.lower(), what_if=what_if,
+            )
+        st.success(summary)
+        if failures:
+            st.warning(f"{len(failures)} requests could not be scheduled.")
+            st.dataframe(pd.DataFrame(failures), use_container_width=True)
+
+
 # --- Weekday aggregation helper (Mon=0 ... Sun=6) ---
 def build_weekday_counts(jobs, tz="America/New_York", include_weekends=True):
     """
@@ -1575,7 +1605,7 @@ def initialize_session_state():
     for key, default_value in defaults.items():
         if key not in st.session_state: st.session_state[key] = default_value
     if not st.session_state.get('data_loaded'):
-        ecm.load_all_data_from_sheets()
+        ecm.ensure_master_data()
         st.session_state.data_loaded = True
 initialize_session_state()
 
@@ -1641,6 +1671,32 @@ if app_mode == "Schedule New Boat":
     with st.expander("Show Debug Log for Last Batch Run", expanded=False):
         log_output = st.session_state.get('last_batch_debug_log', 'No batch log available. Run the generator from the Settings page.')
         st.text_area("Debug Output:", log_output, height=500, key="debug_log_text_area")
+        what_if_jobs = ecm.get_what_if_jobs()
+        if what_if_jobs:
+            st.caption(f"{len(what_if_jobs)} what-if bookings from simulation runs, not saved.")
+            commit_col, discard_col = st.columns(2)
+            if commit_col.button("Commit what-if bookings", key="commit_what_if"):
+                saved, message = ecm.commit_what_if_jobs()
+                if saved:
+                    st.success(message)
+                    st.rerun()
+            if discard_col.button("Discard what-if bookings", key="discard_what_if"):
+                ecm.discard_what_if_jobs()
+                st.rerun()
+        cache_stats = ecm.get_legal_window_cache_stats()
+        st.caption(
+            f"Tide window cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%}), {cache_stats['size']}/{cache_stats['max_size']} entries."
+        )
+        status = ecm.get_master_data_status()
+        if status["source"]:
+            st.caption(
+                f"Master data v{status['version']} from {status['source']} ({status['loaded_at']:%Y-%m-%d %H:%M} UTC)"
+                + (", refreshing…" if status["refreshing"] else "")
+                + (f"; last refresh failed: {status['last_error']}" if status["last_error"] else "")
+            )
+        if ecm.LOAD_TIMINGS:
+            st.caption("Startup load: " + ", ".join(f"{name} {secs:.2f}s" for name, secs in ecm.LOAD_TIMINGS.items()))
 elif app_mode == "Reporting":
     show_reporting_page()
 elif app_mode == "Settings":
@@ -0,0 +1,274 @@
+"""
+Batch scheduler for season-opening request queues.
+
+Reads a CSV of launch/haul requests (boat_id, service_type, requested_date,
+ramp), runs each through the slot search in file order against an in-memory
+copy of the schedule -- every proposal is booked before the next request is
+searched -- and writes the proposed assignments and the failures as CSVs.
+Nothing is written to the database; review the proposals, then save them.
+
+Master data and the current jobs come from the on-disk snapshot the app
+writes (ecm_snapshot.pkl, or $ECM_SNAPSHOT_PATH). Coordinates come from the
+snapshot and the geocode cache only (no live geocoding; fill the cache with
+warm_geocode_cache.py), so boats whose town is in neither are measured from
+the yard. Town-to-ramp minutes come from --travel-matrix, else from the
+road matrix build_road_matrix.py writes, if there is one.
+
+    python batch_schedule.py requests.csv [--out proposals.csv] [--failures failures.csv]
+        [--snapshot PATH] [--travel-matrix Town_to_Ramp_Matrix.csv]
+        [--max-distance 10] [--strict-truck] [--optimize SECONDS]
+
+--optimize assigns the whole batch jointly (ecm_scheduler_optimizer) to use
+fewer truck-days and deadhead miles, instead of taking each request's top
+slot in file order.
+
+requested_date is YYYY-MM-DD. ramp is a ramp id or ramp name; blank means
+the boat's preferred ramp.
+"""
+import argparse
+import csv
+import datetime as dt
+import os
+import sys
+from time import perf_counter
+
+import ecm_scheduler_logic as ecm
+from ecm_road_network import RoadTravelTimes
+from ecm_scheduler_core import Job
+from ecm_scheduler_engine import (
+    DEFAULT_MAX_JOB_DISTANCE_MILES, SchedulingEngine, StaticCoords, read_travel_time_matrix,
+)
+
+PROPOSAL_COLUMNS = [
+    "row", "boat_id", "customer_id", "customer_name", "service_type", "requested_date",
+    "ramp_id", "ramp_name", "date", "time", "truck_id", "truck_name", "crane_truck_id",
+    "scheduled_end_datetime", "S17_busy_end_datetime", "is_piggyback", "tide_rule",
+]
+FAILURE_COLUMNS = ["row", "boat_id", "service_type", "requested_date", "ramp", "reason"]
+
+
+def load_snapshot_engine(path=None, travel_matrix_path=None) -> SchedulingEngine:
+    """A SchedulingEngine over the snapshot's master data and scheduled jobs."""
+    snapshot = ecm.read_master_snapshot(path)
+    if snapshot is None:
+        raise SystemExit(f"No usable master data snapshot at {path or ecm.SNAPSHOT_PATH}; open the app once to write one.")
+    master = ecm.master_data_from_snapshot(snapshot)
+    jobs = [Job(**row) for row in snapshot["tables"]["jobs"]]
+    jobs = [j for j in jobs if j.job_status == "Scheduled" and j.scheduled_start_datetime]
+    if travel_matrix_path:
+        travel_matrix = read_travel_time_matrix(travel_matrix_path)
+    else:
+        road = RoadTravelTimes.load()
+        travel_matrix = road.town_ramp_matrix() if road else {}
+    return SchedulingEngine(
+        master, jobs, tide_policy=ecm.DEFAULT_TIDE_POLICY, travel_time_matrix=travel_matrix,
+        coords=StaticCoords(master, geocodes=ecm.get_geocode_store()),
+    )
+
+
+def read_requests(path):
+    """Rows of the request CSV as dicts with lower-cased, stripped column names."""
+    with open(path, newline="", encoding="utf-8-sig") as fh:
+        return [{(k or "").strip().lower(): (v or "").strip() for k, v in row.items()} for row in csv.DictReader(fh)]
+
+
+def _resolve_ramp(engine, value, boat):
+    """Ramp id for a ramp id or name from the CSV; the boat's preferred ramp if blank."""
+    if not value:
+        return boat.preferred_ramp_id if engine.ramp(boat.preferred_ramp_id) else None
+    if engine.ramp(value):
+        return str(value)
+    wanted = value.lower()
+    for ramp_id, ramp in engine.master.ramps.items():
+        if (ramp.ramp_name or "").lower() == wanted or ecm.get_ramp_display_name(ramp.ramp_name).lower() == wanted:
+            return ramp_id
+    return None
+
+
+def _proposal_row(engine, row_no, request, slot, job):
+    boat = engine.boat(slot["boat_id"])
+    customer = engine.customer(boat.customer_id)
+    ramp = engine.ramp(slot["ramp_id"])
+    truck = engine.master.trucks.get(str(slot["truck_id"]))
+    return {
+        "row": row_no, "boat_id": boat.boat_id, "customer_id": boat.customer_id,
+        "customer_name": getattr(customer, "customer_name", ""), "service_type": slot["service_type"],
+        "requested_date": request["requested_date"], "ramp_id": slot["ramp_id"], "ramp_name": ramp.ramp_name,
+        "date": slot["date"].isoformat(), "time": slot["time"].strftime("%H:%M"),
+        "truck_id": slot["truck_id"], "truck_name": getattr(truck, "truck_name", ""),
+        "crane_truck_id": job.assigned_crane_truck_id or "",
+        "scheduled_end_datetime": job.scheduled_end_datetime.isoformat(),
+        "S17_busy_end_datetime": job.S17_busy_end_datetime.isoformat() if job.S17_busy_end_datetime else "",
+        "is_piggyback": slot.get("is_piggyback", False), "tide_rule": slot.get("tide_rule_concise") or "",
+    }
+
+
+def _failure_row(row_no, request, reason):
+    return {
+        "row": row_no, "boat_id": request.get("boat_id", ""), "service_type": request.get("service_type", ""),
+        "requested_date": request.get("requested_date", ""), "ramp": request.get("ramp", ""), "reason": reason,
+    }
+
+
+def check_request(engine, request):
+    """(boat, service_type, ramp_id, None) for a valid request row, else (None, None, None, reason)."""
+    try:
+        boat = engine.boat(int(request.get("boat_id", "")))
+    except ValueError:
+        boat = None
+    if boat is None:
+        return None, None, None, f"Unknown boat_id '{request.get('boat_id', '')}'"
+    service_type = request.get("service_type", "").title()
+    if service_type not in ("Launch", "Haul"):
+        return None, None, None, f"Unknown service_type '{request.get('service_type', '')}'"
+    ramp_id = _resolve_ramp(engine, request.get("ramp", ""), boat)
+    if ramp_id is None:
+        return None, None, None, f"Unknown ramp '{request.get('ramp', '')}'"
+    return boat, service_type, ramp_id, None
+
+
+def run_batch(engine, requests, max_distance_miles=DEFAULT_MAX_JOB_DISTANCE_MILES, relax_truck_preference=True):
+    """
+    Searches and books each request in order. Returns (proposals, failures,
+    seconds per request) with proposals/failures as CSV-ready dicts.
+    """
+    proposals, failures, timings = [], [], []
+    for row_no, request in enumerate(requests, start=2):  # row 1 is the header
+        t0 = perf_counter()
+        boat, service_type, ramp_id, reason = check_request(engine, request)
+        if reason is None:
+            slots, message, _, _ = engine.find_slots(
+                boat.customer_id, boat.boat_id, service_type, request.get("requested_date", ""), ramp_id,
+                num_suggestions_to_find=1, relax_truck_preference=relax_truck_preference,
+                max_distance_miles=max_distance_miles,
+            )
+            if slots:
+                job = engine.book(slots[0])
+                proposals.append(_proposal_row(engine, row_no, request, slots[0], job))
+            else:
+                reason = message or "No slot found in search window"
+        if reason is not None:
+            failures.append(_failure_row(row_no, request, reason))
+        timings.append(perf_counter() - t0)
+    return proposals, failures, timings
+
+
+def run_batch_optimized(engine, requests, time_budget_s, max_distance_miles=DEFAULT_MAX_JOB_DISTANCE_MILES,
+                        relax_truck_preference=True):
+    """
+    Assigns all valid requests together with ecm_scheduler_optimizer instead of
+    one at a time. Returns (proposals, failures, optimizer stats).
+    """
+    from ecm_scheduler_optimizer import optimize_batch
+
+    failures, batch, rows = [], [], []
+    for row_no, request in enumerate(requests, start=2):
+        boat, service_type, ramp_id, reason = check_request(engine, request)
+        if reason is None:
+            try:
+                requested_date = dt.datetime.strptime(request.get("requested_date", ""), "%Y-%m-%d").date()
+            except ValueError:
+                reason = f"Bad requested_date '{request.get('requested_date', '')}'"
+        if reason is not None:
+            failures.append(_failure_row(row_no, request, reason))
+            continue
+        batch.append({"boat_id": boat.boat_id, "service_type": service_type,
+                      "requested_date": requested_date, "ramp_id": ramp_id})
+        rows.append((row_no, request))
+
+    assignments, unplaced, stats = optimize_batch(
+        engine, batch, time_budget_s, max_distance_miles=max_distance_miles,
+        relax_truck_preference=relax_truck_preference,
+    )
+    proposals = []
+    for i, (slot, job) in assignments.items():
+        row_no, request = rows[i]
+        proposals.append(_proposal_row(engine, row_no, request, slot, job))
+    for i in unplaced:
+        row_no, request = rows[i]
+        failures.append(_failure_row(row_no, request, "No slot found in search window"))
+    failures.sort(key=lambda r: r["row"])
+    return proposals, failures, stats
+
+
+def optimizer_report(stats) -> str:
+    lines = [f"Optimized in {stats['seconds']:.2f}s ({stats['iterations']} iterations, {stats['accepted']} accepted):"]
+    for label in ("initial", "final"):
+        s = stats[label]
+        lines.append(
+            f"  {label:>7}: {s['placed']} placed, {s['truck_days']} truck-days, "
+            f"{s['jobs_per_truck_day']:.2f} jobs/hauling truck-day, {s['low_utilization_days']} low-utilization days, "
+            f"{s['deadhead_miles']:.1f} deadhead mi, {s['days_off_requested']} days off requested"
+        )
+    return "\n".join(lines)
+
+
+def write_csv(path, columns, rows):
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def throughput_report(timings, elapsed, n_proposed, n_failed) -> str:
+    n = len(timings)
+    if not n:
+        return "No requests."
+    ordered = sorted(timings)
+    p50 = ordered[n // 2]
+    p95 = ordered[min(n - 1, int(n * 0.95))]
+    return (
+        f"{n} requests in {elapsed:.2f}s ({n / elapsed if elapsed else float('inf'):.1f} req/s): "
+        f"{n_proposed} proposed, {n_failed} failed; per request p50 {p50 * 1000:.1f} ms, "
+        f"p95 {p95 * 1000:.1f} ms, max {ordered[-1] * 1000:.1f} ms"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propose slots for a CSV of launch/haul requests.")
+    parser.add_argument("requests_csv")
+    parser.add_argument("--out", help="proposals CSV (default: <requests>_proposals.csv)")
+    parser.add_argument("--failures", help="failures CSV (default: <requests>_failures.csv)")
+    parser.add_argument("--snapshot", help=f"master data snapshot (default: {ecm.SNAPSHOT_PATH})")
+    parser.add_argument("--travel-matrix", help="town-to-ramp travel time CSV used for scoring")
+    parser.add_argument("--max-distance", type=float, default=DEFAULT_MAX_JOB_DISTANCE_MILES,
+                        help="miles a truck may travel from its last stop (default: %(default)s)")
+    parser.add_argument("--strict-truck", action="store_true",
+                        help="only use a boat's preferred truck, never fall back to other trucks")
+    parser.add_argument("--optimize", type=float, metavar="SECONDS",
+                        help="assign the whole batch jointly, improving it for up to SECONDS")
+    args = parser.parse_args(argv)
+
+    stem = os.path.splitext(args.requests_csv)[0]
+    out_path = args.out or f"{stem}_proposals.csv"
+    failures_path = args.failures or f"{stem}_failures.csv"
+
+    load_start = perf_counter()
+    engine = load_snapshot_engine(args.snapshot, args.travel_matrix)
+    engine.schedule  # compile the existing jobs before the clock starts
+    requests = read_requests(args.requests_csv)
+    print(f"Loaded {len(engine.master.boats)} boats, {len(engine.jobs)} scheduled jobs and "
+          f"{len(requests)} requests in {perf_counter() - load_start:.2f}s.")
+
+    batch_start = perf_counter()
+    if args.optimize is not None:
+        proposals, failures, stats = run_batch_optimized(
+            engine, requests, args.optimize, max_distance_miles=args.max_distance,
+            relax_truck_preference=not args.strict_truck,
+        )
+        report = optimizer_report(stats)
+    else:
+        proposals, failures, timings = run_batch(
+            engine, requests, max_distance_miles=args.max_distance, relax_truck_preference=not args.strict_truck,
+        )
+        report = throughput_report(timings, perf_counter() - batch_start, len(proposals), len(failures))
+
+    write_csv(out_path, PROPOSAL_COLUMNS, proposals)
+    write_csv(failures_path, FAILURE_COLUMNS, failures)
+    print(report)
+    print(f"Wrote {out_path} and {failures_path} ({dt.datetime.now():%Y-%m-%d %H:%M}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Greedy vs jointly optimized assignment of one request batch.
+
+Runs a request CSV through batch_schedule's one-at-a-time path and through
+ecm_scheduler_optimizer on fresh copies of the same snapshot. Then compares
+truck-days, jobs per hauling truck-day, low-utilization days and deadhead
+miles over the proposed jobs.
+
+    python -m benchmarks.bench_batch_optimizer requests.csv [--snapshot PATH] [--seconds 10]
+"""
+import argparse
+from time import perf_counter
+
+import batch_schedule
+from ecm_scheduler_optimizer import LOW_UTILIZATION_JOBS, TruckDayRoutes
+
+
+def _metrics(engine, jobs, elapsed):
+    routes = TruckDayRoutes(engine)
+    for job in engine.jobs:
+        routes.remove(job)
+    for job in jobs:
+        routes.add(job)
+    n_days = len(routes.routes)
+    return {
+        "placed": len(jobs),
+        "truck_days": routes.truck_days(),
+        "jobs_per_truck_day": len(jobs) / n_days if n_days else 0.0,
+        "low_utilization_days": sum(1 for stops in routes.routes.values() if len(stops) <= LOW_UTILIZATION_JOBS),
+        "deadhead_miles": routes.total_deadhead(),
+        "seconds": elapsed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("requests_csv")
+    parser.add_argument("--snapshot")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args(argv)
+    requests = batch_schedule.read_requests(args.requests_csv)
+
+    engine = batch_schedule.load_snapshot_engine(args.snapshot)
+    existing = set(map(id, engine.jobs))
+    t0 = perf_counter()
+    batch_schedule.run_batch(engine, requests)
+    greedy = _metrics(engine, [j for j in engine.jobs if id(j) not in existing], perf_counter() - t0)
+
+    engine = batch_schedule.load_snapshot_engine(args.snapshot)
+    existing = set(map(id, engine.jobs))
+    t0 = perf_counter()
+    batch_schedule.run_batch_optimized(engine, requests, args.seconds)
+    optimized = _metrics(engine, [j for j in engine.jobs if id(j) not in existing], perf_counter() - t0)
+
+    print(f"{'':>22}{'greedy':>12}{'optimized':>12}")
+    for key in greedy:
+        print(f"{key:>22}{greedy[key]:>12.2f}{optimized[key]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
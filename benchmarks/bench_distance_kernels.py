@@ -0,0 +1,72 @@
+"""
+Scalar vs NumPy haversine over a synthetic season.
+
+Fills the synthetic fleet with a 5,000-job season and collects every
+deadhead leg of it (yard to first pickup, then drop-off to next pickup, per
+truck-day). It times those legs through the scalar _calculate_distance_miles
+loop and through haversine_miles_legs, and the every-boat-to-every-ramp table
+through nested scalar calls and through haversine_miles_pairwise. It also
+checks the two agree, and times analyze_travel_distances /
+perform_efficiency_analysis end to end (coordinate lookups included).
+
+    python -m benchmarks.bench_distance_kernels [n_jobs] [repeats]
+"""
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+import ecm_scheduler_logic as ecm
+from benchmarks.fleet import fill_schedule, load_fleet
+
+
+def _best(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def _season_legs(jobs):
+    yard = ecm.get_location_coords(address=ecm.YARD_ADDRESS)
+    by_truck_day = defaultdict(list)
+    for job in jobs:
+        by_truck_day[(job.assigned_hauling_truck_id, job.scheduled_start_dt.date())].append(job)
+    starts, ends = [], []
+    for day_jobs in by_truck_day.values():
+        here = yard
+        for job in sorted(day_jobs, key=lambda j: j.scheduled_start_datetime):
+            starts.append(here)
+            ends.append(ecm.get_location_coords(ramp_id=job.pickup_ramp_id, boat_id=job.boat_id))
+            here = ecm.get_location_coords(ramp_id=job.dropoff_ramp_id, boat_id=job.boat_id)
+    return starts, ends
+
+
+def main(n_jobs=5000, repeats=5):
+    load_fleet(n_boats=1000)
+    fill_schedule(n_jobs=n_jobs, days=180)
+    jobs = ecm.SCHEDULED_JOBS
+    starts, ends = _season_legs(jobs)
+    boats = [ecm.get_location_coords(boat_id=b) for b in ecm.LOADED_BOATS]
+    ramps = [ecm.get_location_coords(ramp_id=r) for r in ecm.ECM_RAMPS]
+
+    scalar_legs, a = _best(lambda: [ecm._calculate_distance_miles(s, e) for s, e in zip(starts, ends)], repeats)
+    vector_legs, b = _best(lambda: ecm.haversine_miles_legs(starts, ends), repeats)
+    scalar_pairs, c = _best(lambda: [[ecm._calculate_distance_miles(p, r) for r in ramps] for p in boats], repeats)
+    vector_pairs, d = _best(lambda: ecm.haversine_miles_pairwise(boats, ramps), repeats)
+    print(f"{len(jobs)} jobs, {len(starts)} legs, {len(boats)}x{len(ramps)} boat-ramp pairs")
+    print(f"  legs:  scalar {scalar_legs * 1e3:7.2f} ms   numpy {vector_legs * 1e3:6.2f} ms   "
+          f"({scalar_legs / vector_legs:.0f}x), max diff {np.max(np.abs(np.array(a) - b)):.1e} mi")
+    print(f"  pairs: scalar {scalar_pairs * 1e3:7.2f} ms   numpy {vector_pairs * 1e3:6.2f} ms   "
+          f"({scalar_pairs / vector_pairs:.0f}x), max diff {np.max(np.abs(np.array(c) - d)):.1e} mi")
+
+    travel, _ = _best(lambda: ecm.analyze_travel_distances(jobs), repeats)
+    efficiency, _ = _best(lambda: ecm.perform_efficiency_analysis(jobs), repeats)
+    print(f"  analyze_travel_distances {travel * 1e3:.1f} ms, perform_efficiency_analysis {efficiency * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
@@ -0,0 +1,49 @@
+"""
+Cold-import benchmark for the scheduler modules.
+
+Imports each module in a fresh interpreter, times it, and lists which heavy
+third-party packages ended up in sys.modules. ecm_scheduler_core should pull
+in nothing but numpy. ecm_scheduler_logic should pull in streamlit only;
+pandas, requests, geopy, supabase and friends should load on first use.
+
+    python -m benchmarks.bench_import [repeats]
+"""
+import json
+import subprocess
+import sys
+
+MODULES = ["ecm_scheduler_core", "ecm_scheduler_logic"]
+HEAVY = ["numpy", "pandas", "streamlit", "requests", "geopy", "supabase",
+         "st_supabase_connection", "reportlab", "PyPDF2"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _probe(module):
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(repeats=3):
+    for module in MODULES:
+        try:
+            runs = [_probe(module) for _ in range(repeats)]
+        except subprocess.CalledProcessError as e:
+            print(f"{module:>20}: import failed\n{e.stderr.strip()}")
+            continue
+        best = min(r["elapsed"] for r in runs)
+        print(f"{module:>20}: {best * 1000:.0f} ms (best of {repeats}), heavy deps loaded: "
+              f"{', '.join(runs[0]['loaded']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,61 @@
+"""
+Road-matrix build and lookup cost on a synthetic road graph.
+
+Builds an n x n street grid over the South Shore (edges out of every other
+row at 45 mph, the rest at 20 mph) straight into a RoadGraph. It then routes the
+gazetteer towns plus the yard through build_travel_matrix and times 5,000
+deadhead legs through RoadTravelTimes.minutes_many against
+StraightLineTravelTimes. A county extract has a few hundred thousand nodes,
+so the 300 x 300 default is about that size.
+
+    python -m benchmarks.bench_road_network [grid_n]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from ecm_road_network import RoadGraph, RoadTravelTimes, build_travel_matrix
+from ecm_scheduler_engine import TOWN_CENTROIDS, YARD_COORDS, StraightLineTravelTimes
+from ecm_scheduler_core import haversine_miles_legs
+
+LAT0, LON0, LAT1, LON1 = 41.55, -71.15, 42.40, -70.25
+
+
+def grid_graph(n) -> RoadGraph:
+    lat, lon = np.meshgrid(np.linspace(LAT0, LAT1, n), np.linspace(LON0, LON1, n), indexing="ij")
+    ids = np.arange(n * n).reshape(n, n)
+    a = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    b = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    mph = np.where((a // n) % 2 == 0, 45.0, 20.0)
+    lat, lon = lat.ravel(), lon.ravel()
+    seconds = haversine_miles_legs(np.column_stack([lat[a], lon[a]]), np.column_stack([lat[b], lon[b]])) / mph * 3600
+    return RoadGraph.from_edges(lat, lon, np.concatenate([a, b]), np.concatenate([b, a]), np.concatenate([seconds, seconds]))
+
+
+def main(n=300):
+    t0 = time.perf_counter()
+    graph = grid_graph(n)
+    print(f"grid: {len(graph)} nodes, {graph.n_edges} edges in {time.perf_counter() - t0:.2f}s")
+
+    names = [name.title() for name in TOWN_CENTROIDS] + ["Yard"]
+    coords = list(TOWN_CENTROIDS.values()) + [YARD_COORDS]
+    t0 = time.perf_counter()
+    minutes, _ = build_travel_matrix(graph, coords)
+    print(f"matrix: {len(names)} places in {time.perf_counter() - t0:.1f}s")
+
+    road = RoadTravelTimes(names, ["town"] * (len(names) - 1) + ["yard"], coords, minutes)
+    straight = StraightLineTravelTimes()
+    rnd = random.Random(7)
+    jitter = lambda c: (c[0] + rnd.uniform(-0.02, 0.02), c[1] + rnd.uniform(-0.02, 0.02))
+    starts = [jitter(rnd.choice(coords)) for _ in range(5000)]
+    ends = [jitter(rnd.choice(coords)) for _ in range(5000)]
+    for label, provider in (("straight-line", straight), ("road-network", road)):
+        t0 = time.perf_counter()
+        total = provider.minutes_many(starts, ends).sum()
+        print(f"  {label:>13}: 5000 legs in {(time.perf_counter() - t0) * 1e3:6.2f} ms, {total / 60:7.1f} truck-hours")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:2]))
@@ -0,0 +1,109 @@
+"""
+Per-row save_job loop vs save_jobs_bulk.
+
+Both paths write to an in-process stand-in for the Supabase client, so the
+benchmark never touches the real jobs table. Each request sleeps --rtt-ms to
+model the network round trip, which is the cost the bulk path removes. The
+report gives requests made and wall time for each path.
+
+    python -m benchmarks.bench_save_jobs [n_jobs] [--rtt-ms 40]
+"""
+import argparse
+import datetime as dt
+import time
+from itertools import count
+
+import ecm_scheduler_logic as ecm
+from benchmarks.fleet import load_fleet
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _RoundTripTable:
+    """Just enough of the PostgREST table builder for save_job / save_jobs_bulk."""
+    def __init__(self, client):
+        self.client = client
+        self.rows = []
+
+    def insert(self, rows, returning=None):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.rows = rows
+        return self
+
+    def update(self, row):
+        self.rows = [row]
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def execute(self):
+        self.client.requests += 1
+        time.sleep(self.client.rtt)
+        return _Response([dict(row, job_id=row.get("job_id") or next(self.client.ids)) for row in self.rows])
+
+
+class _RoundTripClient:
+    def __init__(self, rtt_s):
+        self.rtt = rtt_s
+        self.requests = 0
+        self.ids = count(10_000)
+
+    def table(self, name):
+        return _RoundTripTable(self)
+
+
+def _new_jobs(n):
+    boats = list(ecm.LOADED_BOATS.values())
+    start = dt.datetime(2025, 5, 1, 8, 0, tzinfo=dt.timezone.utc)
+    jobs = []
+    for i in range(n):
+        boat = boats[i % len(boats)]
+        begin = start + dt.timedelta(days=i // 20, minutes=90 * (i % 5))
+        jobs.append(ecm.Job(
+            customer_id=boat.customer_id, boat_id=boat.boat_id, service_type="Launch", job_status="Scheduled",
+            scheduled_start_datetime=begin, scheduled_end_datetime=begin + dt.timedelta(minutes=90),
+            assigned_hauling_truck_id=str(1 + i % 3), dropoff_ramp_id=boat.preferred_ramp_id,
+        ))
+    return jobs
+
+
+def _run(label, save, n_jobs, rtt_s):
+    load_fleet()
+    client = _RoundTripClient(rtt_s)
+    ecm.get_db_connection = lambda: client
+    jobs = _new_jobs(n_jobs)
+    t0 = time.perf_counter()
+    save(jobs)
+    elapsed = time.perf_counter() - t0
+    assert all(j.job_id for j in jobs)
+    print(f"{label:>16}: {client.requests:5d} requests, {elapsed:7.2f}s, {len(ecm.SCHEDULED_JOBS)} jobs in SCHEDULED_JOBS")
+    return elapsed
+
+
+def _per_row(jobs):
+    # What callers did before: save_job per job, then patch the in-memory schedule
+    for job in jobs:
+        ecm.save_job(job)
+        ecm.SCHEDULED_JOBS.append(job)
+        ecm._schedule_model_changed(job, added=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n_jobs", nargs="?", type=int, default=1000)
+    parser.add_argument("--rtt-ms", type=float, default=40.0)
+    args = parser.parse_args(argv)
+    per_row = _run("save_job loop", _per_row, args.n_jobs, args.rtt_ms / 1000)
+    bulk = _run("save_jobs_bulk", ecm.save_jobs_bulk, args.n_jobs, args.rtt_ms / 1000)
+    print(f"{per_row / bulk:.0f}x faster with save_jobs_bulk at {args.rtt_ms:g} ms per request")
+
+
+if __name__ == "__main__":
+    main()
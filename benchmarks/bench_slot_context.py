@@ -0,0 +1,83 @@
+"""
+Micro-benchmark for the slot scanner's per-search context.
+
+Scans the same days for a batch of boats twice: once sharing one
+SlotSearchContext across the whole search (what find_available_job_slots does)
+and once letting _find_slot_on_day build a fresh one per day (what every day,
+truck and start time paid before the invariants were hoisted). Also counts the
+coordinate lookups and S17 scans each way.
+
+    python -m benchmarks.bench_slot_context [n_boats] [n_days]
+"""
+import datetime as dt
+import sys
+import time
+from collections import Counter
+
+import ecm_scheduler_logic as ecm
+from benchmarks.fleet import fill_schedule, load_fleet
+
+START = dt.date(2025, 5, 1)
+MAX_DISTANCE_MILES = 10
+
+
+def _count_calls(counter, engine, name):
+    original = getattr(engine, name)
+    def counted(*args, **kwargs):
+        counter[name] += 1
+        return original(*args, **kwargs)
+    setattr(engine, name, counted)
+
+
+def _scan(engine, boats, days, compiled, last_locations, shared_context):
+    found = 0
+    trucks = [t for t in ecm.ECM_TRUCKS.values() if t.truck_name != "S17"]
+    for boat in boats:
+        params = dict(
+            boat=boat, service_type="Launch", ramp_id=boat.preferred_ramp_id,
+            crane_needed="Sail" in boat.boat_type, compiled_schedule=compiled,
+            customer_id=boat.customer_id, trucks=trucks, daily_last_locations=last_locations,
+            max_distance_miles=MAX_DISTANCE_MILES,
+        )
+        context = None
+        if shared_context:
+            context = engine.search_context(
+                boat=boat, service_type="Launch", ramp_id=boat.preferred_ramp_id,
+                crane_needed=params["crane_needed"], daily_last_locations=last_locations,
+                max_distance_miles=MAX_DISTANCE_MILES,
+            )
+        for day in days:
+            if engine.find_slot_on_day(day, context=context, **params):
+                found += 1
+    return found
+
+
+def main(n_boats=100, n_days=30):
+    load_fleet()
+    fill_schedule(start=START, days=n_days)
+    compiled, last_locations = ecm._compile_truck_schedules(ecm.SCHEDULED_JOBS)
+    boats = list(ecm.LOADED_BOATS.values())[:n_boats]
+    days = [START + dt.timedelta(days=i) for i in range(n_days)]
+    engine = ecm._live_engine()
+    _scan(engine, boats[:5], days, compiled, last_locations, True)  # warm the tide and window caches
+
+    calls = Counter()
+    for name in ("coords", "s17_truck_id"):
+        _count_calls(calls, engine, name)
+    results = {}
+    for label, shared in (("context per day", False), ("shared context", True)):
+        calls.clear()
+        t0 = time.perf_counter()
+        found = _scan(engine, boats, days, compiled, last_locations, shared)
+        results[label] = (time.perf_counter() - t0, found, dict(calls))
+
+    scans = n_boats * n_days
+    for label, (elapsed, found, counts) in results.items():
+        print(f"{label:>16}: {elapsed:.3f}s for {scans} day scans "
+              f"({elapsed / scans * 1e6:.0f} us/scan), {found} slots, calls={counts}")
+    base, shared = results["context per day"][0], results["shared context"][0]
+    print(f"speedup: {base / shared:.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
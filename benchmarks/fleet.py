@@ -0,0 +1,76 @@
+"""
+Synthetic fleet for the benchmarks: a few trucks and ramps on the real NOAA
+stations and a few hundred boats around Marshfield, loaded straight into the
+ecm_scheduler_logic globals so nothing touches Supabase.
+
+Run the benchmarks from the repo root (python -m benchmarks.<name>) with the
+same Streamlit secrets the app uses.
+"""
+import datetime as dt
+import random
+
+import ecm_scheduler_logic as ecm
+
+TRUCKS = [(1, "S20/33", 40), (2, "S21/77", 45), (3, "S23/55", 35), (4, "S17", None)]
+RAMPS = [
+    (1, "Scituate Harbor (Jericho Road)", "8445138", "HoursAroundHighTide", 3.0, 42.199, -70.722),
+    (2, "Plymouth Harbor", "8446493", "AnyTide", None, 41.958, -70.662),
+    (3, "Weymouth Harbor", "8444775", "AnyTideWithDraftRule", 3.0, 42.244, -70.937),
+    (4, "Duxbury Harbor", "8446493", "HoursAroundHighTide_WithDraftRule", 3.0, 42.040, -70.670),
+]
+BOAT_TYPES = ["Powerboat", "Powerboat", "Sailboat DT", "Sailboat MT"]
+
+
+def load_fleet(n_boats=200, seed=1):
+    """Replaces trucks, ramps, hours, customers, boats and jobs with a synthetic set."""
+    rnd = random.Random(seed)
+
+    ecm.ECM_TRUCKS.clear()
+    for t_id, name, max_len in TRUCKS:
+        ecm.ECM_TRUCKS[str(t_id)] = ecm.Truck(t_id, name, max_len)
+
+    ecm.ECM_RAMPS.clear()
+    for r_id, name, station, method, offset, lat, lon in RAMPS:
+        ecm.ECM_RAMPS[str(r_id)] = ecm.Ramp(r_id, name, station, method, offset, None, lat, lon)
+    ecm.invalidate_tide_window_caches()
+
+    ecm.TRUCK_OPERATING_HOURS.clear()
+    for t_id, _, _ in TRUCKS:
+        ecm.TRUCK_OPERATING_HOURS[str(t_id)] = {d: (dt.time(7, 30), dt.time(15, 30)) for d in range(6)}
+
+    ecm.LOADED_CUSTOMERS.clear()
+    ecm.LOADED_BOATS.clear()
+    for i in range(1, n_boats + 1):
+        ecm.LOADED_CUSTOMERS[i] = ecm.Customer(i, f"Customer {i}")
+        ecm.LOADED_BOATS[i] = ecm.Boat(
+            i, i, rnd.choice(BOAT_TYPES), rnd.choice([20, 25, 30, 34]), rnd.choice([2.5, 4.0, 5.5]),
+            "12 Main St, Marshfield, MA 02050", str(rnd.randint(1, len(RAMPS))),
+            rnd.choice(["S20/33", "S21/77", ""]), rnd.random() < 0.5,
+            42.09 + rnd.uniform(-0.08, 0.08), -70.70 + rnd.uniform(-0.08, 0.08),
+        )
+
+    ecm.SCHEDULED_JOBS.clear()
+    ecm.PARKED_JOBS.clear()
+    ecm.invalidate_schedule_model()
+
+
+def fill_schedule(n_jobs=300, start=dt.date(2025, 5, 1), days=45, seed=2):
+    """Adds n_jobs scheduled jobs at random starts so the trucks have busy days."""
+    rnd = random.Random(seed)
+    boats = list(ecm.LOADED_BOATS.values())
+    haulers = [t for t in ecm.ECM_TRUCKS.values() if t.truck_name != "S17"]
+    for job_id in range(1, n_jobs + 1):
+        boat = rnd.choice(boats)
+        start_dt = dt.datetime.combine(
+            start + dt.timedelta(days=rnd.randrange(days)),
+            dt.time(rnd.randint(8, 13), rnd.choice([0, 15, 30, 45])),
+            tzinfo=dt.timezone.utc,
+        )
+        ecm.SCHEDULED_JOBS.append(ecm.Job(
+            job_id=job_id, customer_id=boat.customer_id, boat_id=boat.boat_id,
+            service_type=rnd.choice(["Launch", "Haul"]), job_status="Scheduled",
+            scheduled_start_datetime=start_dt, scheduled_end_datetime=start_dt + dt.timedelta(minutes=90),
+            assigned_hauling_truck_id=rnd.choice(haulers).truck_id,
+            pickup_ramp_id=boat.preferred_ramp_id, dropoff_ramp_id=boat.preferred_ramp_id,
+        ))
+    ecm.invalidate_schedule_model()
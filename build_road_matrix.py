@@ -0,0 +1,121 @@
+"""
+Builds the road travel-time matrix (road_travel_times.npz, or
+$ECM_ROAD_TRAVEL_TIMES_PATH) from a local OpenStreetMap extract, so that
+deadhead minutes and the max-distance rule use road times instead of
+straight-line miles * 1.3. Nothing is fetched from the network.
+
+The places are every town in the bundled gazetteer (ma_town_centroids.csv),
+every boat storage town the geocode cache knows, every ramp with
+coordinates in the master data snapshot or the geocode cache, and the yard.
+The matrix holds the drive time from each place to every other one. The
+parsed road graph is kept next to the extract (<extract>.graph.npz) and is
+reused until the extract changes. --town-ramp-csv also writes the
+town -> ramp part in the Town_to_Ramp_Matrix.csv layout, for the batch
+tools' --travel-matrix.
+
+    python build_road_matrix.py --osm plymouth_norfolk.osm.bz2 [--snapshot PATH]
+        [--out road_travel_times.npz] [--town-ramp-csv Town_to_Ramp_Matrix.csv]
+"""
+import argparse
+import csv
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import ecm_scheduler_logic as ecm
+from ecm_road_network import (
+    ROAD_TRAVEL_TIMES_PATH, SNAP_MILES, RoadGraph, RoadTravelTimes, build_travel_matrix, read_osm_road_graph,
+)
+from ecm_scheduler_engine import TOWN_CENTROIDS, YARD_COORDS, _get_town_from_address
+
+
+def matrix_places(master, store=None):
+    """[(name, kind, (lat, lon))] for the gazetteer and cached storage towns, the ramps and the yard."""
+    towns = {name.title(): coords for name, coords in TOWN_CENTROIDS.items()}
+    if store is not None:
+        for boat in master.boats.values():
+            town = _get_town_from_address(boat.storage_address)
+            if town and town.title() not in towns:
+                try:
+                    if coords := store.get(f"{town}, MA"):
+                        towns[town.title()] = coords
+                except KeyError:
+                    pass
+    places = [(name, "town", coords) for name, coords in sorted(towns.items())]
+    for ramp in master.ramps.values():
+        if not ramp.ramp_name:
+            continue
+        coords = (ramp.latitude, ramp.longitude) if ramp.latitude is not None and ramp.longitude is not None else None
+        if coords is None and store is not None:
+            try:
+                coords = store.get(f"{ramp.ramp_name}, MA")
+            except KeyError:
+                coords = None
+        if coords:
+            places.append((ramp.ramp_name, "ramp", tuple(coords)))
+    places.append(("Yard", "yard", YARD_COORDS))
+    return places
+
+
+def load_road_graph(osm_path) -> RoadGraph:
+    """The road graph for an extract, from its .graph.npz if that is newer than the extract."""
+    graph_path = f"{osm_path}.graph.npz"
+    if os.path.exists(graph_path) and os.path.getmtime(graph_path) >= os.path.getmtime(osm_path):
+        return RoadGraph.load(graph_path)
+    graph = read_osm_road_graph(osm_path)
+    graph.save(graph_path)
+    return graph
+
+
+def write_town_ramp_csv(path, town_ramp):
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["town", "ramp", "minutes"])
+        for town, row in town_ramp.items():
+            for ramp_name, minutes in row.items():
+                writer.writerow([town, ramp_name, minutes])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the town x ramp x yard road travel-time matrix from an OSM extract.")
+    parser.add_argument("--osm", required=True, help="OSM XML extract (.osm, .osm.gz or .osm.bz2)")
+    parser.add_argument("--snapshot", help=f"master data snapshot (default: {ecm.SNAPSHOT_PATH})")
+    parser.add_argument("--out", default=ROAD_TRAVEL_TIMES_PATH, help="matrix file (default: %(default)s)")
+    parser.add_argument("--town-ramp-csv", help="also write town,ramp,minutes rows here")
+    args = parser.parse_args(argv)
+
+    snapshot = ecm.read_master_snapshot(args.snapshot)
+    if snapshot is None:
+        raise SystemExit(f"No usable master data snapshot at {args.snapshot or ecm.SNAPSHOT_PATH}; open the app once to write one.")
+    master = ecm.master_data_from_snapshot(snapshot)
+    places = matrix_places(master, ecm.get_geocode_store())
+
+    t0 = perf_counter()
+    graph = load_road_graph(args.osm)
+    print(f"Road graph: {len(graph)} nodes, {graph.n_edges} edges ({perf_counter() - t0:.1f}s).")
+
+    t0 = perf_counter()
+    minutes, snap_miles = build_travel_matrix(
+        graph, [coords for _, _, coords in places],
+        progress=lambda done, total: print(f"\r  {done}/{total} places on the road graph", end="", flush=True),
+    )
+    print(f"\n{len(places)} places routed in {perf_counter() - t0:.1f}s; "
+          f"{int(np.isnan(minutes).sum())} of {minutes.size} pairs without a road time.")
+    far = [f"{name} ({miles:.1f} mi)" for (name, _, _), miles in zip(places, snap_miles) if miles > SNAP_MILES]
+    if far:
+        print(f"More than {SNAP_MILES:g} mi from any road (outside the extract; left to straight-line times):\n  "
+              + "\n  ".join(far))
+
+    road = RoadTravelTimes([p[0] for p in places], [p[1] for p in places], [p[2] for p in places], minutes)
+    road.save(args.out)
+    print(f"Wrote {args.out}.")
+    if args.town_ramp_csv:
+        write_town_ramp_csv(args.town_ramp_csv, road.town_ramp_matrix())
+        print(f"Wrote {args.town_ramp_csv}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Road-network travel times from a local OpenStreetMap extract.
+
+read_osm_road_graph turns an OSM XML extract (.osm, .osm.gz or .osm.bz2;
+for example Plymouth and Norfolk counties cut with osmium or Overpass) into
+a RoadGraph. A RoadGraph is a CSR adjacency of drivable ways weighted by
+truck travel seconds, kept to the largest connected piece. RoadGraph.save
+and RoadGraph.load keep it as .npz, so the XML is parsed once.
+build_travel_matrix runs one Dijkstra per place (towns, ramps, yard) and
+yields a full place x place minutes matrix. RoadTravelTimes serves that
+matrix as a travel-time provider, the same interface as
+ecm_scheduler_engine.StraightLineTravelTimes. Nothing here touches the
+network; build_road_matrix.py is the command line around it.
+
+Imports only the standard library and NumPy.
+"""
+from __future__ import annotations
+
+import bz2
+import gzip
+import heapq
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from ecm_scheduler_core import _log_debug, coord_array, haversine_miles_legs, haversine_miles_pairwise
+from ecm_scheduler_engine import (
+    AVERAGE_SPEED_MPH, MIN_TRAVEL_MINUTES, ROAD_FACTOR, StraightLineTravelTimes,
+)
+
+ROAD_TRAVEL_TIMES_PATH = os.environ.get(
+    "ECM_ROAD_TRAVEL_TIMES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "road_travel_times.npz"),
+)
+
+# Truck-and-trailer cruising speeds per OSM highway class, used when a way has
+# no usable maxspeed tag. A posted limit is capped at TRUCK_MAX_MPH.
+TRUCK_SPEEDS_MPH = {
+    "motorway": 55, "motorway_link": 35, "trunk": 45, "trunk_link": 30,
+    "primary": 35, "primary_link": 25, "secondary": 30, "secondary_link": 25,
+    "tertiary": 28, "tertiary_link": 20, "unclassified": 25, "residential": 20,
+    "living_street": 10, "service": 10, "road": 20,
+}
+TRUCK_MAX_MPH = 55
+SNAP_MILES = 3.0   # farther than this from every place, a point falls back to straight-line times
+
+_ONEWAY_FORWARD = {"yes", "true", "1"}
+
+
+def _open_osm(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _osm_elements(path):
+    """Every top-level node/way element of an OSM XML file, streamed; each is discarded after use."""
+    with _open_osm(path) as fh:
+        events = ET.iterparse(fh, events=("start", "end"))
+        _, root = next(events)
+        for event, elem in events:
+            if event == "end" and elem.tag in ("node", "way"):
+                yield elem
+                root.clear()
+
+
+def _way_speed_mph(tags) -> float:
+    speed = TRUCK_SPEEDS_MPH[tags["highway"]]
+    m = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", tags.get("maxspeed", ""))
+    if m:
+        posted = float(m.group(1)) if m.group(2) else float(m.group(1)) / 1.609344   # bare numbers are km/h
+        if posted > 0:
+            speed = min(posted, TRUCK_MAX_MPH)
+    return speed
+
+
+def _drivable_ways(path):
+    """(node refs, forward, backward, mph) for every way a truck can use."""
+    for elem in _osm_elements(path):
+        if elem.tag != "way":
+            continue
+        tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+        if tags.get("highway") not in TRUCK_SPEEDS_MPH or tags.get("access") in ("no", "private") \
+                or tags.get("area") == "yes":
+            continue
+        oneway = tags.get("oneway", "yes" if tags["highway"].startswith("motorway") else "no")
+        refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+        if len(refs) > 1:
+            yield refs, oneway != "-1", oneway not in _ONEWAY_FORWARD, _way_speed_mph(tags)
+
+
+def _node_coords(path, wanted) -> dict:
+    coords = {}
+    for elem in _osm_elements(path):
+        if elem.tag == "node" and int(elem.get("id")) in wanted:
+            coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+    return coords
+
+
+class RoadGraph:
+    """
+    Directed road graph: node i at (lat[i], lon[i]); its out-edges are
+    indices[indptr[i]:indptr[i + 1]] with travel seconds in the same slice of
+    `seconds`.
+    """
+    def __init__(self, lat, lon, indptr, indices, seconds):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.seconds = np.asarray(seconds, dtype=float)
+        self._adjacency = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(cls, lat, lon, sources, targets, seconds) -> "RoadGraph":
+        """CSR graph over the largest weakly connected set of nodes touched by the edges."""
+        sources, targets = np.asarray(sources, dtype=np.int64), np.asarray(targets, dtype=np.int64)
+        seconds = np.asarray(seconds, dtype=float)
+        keep = _largest_component(len(lat), sources, targets)
+        remap = np.full(len(lat), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        live = (remap[sources] >= 0) & (remap[targets] >= 0)
+        sources, targets, seconds = remap[sources[live]], remap[targets[live]], seconds[live]
+        order = np.lexsort((targets, sources))
+        sources, targets, seconds = sources[order], targets[order], seconds[order]
+        indptr = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(keep)), out=indptr[1:])
+        return cls(np.asarray(lat)[keep], np.asarray(lon)[keep], indptr, targets, seconds)
+
+    def save(self, path):
+        np.savez_compressed(path, lat=self.lat, lon=self.lon, indptr=self.indptr,
+                            indices=self.indices, seconds=self.seconds)
+
+    @classmethod
+    def load(cls, path) -> "RoadGraph":
+        with np.load(path) as data:
+            return cls(data["lat"], data["lon"], data["indptr"], data["indices"], data["seconds"])
+
+    def nearest_nodes(self, coords):
+        """(node index, miles to it) for each (lat, lon)."""
+        xy = coord_array(coords)
+        nodes = np.empty(len(xy), dtype=np.int64)
+        miles = np.empty(len(xy))
+        graph_xy = np.column_stack([self.lat, self.lon])
+        for k, point in enumerate(xy):   # one row at a time keeps memory at O(nodes)
+            d = haversine_miles_pairwise(point, graph_xy)[0]
+            nodes[k] = int(np.argmin(d))
+            miles[k] = d[nodes[k]]
+        return nodes, miles
+
+    def shortest_seconds(self, source, targets) -> dict:
+        """Dijkstra from `source`; {target: seconds} for the reachable targets. Stops once all are settled."""
+        if self._adjacency is None:
+            self._adjacency = (self.indptr.tolist(), self.indices.tolist(), self.seconds.tolist())
+        indptr, indices, seconds = self._adjacency
+        remaining = set(targets)
+        found = {}
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u in remaining:
+                remaining.discard(u)
+                found[u] = d
+            for k in range(indptr[u], indptr[u + 1]):
+                v, nd = indices[k], d + seconds[k]
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return found
+
+
+def _largest_component(n, sources, targets) -> np.ndarray:
+    """Sorted indices of the largest weakly connected component among the nodes that have edges."""
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(sources.tolist(), targets.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[ra] = rb
+    touched = np.unique(np.concatenate([sources, targets]))
+    if not len(touched):
+        return touched
+    roots = np.array([find(x) for x in touched.tolist()])
+    values, counts = np.unique(roots, return_counts=True)
+    return touched[roots == values[np.argmax(counts)]]
+
+
+def read_osm_road_graph(path) -> RoadGraph:
+    """RoadGraph of the drivable ways in an OSM XML extract. Two streaming passes: ways, then their nodes."""
+    segments = []   # (from osm id, to osm id, forward, backward, mph)
+    wanted = set()
+    for refs, forward, backward, mph in _drivable_ways(path):
+        wanted.update(refs)
+        segments.extend((a, b, forward, backward, mph) for a, b in zip(refs, refs[1:]))
+    coords = _node_coords(path, wanted)
+    index = {node_id: i for i, node_id in enumerate(coords)}
+    lat = np.array([c[0] for c in coords.values()])
+    lon = np.array([c[1] for c in coords.values()])
+
+    sources, targets, mph = [], [], []
+    for a, b, forward, backward, speed in segments:
+        if a not in index or b not in index:   # way clipped at the extract's edge
+            continue
+        ia, ib = index[a], index[b]
+        if forward:
+            sources.append(ia); targets.append(ib); mph.append(speed)
+        if backward:
+            sources.append(ib); targets.append(ia); mph.append(speed)
+    sources, targets = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+    miles = haversine_miles_legs(np.column_stack([lat[sources], lon[sources]]),
+                                 np.column_stack([lat[targets], lon[targets]]))
+    graph = RoadGraph.from_edges(lat, lon, sources, targets, miles / np.array(mph, dtype=float) * 3600.0)
+    _log_debug(f"Road graph from {path}: {len(graph)} nodes, {graph.n_edges} edges.")
+    return graph
+
+
+def build_travel_matrix(graph, coords, max_snap_miles=SNAP_MILES, progress=None):
+    """
+    (minutes, snap_miles) for the given places: minutes[i, j] is the shortest
+    drive from place i to place j, including straight-line minutes for each
+    place's hop onto its nearest road node, plus the miles of those hops.
+    Unreachable pairs, and places more than max_snap_miles from any road
+    (outside the extract), are NaN.
+    """
+    nodes, snap_miles = graph.nearest_nodes(coords)
+    on_graph = np.flatnonzero(snap_miles <= max_snap_miles)
+    targets = set(nodes[on_graph].tolist())
+    hop_minutes = snap_miles * ROAD_FACTOR / AVERAGE_SPEED_MPH * 60
+    minutes = np.full((len(nodes), len(nodes)), np.nan)
+    by_node = {}
+    for done, i in enumerate(on_graph.tolist(), 1):
+        node = int(nodes[i])
+        if node not in by_node:
+            by_node[node] = graph.shortest_seconds(node, targets)
+        found = by_node[node]
+        for j in on_graph.tolist():
+            if int(nodes[j]) in found:
+                minutes[i, j] = found[int(nodes[j])] / 60.0 + hop_minutes[i] + hop_minutes[j]
+        minutes[i, i] = 0.0
+        if progress:
+            progress(done, len(on_graph))
+    return minutes, snap_miles
+
+
+class RoadTravelTimes:
+    """
+    Travel-time provider over a precomputed place x place road matrix (towns,
+    ramps and the yard; `kinds` says which). A point is snapped to its nearest
+    place and the drive is the matrix time plus straight-line minutes for the
+    two short hops on and off it. Points more than SNAP_MILES from every place,
+    legs whose ends snap to the same place, and unreachable pairs fall back to
+    StraightLineTravelTimes, which also gives the missing-coordinate default.
+    """
+    name = "road-network"
+
+    def __init__(self, names, kinds, coords, minutes, fallback=None):
+        self.names = list(names)
+        self.kinds = list(kinds)
+        self.coords = coord_array(coords)
+        self.matrix = np.asarray(minutes, dtype=float)
+        self.fallback = fallback or StraightLineTravelTimes()
+
+    def __len__(self):
+        return len(self.names)
+
+    def save(self, path):
+        """Writes the matrix as .npz (written next to `path` first, then moved into place)."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, names=np.array(self.names), kinds=np.array(self.kinds),
+                            coords=self.coords, minutes=self.matrix)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None) -> "RoadTravelTimes | None":
+        path = path or ROAD_TRAVEL_TIMES_PATH
+        try:
+            with np.load(path) as data:
+                return cls(data["names"].tolist(), data["kinds"].tolist(), data["coords"], data["minutes"])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            _log_debug(f"WARNING: road travel times {path} unreadable: {e}")
+            return None
+
+    def _snap(self, points):
+        xy = coord_array(points)
+        if not len(xy):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        d = haversine_miles_pairwise(xy, self.coords)
+        d[np.isnan(d)] = np.inf
+        nearest = np.argmin(d, axis=1)
+        return nearest, d[np.arange(len(xy)), nearest]
+
+    def minutes_many(self, origins, destinations) -> np.ndarray:
+        fallback = self.fallback.minutes_many(origins, destinations)
+        i, hop_a = self._snap(origins)
+        j, hop_b = self._snap(destinations)
+        if not len(i):
+            return fallback
+        road = self.matrix[i, j] + (hop_a + hop_b) * ROAD_FACTOR / AVERAGE_SPEED_MPH * 60
+        usable = (hop_a <= SNAP_MILES) & (hop_b <= SNAP_MILES) & (i != j) & np.isfinite(road)
+        return np.where(usable, np.maximum(MIN_TRAVEL_MINUTES, np.floor(np.where(usable, road, 0))), fallback)
+
+    def minutes(self, origin, destination) -> int:
+        if not origin or not destination:
+            return self.fallback.minutes(origin, destination)
+        return int(self.minutes_many([origin], [destination])[0])
+
+    def town_ramp_matrix(self) -> dict:
+        """{town: {ramp name: minutes}}, the Town_to_Ramp_Matrix.csv layout, for every reachable pair."""
+        towns = [k for k, kind in enumerate(self.kinds) if kind == "town"]
+        ramps = [k for k, kind in enumerate(self.kinds) if kind == "ramp"]
+        matrix = {}
+        for t in towns:
+            row = {self.names[r]: int(round(self.matrix[t, r])) for r in ramps if np.isfinite(self.matrix[t, r])}
+            if row:
+                matrix[self.names[t]] = row
+        return matrix
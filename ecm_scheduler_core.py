@@ -0,0 +1,883 @@
+"""
+Streamlit-free scheduling core: data models, the local tide store and
+vectorized tide-window engine, truck busy-interval indexes and distance math.
+
+Imports only the standard library and NumPy and creates no network clients,
+so batch jobs, worker processes and benchmarks can load it in milliseconds.
+ecm_scheduler_logic re-exports everything here and layers the database,
+geocoding and Streamlit UI plumbing on top.
+"""
+from __future__ import annotations
+
+import bisect
+import datetime as dt
+import os
+import threading
+from collections import Counter, OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+DEFAULT_NOAA_STATION = "8445138"  # Scituate Harbor, MA
+
+# Shared debug log (ecm_scheduler_logic re-exports this same list).
+DEBUG_MESSAGES: list[str] = []
+
+def _log_debug(msg):
+    """Adds a timestamped message to the global debug log."""
+    DEBUG_MESSAGES.insert(0, f"{dt.datetime.now().strftime('%H:%M:%S')}: {msg}")
+
+
+# --- DATA MODELS (CLASSES) ---
+class Truck:
+    def __init__(self, t_id, name, max_len):
+        self.truck_id = str(t_id) #<-- FIX: Ensure ID is a string
+        self.truck_name = name
+        self.max_boat_length = max_len
+        self.is_crane = "Crane" in name
+
+class Ramp:
+    def __init__(self, r_id, name, station, tide_method="AnyTide", offset=None, boats=None, latitude=None, longitude=None):
+        self.ramp_id = r_id
+        self.ramp_name = name
+        self.noaa_station_id = station
+        self.tide_calculation_method = tide_method
+        self.tide_offset_hours1 = offset
+        self.tide_offset_hours  = offset   # NEW: mirror for compatibility
+        self.allowed_boat_types = boats or ["Powerboat", "Sailboat DT", "Sailboat MT"]
+        self.latitude = float(latitude) if latitude is not None else None
+        self.longitude = float(longitude) if longitude is not None else None
+
+class Customer:
+    def __init__(self, c_id, name):
+        self.customer_id = int(c_id)
+        self.customer_name = name
+
+class Boat:
+    def __init__(self, b_id, c_id, b_type, b_len, draft, storage_addr, pref_ramp, pref_truck, is_ecm, storage_latitude=None, storage_longitude=None): # <--- ADD storage_latitude, storage_longitude
+        self.boat_id = int(b_id)
+        self.customer_id = int(c_id)
+        self.boat_type = b_type
+        self.boat_length = b_len
+        self.draft_ft = draft
+        self.storage_address = storage_addr
+        self.preferred_ramp_id = pref_ramp
+        self.preferred_truck_id = pref_truck
+        self.is_ecm_boat = is_ecm
+        self.storage_latitude = float(storage_latitude) if storage_latitude is not None else None # Convert to float
+        self.storage_longitude = float(storage_longitude) if storage_longitude is not None else None # Convert to float
+
+class Job:
+    def __init__(self, **kwargs):
+        def _parse_int(v):
+            try: return int(v) if v is not None and str(v).strip() != "" else None
+            except (ValueError, TypeError): return None
+        def _parse_float(v):
+            try: return float(v) if v is not None and str(v).strip() != "" else None
+            except (ValueError, TypeError): return None
+
+        self.job_id                     = _parse_int(kwargs.get("job_id"))
+        self.customer_id                = _parse_int(kwargs.get("customer_id"))
+        self.boat_id                    = _parse_int(kwargs.get("boat_id"))
+        self.service_type               = kwargs.get("service_type")
+        self.scheduled_start_datetime   = self._parse_or_get_datetime(kwargs.get("scheduled_start_datetime"))
+        self.scheduled_end_datetime     = self._parse_or_get_datetime(kwargs.get("scheduled_end_datetime"))
+        
+        # FIX: Ensure Truck IDs are always strings
+        self.assigned_hauling_truck_id  = str(kwargs.get("assigned_hauling_truck_id")) if kwargs.get("assigned_hauling_truck_id") else None
+        self.assigned_crane_truck_id    = str(kwargs.get("assigned_crane_truck_id")) if kwargs.get("assigned_crane_truck_id") else None
+
+        self.S17_busy_end_datetime      = self._parse_or_get_datetime(kwargs.get("S17_busy_end_datetime"))
+        self.pickup_ramp_id             = kwargs.get("pickup_ramp_id")
+        self.dropoff_ramp_id            = kwargs.get("dropoff_ramp_id")
+        self.pickup_street_address      = kwargs.get("pickup_street_address", "") or ""
+        self.dropoff_street_address     = kwargs.get("dropoff_street_address", "") or ""
+        self.job_status                 = kwargs.get("job_status", "Scheduled")
+        self.notes                      = kwargs.get("notes", "")
+        self.pickup_latitude            = _parse_float(kwargs.get("pickup_latitude"))
+        self.pickup_longitude           = _parse_float(kwargs.get("pickup_longitude"))
+        self.dropoff_latitude           = _parse_float(kwargs.get("dropoff_latitude"))
+        self.dropoff_longitude          = _parse_float(kwargs.get("dropoff_longitude"))
+
+    def _parse_or_get_datetime(self, dt_value):
+        """Return a timezone-aware (UTC) datetime or None."""
+        parsed = None
+
+        if isinstance(dt_value, dt.datetime):
+            parsed = dt_value
+        elif isinstance(dt_value, str):
+            try:
+                # tolerate "YYYY-MM-DD HH:MM:SS" by replacing the space with "T"
+                parsed = dt.datetime.fromisoformat(dt_value.replace(" ", "T"))
+            except (ValueError, TypeError):
+                return None
+
+        if parsed is None:
+            return None
+
+        # make UTC if naive
+        if parsed.tzinfo is None or parsed.tzinfo.utcoffset(parsed) is None:
+            return parsed.replace(tzinfo=dt.timezone.utc)
+        return parsed
+
+    @property
+    def scheduled_start_dt(self):
+        return self.scheduled_start_datetime
+
+    @property
+    def scheduled_end_dt(self):
+        return self.scheduled_end_datetime
+
+# ---- TIDE POLICY (default, adjustable later from UI) ----
+DEFAULT_TIDE_POLICY = {
+    # Launch: allowed lead *before* the ramp window OPENS
+    "launch_open_lead_power_mins": 30,     # powerboats
+    "launch_open_lead_sail_mins": 120,     # sailboats
+
+    # Haul: job may START this much time *before* the ramp window CLOSES
+    "haul_close_lead_all_mins": 30,
+
+    # Step size when scanning start times
+    "scan_step_mins": 15,
+}
+
+# A process-wide policy you can change at runtime if you want
+_GLOBAL_TIDE_POLICY = DEFAULT_TIDE_POLICY.copy()
+
+def set_global_tide_policy(policy: dict | None):
+    """Optional: let the UI push a policy once. Safe no-op if None."""
+    if isinstance(policy, dict):
+        merged = DEFAULT_TIDE_POLICY.copy()
+        merged.update({k: v for k, v in policy.items() if v is not None})
+        # Updated in place: ecm_scheduler_logic holds the same dict.
+        _GLOBAL_TIDE_POLICY.clear()
+        _GLOBAL_TIDE_POLICY.update(merged)
+    return _GLOBAL_TIDE_POLICY
+
+
+# --- DISTANCE ---
+def _calculate_distance_miles(coords1, coords2):
+    """Calculates the Haversine distance between two lat/lon points in miles."""
+    import math
+    if not coords1 or not coords2:
+        return float('inf') # Return a large number if coords are missing
+
+    R = 3958.8 # Earth radius in miles
+    lat1, lon1 = math.radians(coords1[0]), math.radians(coords1[1])
+    lat2, lon2 = math.radians(coords2[0]), math.radians(coords2[1])
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+
+    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    distance = R * c
+    return distance
+
+EARTH_RADIUS_MILES = 3958.8
+
+def haversine_miles_pairwise(a, b) -> np.ndarray:
+    """
+    Haversine miles from every (lat, lon) row of `a` to every row of `b`, as an
+    (len(a), len(b)) array -- the same formula as _calculate_distance_miles, in
+    one NumPy pass. Rows with a NaN coordinate give NaN.
+    """
+    a = np.radians(np.asarray(a, dtype=float).reshape(-1, 2))
+    b = np.radians(np.asarray(b, dtype=float).reshape(-1, 2))
+    lat1, lon1 = a[:, 0:1], a[:, 1:2]
+    lat2, lon2 = b[:, 0][None, :], b[:, 1][None, :]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
+def haversine_miles_legs(origins, destinations) -> np.ndarray:
+    """
+    Haversine miles of each leg origins[i] -> destinations[i] (both (n, 2) lat/lon
+    or lists of (lat, lon) / None), as an (n,) array. NaN where either end is missing.
+    """
+    a = np.radians(coord_array(origins))
+    b = np.radians(coord_array(destinations))
+    h = (np.sin((b[:, 0] - a[:, 0]) / 2) ** 2
+         + np.cos(a[:, 0]) * np.cos(b[:, 0]) * np.sin((b[:, 1] - a[:, 1]) / 2) ** 2)
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
+def coord_array(coords) -> np.ndarray:
+    """(n, 2) float array from a list of (lat, lon) pairs, with NaN rows for missing (None/empty) ones."""
+    if isinstance(coords, np.ndarray):
+        return coords.astype(float).reshape(-1, 2)
+    try:
+        return np.array(coords, dtype=float).reshape(-1, 2)
+    except (TypeError, ValueError):   # some None / empty entries
+        return np.array([c if c else (np.nan, np.nan) for c in coords], dtype=float).reshape(-1, 2)
+
+
+# --- GEOCODE STORE ---
+# Geocoder answers are kept in a SQLite file keyed by the normalized query, so
+# they survive restarts and are shared by every process (app, batch CLI,
+# simulation workers). Misses are remembered too, for GEOCODE_MISS_TTL_DAYS,
+# so a bad address isn't retried with backoff on every search.
+GEOCODE_CACHE_PATH = os.environ.get(
+    "ECM_GEOCODE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite")
+)
+GEOCODE_MISS_TTL_DAYS = 7
+GEOCODE_STORE_STATS = {"hits": 0, "misses": 0, "writes": 0}
+
+def normalize_geocode_key(query) -> str:
+    """'12  Main St., Marshfield,MA' -> '12 main st, marshfield, ma'."""
+    text = " ".join(str(query or "").lower().replace(".", " ").split())
+    return ", ".join(part.strip() for part in text.split(",") if part.strip())
+
+class GeocodeStore:
+    """
+    get(query) -> (lat, lon), None for a remembered miss, or KeyError if never
+    looked up. One connection per thread; WAL so processes can read while one writes.
+    """
+    def __init__(self, path=None):
+        self.path = path or GEOCODE_CACHE_PATH
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS geocodes ("
+                " key TEXT PRIMARY KEY, query TEXT, lat REAL, lon REAL, source TEXT, updated_at TEXT)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, query):
+        row = self._conn().execute(
+            "SELECT lat, lon, updated_at FROM geocodes WHERE key = ?", (normalize_geocode_key(query),)
+        ).fetchone()
+        if row is not None and row[0] is None:
+            age = dt.datetime.now(dt.timezone.utc) - dt.datetime.fromisoformat(row[2])
+            if age > timedelta(days=GEOCODE_MISS_TTL_DAYS):
+                row = None
+        if row is None:
+            GEOCODE_STORE_STATS["misses"] += 1
+            raise KeyError(query)
+        GEOCODE_STORE_STATS["hits"] += 1
+        return None if row[0] is None else (row[0], row[1])
+
+    def put(self, query, coords, source="nominatim"):
+        """Records coords (or None for "not found") for a query."""
+        lat, lon = coords if coords else (None, None)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO geocodes (key, query, lat, lon, source, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_geocode_key(query), str(query), lat, lon, source,
+                 dt.datetime.now(dt.timezone.utc).isoformat()),
+            )
+        GEOCODE_STORE_STATS["writes"] += 1
+
+    def __contains__(self, query):
+        try:
+            self.get(query)
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+_GEOCODE_STORE = None
+
+def get_geocode_store() -> GeocodeStore | None:
+    """The process-wide GeocodeStore, or None if its file can't be opened (lookups then just go live)."""
+    global _GEOCODE_STORE
+    if _GEOCODE_STORE is None:
+        try:
+            store = GeocodeStore()
+            store._conn()
+            _GEOCODE_STORE = store
+        except Exception as e:
+            _log_debug(f"WARNING: geocode cache {GEOCODE_CACHE_PATH} unavailable: {e}")
+            return None
+    return _GEOCODE_STORE
+
+
+def _parse_annual_tide_file(filepath, begin_date=None, end_date=None):
+    """
+    Parses an annual NOAA tide prediction text file for a specific date range.
+    Passing begin_date/end_date as None parses the whole file.
+    """
+    _log_debug(f"Attempting to parse file: {filepath} for dates {begin_date} to {end_date}")
+    grouped_tides = {}
+    
+    try:
+        with open(filepath, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or not line[0].isdigit():
+                    continue
+
+                parts = line.split()
+                if len(parts) < 6:
+                    continue
+
+                try:
+                    # Capture all necessary parts from the line
+                    date_str = parts[0]
+                    day_of_week_str = parts[1]
+                    time_str = parts[2]
+                    am_pm_str = parts[3]
+                    height_str = parts[4]
+                    type_str = parts[-1]
+
+                    # --- FIX 1 of 2: Include the day of the week in the string to be parsed ---
+                    datetime_to_parse = f"{date_str} {day_of_week_str} {time_str} {am_pm_str}"
+                    
+                    # --- FIX 2 of 2: Add '%a' to the format to handle "Mon", "Tue", etc. ---
+                    tide_dt_obj = dt.datetime.strptime(datetime_to_parse, "%Y/%m/%d %a %I:%M %p")
+                    
+                    # This part remains the same
+                    current_date = tide_dt_obj.date()
+
+                    if (begin_date is None or begin_date <= current_date) and (end_date is None or current_date <= end_date):
+                        tide_info = {
+                            'type': type_str.upper(),
+                            'time': tide_dt_obj.time(),
+                            'height': float(height_str)
+                        }
+                        grouped_tides.setdefault(current_date, []).append(tide_info)
+
+                except (ValueError, IndexError) as e:
+                    _log_debug(f"--> PARSE ERROR on line: '{line}'. Details: {e}")
+                    continue
+    except FileNotFoundError:
+        _log_debug(f"ERROR: Local tide file not found: {filepath}")
+    except Exception as e:
+        _log_debug(f"ERROR: General error reading local tide file {filepath}: {e}")
+
+    _log_debug(f"Finished parsing. Found {len(grouped_tides)} days with valid tides.")
+    return grouped_tides
+
+# --- PROCESS-WIDE TIDE INDEX ---
+# Each annual file is parsed once per process (and again only if it changes on disk).
+# {station_id: ((text_mtime, cache_mtime), {date: [ {type, time, height}, ... ] sorted by time})}
+_TIDE_INDEX: dict[str, tuple[tuple, dict[dt.date, list[dict]]]] = {}
+# The same events as a TIDE_CACHE_DTYPE array per station, for the vectorized window engine.
+_TIDE_ARRAYS: dict[str, "np.ndarray"] = {}
+
+# --- COMPACT BINARY TIDE CACHE ---
+# tide_data/<station>_annual.npy holds the same predictions as the NOAA text file as one
+# structured array (day ordinal, minute of day, height, high/low flag), sorted by time.
+# It is loaded memory-mapped, so a cold start skips the line-by-line strptime parse.
+TIDE_CACHE_DTYPE = np.dtype([
+    ("day", "<i4"),        # date.toordinal()
+    ("minute", "<i2"),     # minutes after local midnight
+    ("height", "<f4"),     # feet (MLLW)
+    ("is_high", "?"),      # True = H, False = L
+])
+
+def _local_tide_filepath(station_id) -> str:
+    return f"tide_data/{station_id}_annual.txt"
+
+def _binary_tide_filepath(station_id) -> str:
+    return f"tide_data/{station_id}_annual.npy"
+
+def _mtime_or_none(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def _tide_array_from_index(by_date: dict) -> np.ndarray:
+    rows = [
+        (d.toordinal(), e['time'].hour * 60 + e['time'].minute, e['height'], e['type'] == 'H')
+        for d in sorted(by_date)
+        for e in sorted(by_date[d], key=lambda e: e['time'])
+    ]
+    return np.array(rows, dtype=TIDE_CACHE_DTYPE)
+
+def _tide_index_from_array(arr: np.ndarray) -> dict:
+    by_date = {}
+    for day, minute, height, is_high in zip(arr["day"].tolist(), arr["minute"].tolist(),
+                                             arr["height"].tolist(), arr["is_high"].tolist()):
+        by_date.setdefault(dt.date.fromordinal(day), []).append({
+            'type': 'H' if is_high else 'L',
+            'time': dt.time(minute // 60, minute % 60),
+            'height': round(height, 2),
+        })
+    return by_date
+
+def _write_tide_cache(station_id, by_date: dict) -> str | None:
+    """Writes the binary cache for a station; returns its path, or None if it could not be written."""
+    path = _binary_tide_filepath(station_id)
+    tmp_path = f"{path}.tmp.npy"
+    try:
+        np.save(tmp_path, _tide_array_from_index(by_date))
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        _log_debug(f"WARNING: could not write tide cache {path}: {e}")
+        return None
+
+def _load_tide_cache(station_id) -> np.ndarray | None:
+    path = _binary_tide_filepath(station_id)
+    try:
+        arr = np.load(path, mmap_mode="r")
+    except Exception as e:
+        _log_debug(f"WARNING: could not read tide cache {path}: {e}")
+        return None
+    if arr.dtype != TIDE_CACHE_DTYPE:
+        _log_debug(f"WARNING: tide cache {path} has an unexpected layout; ignoring it.")
+        return None
+    return arr
+
+def build_tide_cache(station_id=None) -> list[str]:
+    """
+    Converts NOAA annual text files into the compact binary cache.
+    Converts a single station when station_id is given, otherwise every
+    tide_data/<station>_annual.txt. Returns the paths written.
+    """
+    if station_id is not None:
+        station_ids = [str(station_id)]
+    else:
+        try:
+            station_ids = sorted(
+                name[:-len("_annual.txt")]
+                for name in os.listdir("tide_data")
+                if name.endswith("_annual.txt")
+            )
+        except OSError:
+            station_ids = []
+
+    written = []
+    for sid in station_ids:
+        by_date = _parse_annual_tide_file(_local_tide_filepath(sid))
+        if not by_date:
+            continue
+        path = _write_tide_cache(sid, by_date)
+        if path:
+            written.append(path)
+    _log_debug(f"Wrote {len(written)} binary tide cache file(s).")
+    return written
+
+def _get_station_tide_index(station_id):
+    """
+    Returns the {date: events} index for a station's local tide data, or None if
+    there is none. Prefers the binary cache; the text file is parsed only when the
+    cache is missing or older than it (and the cache is then regenerated).
+    Rebuilt only when either file's mtime changes.
+    """
+    text_path = _local_tide_filepath(station_id)
+    text_mtime = _mtime_or_none(text_path)
+    cache_mtime = _mtime_or_none(_binary_tide_filepath(station_id))
+    if text_mtime is None and cache_mtime is None:
+        return None
+
+    key = str(station_id)
+    stamp = (text_mtime, cache_mtime)
+    cached = _TIDE_INDEX.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+
+    by_date, arr = None, None
+    if cache_mtime is not None and (text_mtime is None or cache_mtime >= text_mtime):
+        arr = _load_tide_cache(station_id)
+        if arr is not None:
+            by_date = _tide_index_from_array(arr)
+
+    if by_date is None:
+        by_date = _parse_annual_tide_file(text_path)
+        for events in by_date.values():
+            events.sort(key=lambda e: e['time'])
+        arr = _tide_array_from_index(by_date)
+        if by_date and _write_tide_cache(station_id, by_date):
+            stamp = (text_mtime, _mtime_or_none(_binary_tide_filepath(station_id)))
+
+    _TIDE_INDEX[key] = (stamp, by_date)
+    _TIDE_ARRAYS[key] = arr
+    _log_debug(f"Indexed {len(by_date)} days of tides for station {key}.")
+    return by_date
+
+def _indexed_tides_for_range(station_id, start_date, end_date) -> dict:
+    """Slice the local station index for [start_date, end_date]; {} if nothing is indexed."""
+    index = _get_station_tide_index(station_id)
+    if not index:
+        return {}
+    out = {}
+    day = start_date
+    while day <= end_date:
+        events = index.get(day)
+        if events is not None:
+            out[day] = events
+        day += timedelta(days=1)
+    return out
+
+# Where tides come from when a station has no local file: set_tide_fallback()
+# installs a fetcher (the app uses the NOAA API); headless runs leave it unset.
+_TIDE_FALLBACK = None
+
+def set_tide_fallback(fetch):
+    """fetch(station_id, start_date, end_date) -> {date: events}, or None for local data only."""
+    global _TIDE_FALLBACK
+    _TIDE_FALLBACK = fetch
+
+def _fallback_tides(station_id, start_date, end_date) -> dict:
+    if _TIDE_FALLBACK is None:
+        return {}
+    return _TIDE_FALLBACK(station_id, start_date, end_date) or {}
+
+def get_tides(station_id, start_date, end_date) -> dict:
+    """
+    Bulk tide lookup: {date: [ {type, time, height}, ... ]} for the date range.
+    Served from the process-wide index without re-parsing; falls back to the
+    installed fetcher (NOAA API) only when the local file has nothing for the range.
+    The returned event lists are shared with the index -- treat them as read-only.
+    """
+    tides = _indexed_tides_for_range(station_id, start_date, end_date)
+    if tides:
+        return tides
+    return _fallback_tides(station_id, start_date, end_date)
+
+def get_tides_for_day(station_id, day) -> list[dict]:
+    """Single-day tide lookup (an O(1) dict hit when the station file is indexed). Read-only."""
+    index = _get_station_tide_index(station_id)
+    if index:
+        events = index.get(day)
+        if events is not None:
+            return events
+    return _fallback_tides(station_id, day, day).get(day, [])
+
+def get_tide_array(station_id, start_date, end_date) -> np.ndarray:
+    """
+    Station events as a TIDE_CACHE_DTYPE array covering at least [start_date, end_date].
+    Uses the indexed local data when it covers the range, else the NOAA fallback.
+    """
+    _get_station_tide_index(station_id)
+    arr = _TIDE_ARRAYS.get(str(station_id))
+    if arr is not None and len(arr):
+        days = arr["day"]
+        if days[0] <= start_date.toordinal() and days[-1] >= end_date.toordinal():
+            return arr
+    return _tide_array_from_index(get_tides(station_id, start_date, end_date))
+
+# --- VECTORIZED TIDE-WINDOW ENGINE ---
+# Windows are (start_minute, end_minute) pairs, inclusive, in minutes after local midnight.
+FULL_DAY_WINDOW = (0, 23 * 60 + 59)
+
+def tide_rule_offset_minutes(method, offset_hours, shallow: bool):
+    """
+    Resolves a ramp rule for one draft class, as the slot search applies it:
+      None -> open all day; 0 -> no legal window; N > 0 -> ±N minutes around each high tide.
+      - AnyTide / AnyTideWithDraftRule: open all day for shallow boats only.
+      - HoursAroundHighTide_WithDraftRule: shallow boats open all day, deep boats ±offset.
+      - HoursAroundHighTide: ±offset for everyone.
+    """
+    try:
+        offset_mins = int(round(float(offset_hours or 0.0) * 60))
+    except (TypeError, ValueError):
+        offset_mins = 0
+    if method in ("AnyTide", "AnyTideWithDraftRule"):
+        return None if shallow else 0
+    if method == "HoursAroundHighTide_WithDraftRule":
+        return None if shallow else max(offset_mins, 0)
+    if method == "HoursAroundHighTide":
+        return max(offset_mins, 0)
+    return 0
+
+def compute_tide_windows(tide_arr, offset_minutes, start_date, end_date) -> dict:
+    """
+    Batched window computation for every day in [start_date, end_date].
+    offset_minutes follows tide_rule_offset_minutes(). Windows are taken ±offset
+    around each high tide in absolute time, so a window spilling past midnight
+    lands on the neighbouring day. Returns {date: [(start_min, end_min), ...]}
+    with overlapping windows merged; days without a legal window map to [].
+    """
+    d0, d1 = start_date.toordinal(), end_date.toordinal()
+    table = {dt.date.fromordinal(d): [] for d in range(d0, d1 + 1)}
+    if offset_minutes is None:
+        for d in table:
+            table[d] = [FULL_DAY_WINDOW]
+        return table
+    if not offset_minutes or tide_arr is None or not len(tide_arr):
+        return table
+
+    highs = tide_arr[tide_arr["is_high"]]
+    span_days = offset_minutes // 1440 + 1
+    highs = highs[(highs["day"] >= d0 - span_days) & (highs["day"] <= d1 + span_days)]
+    centers = highs["day"].astype(np.int64) * 1440 + highs["minute"].astype(np.int64)
+    lo, hi = centers - offset_minutes, centers + offset_minutes
+
+    # Split every window at day boundaries; each piece belongs to exactly one day.
+    seg_days, seg_lo, seg_hi = [], [], []
+    for k in range(2 * span_days + 1):
+        day = lo // 1440 + k
+        piece_lo = np.maximum(lo, day * 1440)
+        piece_hi = np.minimum(hi, day * 1440 + 1439)
+        keep = (piece_lo <= piece_hi) & (day >= d0) & (day <= d1)
+        seg_days.append(day[keep])
+        seg_lo.append(piece_lo[keep] - day[keep] * 1440)
+        seg_hi.append(piece_hi[keep] - day[keep] * 1440)
+    days = np.concatenate(seg_days)
+    starts = np.concatenate(seg_lo)
+    ends = np.concatenate(seg_hi)
+    order = np.lexsort((starts, days))
+
+    for day, w0, w1 in zip(days[order].tolist(), starts[order].tolist(), ends[order].tolist()):
+        windows = table[dt.date.fromordinal(day)]
+        if windows and w0 <= windows[-1][1] + 1:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], w1))
+        else:
+            windows.append((w0, w1))
+    return table
+
+def legal_start_windows(ramp_windows, service_type, is_sail, policy=None):
+    """
+    Shifts ramp windows (minutes) into the windows a job may START in, mirroring
+    tide_policy_ok(): launches may start their prep lead before the ramp opens,
+    hauls must finish their on-ramp time before it closes.
+    """
+    policy = (policy or _GLOBAL_TIDE_POLICY or DEFAULT_TIDE_POLICY)
+    if service_type == "Launch":
+        lead = int(policy.get("launch_prep_sail_min", 120) if is_sail else policy.get("launch_prep_power_min", 30))
+        shifted = [(w0 - lead, w1 - lead) for w0, w1 in ramp_windows]
+    elif service_type == "Haul":
+        on_ramp = int(policy.get("haul_close_lead_all_mins", 30))
+        shifted = [(w0, w1 - on_ramp) for w0, w1 in ramp_windows]
+    else:
+        shifted = list(ramp_windows)
+    return [(max(w0, 0), w1) for w0, w1 in shifted if w1 >= max(w0, 0)]
+
+def minute_windows_to_times(windows):
+    return [(dt.time(w0 // 60, w0 % 60), dt.time(w1 // 60, w1 % 60)) for w0, w1 in windows]
+
+# One window table per (station, rule, draft class) per season (calendar year).
+_TIDE_WINDOW_TABLES: dict[tuple, dict] = {}
+
+def get_tide_window_table(station_id, offset_minutes, year: int) -> dict:
+    """Cached {date: [(start_min, end_min), ...]} for a whole year of one station/rule."""
+    key = (str(station_id), offset_minutes, int(year))
+    table = _TIDE_WINDOW_TABLES.get(key)
+    if table is None:
+        start, end = dt.date(year, 1, 1), dt.date(year, 12, 31)
+        arr = get_tide_array(station_id, start, end) if offset_minutes is not None else None
+        table = compute_tide_windows(arr, offset_minutes, start, end)
+        _TIDE_WINDOW_TABLES[key] = table
+    return table
+
+def ramp_tide_windows(ramp, shallow: bool, day) -> list[tuple[int, int]]:
+    """Ramp-open windows (minutes) for one day and draft class, from the shared season table."""
+    if not ramp:
+        return []
+    offset_minutes = tide_rule_offset_minutes(
+        getattr(ramp, "tide_calculation_method", "AnyTide"),
+        getattr(ramp, "tide_offset_hours1", 0.0),
+        shallow,
+    )
+    station_id = getattr(ramp, "noaa_station_id", None) or DEFAULT_NOAA_STATION
+    return get_tide_window_table(station_id, offset_minutes, day.year).get(day, [])
+
+def is_shallow_draft(boat) -> bool:
+    """Draft class used by the slot search: shallow means ≤ 5 ft (unknown counts as shallow)."""
+    try:
+        return float(getattr(boat, "draft_ft", 0.0) or 0.0) <= 5.0
+    except (ValueError, TypeError):
+        return True
+
+# --- MEMOIZED LEGAL-WINDOW TABLE ---
+# Bounded LRU of legal start windows (minutes) per ramp/draft class/day/service/policy.
+# Consulted by the slot search and passes_tide_rules; cleared when ramps reload.
+LEGAL_WINDOW_CACHE_MAX = 4096
+_LEGAL_WINDOW_CACHE: "OrderedDict[tuple, list[tuple[int, int]]]" = OrderedDict()
+_LEGAL_WINDOW_CACHE_LOCK = threading.Lock()   # script threads and the background refresh share the LRU
+LEGAL_WINDOW_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+def _tide_policy_key(policy) -> tuple:
+    return tuple(sorted((str(k), repr(v)) for k, v in (policy or {}).items()))
+
+def cached_legal_windows(ramp, shallow: bool, day, service_type=None, is_sail=False, policy=None) -> list[tuple[int, int]]:
+    """
+    Legal start windows (minutes after midnight) for a ramp, draft class and day.
+    With service_type=None these are the plain ramp-open windows; for "Launch"/"Haul"
+    the policy leads from legal_start_windows() are applied.
+    """
+    policy = (policy or _GLOBAL_TIDE_POLICY or DEFAULT_TIDE_POLICY)
+    key = (str(getattr(ramp, "ramp_id", ramp)), bool(shallow), day, service_type, bool(is_sail), _tide_policy_key(policy))
+    with _LEGAL_WINDOW_CACHE_LOCK:
+        windows = _LEGAL_WINDOW_CACHE.get(key)
+        if windows is not None:
+            _LEGAL_WINDOW_CACHE.move_to_end(key)
+            LEGAL_WINDOW_CACHE_STATS["hits"] += 1
+            return windows
+        LEGAL_WINDOW_CACHE_STATS["misses"] += 1
+
+    # Computed outside the lock; two threads missing the same key just both compute it
+    windows = ramp_tide_windows(ramp, shallow, day)
+    if service_type is not None:
+        windows = legal_start_windows(windows, service_type, is_sail, policy)
+    with _LEGAL_WINDOW_CACHE_LOCK:
+        _LEGAL_WINDOW_CACHE[key] = windows
+        if len(_LEGAL_WINDOW_CACHE) > LEGAL_WINDOW_CACHE_MAX:
+            _LEGAL_WINDOW_CACHE.popitem(last=False)
+            LEGAL_WINDOW_CACHE_STATS["evictions"] += 1
+    return windows
+
+def invalidate_tide_window_caches():
+    """Drops memoized legal windows and season window tables (call after ramps reload)."""
+    with _LEGAL_WINDOW_CACHE_LOCK:
+        _LEGAL_WINDOW_CACHE.clear()
+        _TIDE_WINDOW_TABLES.clear()
+        LEGAL_WINDOW_CACHE_STATS["invalidations"] += 1
+
+def get_legal_window_cache_stats() -> dict:
+    """Hit/miss counters for monitoring the legal-window cache."""
+    stats = dict(LEGAL_WINDOW_CACHE_STATS)
+    lookups = stats["hits"] + stats["misses"]
+    stats.update({
+        "size": len(_LEGAL_WINDOW_CACHE),
+        "max_size": LEGAL_WINDOW_CACHE_MAX,
+        "hit_rate": (stats["hits"] / lookups) if lookups else 0.0,
+    })
+    return stats
+
+def _minute_in_windows(minute: int, windows) -> bool:
+    for w0, w1 in windows:
+        if w0 <= minute <= w1:
+            return True
+    return False
+
+
+# --- TRUCK BUSY-INTERVAL INDEXES ---
+class TruckDayIndex:
+    """
+    Busy intervals for one truck on one day, merged and sorted so overlap
+    checks are a bisect (O(log n)) and free gaps can be read off directly.
+    """
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals=()):
+        self.starts: list = []
+        self.ends: list = []
+        for busy_start, busy_end in sorted(intervals):
+            self.add(busy_start, busy_end)
+
+    def add(self, busy_start, busy_end):
+        """Inserts a busy interval, merging it with any intervals it overlaps or touches."""
+        i = bisect.bisect_left(self.ends, busy_start)
+        j = bisect.bisect_right(self.starts, busy_end)
+        if i < j:
+            busy_start = min(busy_start, self.starts[i])
+            busy_end = max(busy_end, self.ends[j - 1])
+        self.starts[i:j] = [busy_start]
+        self.ends[i:j] = [busy_end]
+
+    def is_free(self, start_dt, end_dt) -> bool:
+        """True if [start_dt, end_dt) does not overlap any busy interval."""
+        i = bisect.bisect_right(self.ends, start_dt)
+        return i == len(self.starts) or self.starts[i] >= end_dt
+
+    def next_free(self, start_dt):
+        """Earliest time >= start_dt that is not inside a busy interval."""
+        i = bisect.bisect_right(self.ends, start_dt)
+        if i < len(self.starts) and self.starts[i] <= start_dt:
+            return self.ends[i]
+        return start_dt
+
+    def earliest_fit(self, start_dt, duration):
+        """Earliest time >= start_dt at which [t, t + duration) overlaps no busy interval."""
+        i = bisect.bisect_right(self.ends, start_dt)
+        while i < len(self.starts) and self.starts[i] < start_dt + duration:
+            start_dt = self.ends[i]
+            i += 1
+        return start_dt
+
+    def free_gaps(self, open_dt, close_dt) -> list[tuple]:
+        """Free (start, end) gaps between open_dt and close_dt."""
+        gaps, cursor = [], open_dt
+        i = bisect.bisect_right(self.ends, open_dt)
+        while i < len(self.starts) and self.starts[i] < close_dt:
+            if self.starts[i] > cursor:
+                gaps.append((cursor, self.starts[i]))
+            cursor = max(cursor, self.ends[i])
+            i += 1
+        if cursor < close_dt:
+            gaps.append((cursor, close_dt))
+        return gaps
+
+    def copy(self) -> TruckDayIndex:
+        clone = TruckDayIndex()
+        clone.starts, clone.ends = list(self.starts), list(self.ends)
+        return clone
+
+    def __len__(self):
+        return len(self.starts)
+
+_EMPTY_TRUCK_DAY = TruckDayIndex()
+
+class CompiledSchedule(dict):
+    """
+    {truck_id: [(start_dt, end_dt), ...]} as built by _compile_truck_schedules,
+    plus a per-truck, per-day TruckDayIndex and per-day job counts (by start date).
+    """
+    def __init__(self):
+        super().__init__()
+        self.day_index: dict[str, dict[dt.date, TruckDayIndex]] = {}
+        self.day_counts: dict[str, Counter] = {}
+
+    def add_interval(self, truck_id, busy_start, busy_end):
+        truck_id = str(truck_id)
+        self.setdefault(truck_id, []).append((busy_start, busy_end))
+        self.day_counts.setdefault(truck_id, Counter())[busy_start.date()] += 1
+        by_day = self.day_index.setdefault(truck_id, {})
+        day = busy_start.date()
+        while day <= busy_end.date():
+            by_day.setdefault(day, TruckDayIndex()).add(busy_start, busy_end)
+            day += timedelta(days=1)
+
+    def remove_interval(self, truck_id, busy_start, busy_end):
+        """Drops one busy interval and re-merges the days it covered from what is left."""
+        truck_id = str(truck_id)
+        intervals = self.get(truck_id, [])
+        if (busy_start, busy_end) not in intervals:
+            return
+        intervals.remove((busy_start, busy_end))
+        self.day_counts[truck_id][busy_start.date()] -= 1
+        by_day = self.day_index.get(truck_id, {})
+        day = busy_start.date()
+        while day <= busy_end.date():
+            remaining = [iv for iv in intervals if iv[0].date() <= day <= iv[1].date()]
+            if remaining:
+                by_day[day] = TruckDayIndex(remaining)
+            else:
+                by_day.pop(day, None)
+            day += timedelta(days=1)
+
+    def copy(self) -> CompiledSchedule:
+        """An independent copy: intervals added to or removed from it leave this one as it was."""
+        clone = CompiledSchedule()
+        clone.update({truck_id: list(intervals) for truck_id, intervals in self.items()})
+        clone.day_index = {truck_id: {day: index.copy() for day, index in by_day.items()}
+                           for truck_id, by_day in self.day_index.items()}
+        clone.day_counts = {truck_id: Counter(counts) for truck_id, counts in self.day_counts.items()}
+        return clone
+
+    def truck_day(self, truck_id, day) -> TruckDayIndex:
+        return self.day_index.get(str(truck_id), {}).get(day, _EMPTY_TRUCK_DAY)
+
+    def jobs_on_day(self, truck_id, day) -> int:
+        return self.day_counts.get(str(truck_id), {}).get(day, 0)
+
+    def is_free(self, truck_id, start_dt, end_dt) -> bool:
+        day = start_dt.date()
+        while day <= end_dt.date():
+            if not self.truck_day(truck_id, day).is_free(start_dt, end_dt):
+                return False
+            day += timedelta(days=1)
+        return True
+
+def _as_compiled_schedule(schedule) -> CompiledSchedule:
+    """Accepts a CompiledSchedule or a plain {truck_id: [(start, end), ...]} dict."""
+    if isinstance(schedule, CompiledSchedule):
+        return schedule
+    compiled = CompiledSchedule()
+    for truck_id, intervals in (schedule or {}).items():
+        for busy_start, busy_end in intervals:
+            compiled.add_interval(truck_id, busy_start, busy_end)
+    return compiled
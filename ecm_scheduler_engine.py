@@ -0,0 +1,1259 @@
+"""
+Headless slot-search engine.
+
+Everything the slot search needs is passed in explicitly: a master data view
+(trucks, ramps, boats, customers, truck hours, ideal crane days), the scheduled
+jobs and their ScheduleModel, the tide policy, a coordinates resolver, the
+town-to-ramp travel matrix and the booking rules. Nothing here reads Streamlit
+state, secrets or the database, so a CLI, a worker process or a test harness
+can build a SchedulingEngine and search at full speed. ecm_scheduler_logic
+binds one to its module globals for the app.
+"""
+from __future__ import annotations
+
+import calendar
+import csv
+import datetime as dt
+import os
+import random
+import re
+from datetime import timedelta, timezone
+
+import numpy as np
+
+from ecm_scheduler_core import (
+    DEBUG_MESSAGES, DEFAULT_TIDE_POLICY, _log_debug,
+    Job, CompiledSchedule, _as_compiled_schedule,
+    _calculate_distance_miles, haversine_miles_pairwise, haversine_miles_legs,
+    get_tides, get_tides_for_day,
+    cached_legal_windows, minute_windows_to_times, is_shallow_draft,
+)
+
+BOOKING_RULES = {
+    'Powerboat':  {'truck_mins': 90,  'crane_mins': 0},
+    'Sailboat DT':{'truck_mins': 180, 'crane_mins': 60},
+    'Sailboat MT':{'truck_mins': 180, 'crane_mins': 90},
+}
+
+YARD_ADDRESS = "43 Mattakeesett St, Pembroke, MA 02359"
+YARD_COORDS = (42.0833, -70.7681)  # Pembroke
+
+# === Distance knobs (default if UI doesn't pass one) ===
+DEFAULT_MAX_JOB_DISTANCE_MILES = 10
+AVERAGE_SPEED_MPH = 35  # for minutes→miles when using the time matrix
+
+_SCITUATE_STATION = "8445138"  # permanent fallback per your rules
+
+
+# --- STRICT ADDRESS PARSERS & FILTERS ---
+
+_POBOX_PATTERNS = (
+    r'\bP\.?\s*O\.?\s*Box\b',
+    r'\bPO\s*Box\b',
+    r'\bPost\s*Office\s*Box\b',
+)
+
+def _looks_like_pobox(s: str) -> bool:
+    if not isinstance(s, str):
+        return False
+    s_norm = s.strip()
+    for pat in _POBOX_PATTERNS:
+        if re.search(pat, s_norm, flags=re.IGNORECASE):
+            return True
+    return False
+
+def _get_town_from_address(address: str) -> str | None:
+    """
+    Extract a Massachusetts town/city from a free-form address line.
+    Rules:
+      - If PO Box is present anywhere, return None.
+      - Prefer token immediately before 'MA' or 'Massachusetts'.
+      - Clean trailing state/zip tokens.
+      - Reject obviously bad tokens (too short, numeric-heavy).
+    """
+    if not isinstance(address, str):
+        return None
+
+    addr = address.strip()
+    if not addr or addr.upper() == "MISSING":
+        return None
+    if _looks_like_pobox(addr):
+        return None
+
+    # Normalize multiple spaces, strip commas
+    addr = re.sub(r'\s+', ' ', addr.replace(' ,', ',').replace(', ,', ',')).strip()
+
+    # Try to capture "... , <Town> , MA <ZIP>" OR "... <Town> MA <ZIP>"
+    # We only care about the <Town> token.
+    # Examples this handles:
+    #   "18 Creek Road, Marshfield MA 02050"
+    #   "19 Anderson Drive, Marshfield, MA 02050"
+    #   "Hingham MA 02043"
+    #   "69 Old Main Street, Marshfield Hills, MA"
+    town = None
+
+    # 1) Comma-friendly pattern: last token before MA/Massachusetts
+    m = re.search(r',\s*([^,]+?)\s*,\s*(?:MA|Massachusetts)\b', addr, flags=re.IGNORECASE)
+    if m:
+        town = m.group(1).strip()
+    else:
+        # 2) Space-only pattern: token(s) before MA
+        m2 = re.search(r'\b([^,]+?)\s+(?:MA|Massachusetts)\b', addr, flags=re.IGNORECASE)
+        if m2:
+            # This can capture "Marshfield MA" or "Marshfield Hills MA"
+            # We may still have a leading street segment; try to trim that by taking the last 1–3 words.
+            candidate = m2.group(1).strip()
+            parts = candidate.split()
+            # Heuristic: town names are usually last 1–3 words in the run-up to MA
+            town = " ".join(parts[-3:]).strip()
+
+    if not town:
+        return None
+
+    # Clean zip remnants or trailing punctuation
+    town = re.sub(r'\d{5}(-\d{4})?$', '', town).strip(' ,')
+
+    # Reject bad tokens (too short or clearly not a town)
+    if len(town) < 2:
+        return None
+    # Too many digits means it isn't a town
+    if sum(ch.isdigit() for ch in town) > 0:
+        return None
+
+    return town
+
+def _abbreviate_town(address):
+    if not address: return ""
+    if address.isdigit(): return "Pem"
+    abbr_map = { "pembroke": "Pemb", "Brockton": "Brock", "east bridgewater": "E Bridge", "west bridgewater": "W Bridge", "scituate": "Sci", "green harbor": "Grn Harb", "marshfield": "Mfield", "cohasset": "Coh", "weymouth": "Wey", "plymouth": "Ply", "sandwich": "Sand", "duxbury": "Dux", "humarock": "Hum", "hingham": "Hing", "hull": "Hull", "norwell": "Norw", "boston": "Bos", "quincy": "Qui", "kingston": "King", "hanover": "Hnvr", "rockland": "Rock" }
+    if 'HOME' in address.upper(): return "Pem"
+    address_lower = address.lower()
+    for town, abbr in abbr_map.items():
+        if town in address_lower: return abbr
+    return address.title().split(',')[0][:3]
+
+
+# --- Pure search helpers ---
+
+def get_concise_tide_rule(ramp, boat):
+    if ramp.tide_calculation_method == "AnyTide": return "Any Tide"
+    if ramp.tide_calculation_method == "AnyTideWithDraftRule": return "Any Tide (<5' Draft)" if boat.draft_ft and boat.draft_ft < 5.0 else "3 hrs +/- High Tide (≥5' Draft)"
+    return f"{float(ramp.tide_offset_hours1):g} hrs +/- HT" if ramp.tide_offset_hours1 else "Tide Rule N/A"
+
+def _calculate_target_date_score(slot_date, target_date):
+    """
+    Calculates a score based on how close the slot_date is to the target_date.
+    A score of 100 is given for the exact date, with the score decreasing for
+    each day further away.
+    """
+    if target_date is None:
+        return 0 # No score if no target date is provided
+
+    days_difference = abs((slot_date - target_date).days)
+
+    # Give a high score for the target date and a decreasing score for surrounding days
+    # This formula gives 100 for the target date, 90 for +/- 1 day, 80 for +/- 2 days, etc.
+    score = max(0, 100 - (days_difference * 10))
+    return score
+
+def get_low_tide_prime_days(station_id: str, start_day: dt.date, end_day: dt.date) -> set[dt.date]:
+    """
+    Returns a set of dates in [start_day, end_day] where there is at least one LOW tide
+    between 11:00 and 13:00 local (rounded times in your data are fine).
+    """
+    prime = set()
+    tides_by_day = get_tides(station_id, start_day, end_day)
+    if not tides_by_day:
+        return prime
+    for d, readings in tides_by_day.items():
+        for t in readings:
+            if t.get("type") == "L":
+                tt = t.get("time")
+                if isinstance(tt, dt.time):
+                    if dt.time(11, 0) <= tt <= dt.time(13, 0):
+                        prime.add(d)
+                        break
+    return prime
+
+def order_dates_with_low_tide_bias(requested_date: dt.date, candidate_dates: list[dt.date], prime_days: set[dt.date]) -> list[dt.date]:
+    """
+    Reorders candidate_dates:
+      1) First: all candidate dates that are prime AND within ±3 days of requested_date,
+         ordered by absolute proximity to requested_date (tie-break: earlier first).
+      2) Then: the remaining candidate dates, ordered by proximity to requested_date.
+    """
+    def _dist(d: dt.date) -> int:
+        return abs((d - requested_date).days)
+    near_prime = [d for d in candidate_dates if d in prime_days and _dist(d) <= 3]
+    rest = [d for d in candidate_dates if d not in near_prime]
+    near_prime.sort(key=lambda d: (_dist(d), d))
+    rest.sort(key=lambda d: (_dist(d), d))
+    return near_prime + rest
+
+def _count_jobs_on_truck_day(truck_id, date_obj, compiled_schedule):
+    """Counts jobs already on a truck's given day using compiled_schedule."""
+    if isinstance(compiled_schedule, CompiledSchedule):
+        return compiled_schedule.jobs_on_day(truck_id, date_obj)
+    cnt = 0
+    for busy_start, _ in compiled_schedule.get(str(truck_id), []):
+        if busy_start.date() == date_obj:
+            cnt += 1
+    return cnt
+
+def _total_jobs_from_compiled_schedule(compiled_schedule):
+    """compiled_schedule is {truck_id: [(start_dt, end_dt), ...]}"""
+    try:
+        return sum(len(v) for v in compiled_schedule.values())
+    except Exception:
+        return 0
+
+def find_available_ramps_for_boat(boat, all_ramps):
+    """
+    Finds a list of ramp IDs suitable for a given boat by checking the boat's type
+    against a ramp's allowed boat types.
+    """
+    matching_ramp_ids = []
+    for ramp_id, ramp in all_ramps.items():
+        # This check ensures both objects have the attributes we need, preventing crashes.
+        if hasattr(boat, 'boat_type') and hasattr(ramp, 'allowed_boat_types'):
+            # The 'in' operator checks if the boat's type is in the ramp's list of allowed types
+            if boat.boat_type in ramp.allowed_boat_types:
+                matching_ramp_ids.append(ramp_id)
+
+    # If no specific ramps match (e.g., for a rare boat type),
+    # return all ramps to allow for a manual override in the UI.
+    if not matching_ramp_ids:
+        return list(all_ramps.keys())
+
+    return matching_ramp_ids
+
+def read_travel_time_matrix(path) -> dict:
+    """{town: {ramp_name: minutes}} from a town,ramp,minutes CSV with a header row."""
+    matrix = {}
+    with open(path, mode='r', encoding='utf-8') as infile:
+        reader = csv.reader(infile)
+        next(reader)  # header
+        for from_town, to_ramp, minutes in reader:
+            matrix.setdefault(from_town, {})[to_ramp] = int(minutes)
+    return matrix
+
+# Bundled town/village centres, so a boat without storage coordinates resolves
+# to its town with a dict lookup instead of a live geocode.
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ma_town_centroids.csv")
+
+def read_town_gazetteer(path=GAZETTEER_PATH) -> dict:
+    """{lower-cased town: (lat, lon)} from a town,latitude,longitude CSV ('#' lines are comments)."""
+    try:
+        with open(path, mode='r', encoding='utf-8') as infile:
+            reader = csv.DictReader(line for line in infile if not line.startswith('#'))
+            return {row['town'].strip().lower(): (float(row['latitude']), float(row['longitude'])) for row in reader}
+    except OSError as e:
+        _log_debug(f"WARNING: town gazetteer {path} unavailable: {e}")
+        return {}
+
+TOWN_CENTROIDS = read_town_gazetteer()
+
+def town_centroid(town):
+    """(lat, lon) of a town or village from the bundled gazetteer, or None."""
+    return TOWN_CENTROIDS.get(" ".join(str(town or "").split()).lower())
+
+def working_dates(start_date, end_date):
+    """Days in [start_date, end_date] the yard works: no Sundays, Saturdays only in May and September."""
+    valid_dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        wd = current_date.weekday()
+        is_sun = (wd == 6)
+        is_sat = (wd == 5)
+        if not is_sun and (not is_sat or current_date.month in (5, 9)):
+            valid_dates.append(current_date)
+        current_date += dt.timedelta(days=1)
+    return valid_dates
+
+
+class StaticCoords:
+    """
+    Coordinates resolver that never geocodes: ramp and boat coordinates from the
+    master data, town centers from `town_centers` ({town: (lat, lon)}), the
+    bundled gazetteer or the `geocodes` store (a GeocodeStore, read only), else
+    `fallback` (the yard; None leaves the place unresolved). Called like
+    get_location_coords(address=, ramp_id=, boat_id=).
+    """
+    def __init__(self, master, town_centers=None, geocodes=None, fallback=YARD_COORDS):
+        self.master = master
+        self.town_centers = town_centers if town_centers is not None else {}
+        self.geocodes = geocodes
+        self.fallback = fallback
+
+    def _stored(self, query):
+        if self.geocodes is None:
+            return None
+        try:
+            return self.geocodes.get(query)
+        except KeyError:
+            return None
+
+    def __call__(self, address=None, ramp_id=None, boat_id=None, service_type=None):
+        if ramp_id:
+            ramp = self.master.ramps.get(str(ramp_id))
+            if ramp and ramp.latitude is not None and ramp.longitude is not None:
+                return (ramp.latitude, ramp.longitude)
+            if ramp and ramp.ramp_name and (coords := self._stored(f"{ramp.ramp_name}, MA")):
+                return coords
+        if boat_id:
+            boat = self.master.boats.get(int(boat_id))
+            if boat:
+                if boat.storage_latitude is not None and boat.storage_longitude is not None:
+                    return (boat.storage_latitude, boat.storage_longitude)
+                town = _get_town_from_address(boat.storage_address)
+                if town in self.town_centers:
+                    return self.town_centers[town]
+                if coords := town_centroid(town):
+                    return coords
+                if town and (coords := self._stored(f"{town}, MA")):
+                    self.town_centers[town] = coords
+                    return coords
+        return self.fallback
+
+
+ROAD_FACTOR = 1.3   # road miles per straight-line mile when there is no travel-matrix entry
+MIN_TRAVEL_MINUTES = 10       # floor for any leg: getting in and out of the truck
+MISSING_TRAVEL_MINUTES = 15   # a leg with an unknown end
+
+class StraightLineTravelTimes:
+    """
+    Default travel-time provider: straight-line miles * ROAD_FACTOR at
+    AVERAGE_SPEED_MPH, at least MIN_TRAVEL_MINUTES, MISSING_TRAVEL_MINUTES when
+    either end is unknown. A provider is anything with minutes(origin,
+    destination) -> int and minutes_many(origins, destinations) -> array; see
+    ecm_road_network.RoadTravelTimes for the road-graph one.
+    """
+    name = "straight-line"
+
+    def minutes(self, origin, destination) -> int:
+        if not origin or not destination:
+            return MISSING_TRAVEL_MINUTES
+        miles = _calculate_distance_miles(origin, destination) * ROAD_FACTOR
+        return max(MIN_TRAVEL_MINUTES, int(miles / AVERAGE_SPEED_MPH * 60))
+
+    def minutes_many(self, origins, destinations) -> np.ndarray:
+        miles = haversine_miles_legs(origins, destinations) * ROAD_FACTOR
+        minutes = np.maximum(MIN_TRAVEL_MINUTES, np.floor(miles / AVERAGE_SPEED_MPH * 60))
+        return np.where(np.isnan(miles), MISSING_TRAVEL_MINUTES, minutes)
+
+class BoatRampDistances:
+    """
+    Estimated trip miles from every boat's storage to every ramp, built once in a
+    vectorized pass: haversine * ROAD_FACTOR over the resolved coordinates,
+    overlaid with travel-matrix minutes (at AVERAGE_SPEED_MPH) where the storage
+    town has an entry. Also keeps the raw matrix minutes score_candidate's
+    proximity bonus reads. Lookups are two dict hits and an array index.
+    Boats and ramps `coords` returns nothing for are left out of miles(), so
+    callers can work those out on demand.
+    """
+    def __init__(self, boats, ramps, coords, travel_time_matrix=None):
+        travel_time_matrix = travel_time_matrix or {}
+        boats = list(boats.values())
+        ramps = list(ramps.items())
+        self.boat_index = {boat.boat_id: i for i, boat in enumerate(boats)}
+        self.ramp_index = {str(ramp_id): j for j, (ramp_id, _) in enumerate(ramps)}
+
+        def _resolve(**kw):
+            try:
+                return coords(**kw) or (np.nan, np.nan)
+            except Exception:
+                return (np.nan, np.nan)
+
+        boat_xy = np.array([_resolve(boat_id=boat.boat_id) for boat in boats], dtype=float).reshape(-1, 2)
+        ramp_xy = np.array([_resolve(ramp_id=ramp_id) for ramp_id, _ in ramps], dtype=float).reshape(-1, 2)
+        self.unresolved_boats = {boat.boat_id for boat, xy in zip(boats, boat_xy) if np.isnan(xy).any()}
+        self.unresolved_ramps = {str(ramp_id) for (ramp_id, _), xy in zip(ramps, ramp_xy) if np.isnan(xy).any()}
+        miles = haversine_miles_pairwise(boat_xy, ramp_xy) * ROAD_FACTOR
+        miles[~np.isfinite(miles) | (miles == 0)] = np.nan   # estimate_trip_miles' "no estimate"
+
+        self.proximity_minutes = np.full(miles.shape, np.nan)
+        ramp_names = [getattr(ramp, "ramp_name", None) for _, ramp in ramps]
+        for i, boat in enumerate(boats):
+            address = getattr(boat, "storage_address", None)
+            if address:
+                row = travel_time_matrix.get(_get_town_from_address(address) or _abbreviate_town(address)) or {}
+                for j, name in enumerate(ramp_names):
+                    minutes = row.get(name) if name else None
+                    if isinstance(minutes, (int, float)) and 0 < minutes < float('inf'):
+                        miles[i, j] = (minutes / 60.0) * AVERAGE_SPEED_MPH
+            try:
+                row = travel_time_matrix.get(_abbreviate_town(address), {})
+            except Exception:
+                continue
+            for j, name in enumerate(ramp_names):
+                minutes = row.get(name)
+                if minutes is not None:
+                    self.proximity_minutes[i, j] = minutes
+        self.miles_matrix = miles
+
+    def _index(self, boat_id, ramp_id):
+        """(row, col) for a boat and ramp; KeyError if either wasn't in the master data."""
+        return self.boat_index[boat_id], self.ramp_index[str(ramp_id)]
+
+    def miles(self, boat_id, ramp_id):
+        """Estimated trip miles, or None if there is no estimate; KeyError for a boat or ramp that wasn't placed."""
+        index = self._index(boat_id, ramp_id)
+        if boat_id in self.unresolved_boats or str(ramp_id) in self.unresolved_ramps:
+            if not np.isfinite(self.miles_matrix[index]):   # no travel-matrix minutes to fall back on either
+                raise KeyError((boat_id, ramp_id))
+        value = self.miles_matrix[index]
+        return None if np.isnan(value) else float(value)
+
+    def matrix_minutes(self, boat_id, ramp_id):
+        """Travel-matrix minutes for the boat's abbreviated storage town to the ramp, or None."""
+        value = self.proximity_minutes[self._index(boat_id, ramp_id)]
+        return None if np.isnan(value) else float(value)
+
+
+class ScheduleModel:
+    """
+    The compiled schedule and each truck's last stop per day, kept in step with
+    a job list. Built once, then patched job by job as jobs are scheduled,
+    parked or cancelled; `version` moves on every change. `coords` resolves a
+    job's drop-off the way get_location_coords does.
+    """
+    def __init__(self, coords):
+        self.coords = coords
+        self.compiled = CompiledSchedule()
+        self.daily_last_locations: dict[str, dict[dt.date, tuple]] = {}
+        self.version = -1
+        self._job_entries: dict = {}   # job -> [(truck_id, start, end), ...]
+        self._stops: dict = {}         # (truck_id, date) -> {job: (end, start, coords)}
+
+    def rebuild(self, jobs):
+        self.__init__(self.coords)
+        for job in sorted([j for j in jobs if j.scheduled_start_datetime],
+                          key=lambda j: j.scheduled_start_datetime):
+            self.add_job(job)
+
+    def copy(self) -> ScheduleModel:
+        """A model to patch independently of this one, without recompiling; the Job objects are shared."""
+        clone = ScheduleModel(self.coords)
+        clone.compiled = self.compiled.copy()
+        clone.daily_last_locations = {truck_id: dict(by_day) for truck_id, by_day in self.daily_last_locations.items()}
+        clone.version = self.version
+        clone._job_entries = {job: list(entries) for job, entries in self._job_entries.items()}
+        clone._stops = {key: dict(stops) for key, stops in self._stops.items()}
+        return clone
+
+    def add_job(self, job):
+        if job in self._job_entries or job.job_status != "Scheduled" or not job.scheduled_start_datetime:
+            return
+
+        job_date = job.scheduled_start_dt.date()
+        job_dropoff_coords = self.coords(
+            address=job.dropoff_street_address,
+            ramp_id=job.dropoff_ramp_id
+        )
+        if not job_dropoff_coords:
+            job_dropoff_coords = self.coords(address=YARD_ADDRESS)
+
+        entries = []
+        # Hauling truck, then crane truck (busy until S17_busy_end_datetime)
+        for truck_id, busy_end in (
+            (getattr(job, 'assigned_hauling_truck_id', None), job.scheduled_end_datetime),
+            (getattr(job, 'assigned_crane_truck_id', None), getattr(job, 'S17_busy_end_datetime', None)),
+        ):
+            if not (truck_id and busy_end):
+                continue
+            truck_id = str(truck_id)
+            self.compiled.add_interval(truck_id, job.scheduled_start_datetime, busy_end)
+            entries.append((truck_id, job.scheduled_start_datetime, busy_end))
+            self._stops.setdefault((truck_id, job_date), {})[job] = (busy_end, job.scheduled_start_datetime, job_dropoff_coords)
+            self._refresh_last_stop(truck_id, job_date)
+        self._job_entries[job] = entries
+
+    def remove_job(self, job):
+        for truck_id, busy_start, busy_end in self._job_entries.pop(job, []):
+            self.compiled.remove_interval(truck_id, busy_start, busy_end)
+            job_date = busy_start.date()
+            self._stops.get((truck_id, job_date), {}).pop(job, None)
+            self._refresh_last_stop(truck_id, job_date)
+
+    def _refresh_last_stop(self, truck_id, job_date):
+        """Last stop = latest-ending job that day; on a tie the earlier start wins."""
+        stops = self._stops.get((truck_id, job_date))
+        by_day = self.daily_last_locations.setdefault(truck_id, {})
+        if not stops:
+            by_day.pop(job_date, None)
+            return
+        end, _, coords = min(stops.values(), key=lambda s: (-s[0].timestamp(), s[1]))
+        by_day[job_date] = (end, coords)
+
+
+class SlotSearchContext:
+    """
+    Invariants of one slot search (boat, ramp, service, distance limit), worked
+    out once instead of per day/truck/start time: job duration, draft class,
+    crane minutes, the S17 truck id, the job's coords and, lazily, the distance
+    from each truck's last stop of a day.
+    """
+    def __init__(self, engine, *, boat, service_type, ramp_id, crane_needed,
+                 daily_last_locations=None, max_distance_miles=None):
+        self.engine = engine
+        self.boat = boat
+        self.service_type = service_type
+        self.ramp_id = ramp_id
+        self.ramp = engine.ramp(ramp_id)
+        self.daily_last_locations = daily_last_locations or {}
+        self.max_distance_miles = max_distance_miles
+
+        boat_type = (getattr(boat, "boat_type", "") or "").lower()
+        self.is_sail = "sail" in boat_type
+        duration_mins = 180 if service_type in ("Launch", "Haul") and self.is_sail else 90
+        self.job_duration = timedelta(minutes=duration_mins)
+        self.shallow = is_shallow_draft(boat)
+
+        rules = engine.booking_rules.get(getattr(boat, "boat_type", None), {}) or {}
+        self.crane_minutes = int(rules.get("crane_mins", 0))
+        self.crane_duration = timedelta(minutes=self.crane_minutes)
+        self.s17_id = engine.s17_truck_id() if (crane_needed and self.crane_minutes > 0) else None
+        self.tide_rule_concise = get_concise_tide_rule(self.ramp, boat) if self.ramp else None
+
+        self._job_coords = None
+        self._job_coords_loaded = False
+        self._last_stop_miles = {}
+
+    @property
+    def job_coords(self):
+        """Where the truck has to get to: the boat for a launch, otherwise the ramp."""
+        if not self._job_coords_loaded:
+            if self.service_type == "Launch":
+                self._job_coords = self.engine.coords(boat_id=self.boat.boat_id)
+            else:
+                self._job_coords = self.engine.coords(ramp_id=self.ramp_id)
+            self._job_coords_loaded = True
+        return self._job_coords
+
+    def last_stop_miles(self, truck_id, day):
+        """Miles from the truck's last stop on `day` to this job, or None if unknown."""
+        key = (str(truck_id), day)
+        if key not in self._last_stop_miles:
+            miles = None
+            last_loc_info = self.daily_last_locations.get(str(truck_id), {}).get(day)
+            if last_loc_info:
+                last_coords = last_loc_info[1]
+                if last_coords and self.job_coords:
+                    miles = _calculate_distance_miles(last_coords, self.job_coords)
+            self._last_stop_miles[key] = miles
+        return self._last_stop_miles[key]
+
+    def too_far(self, truck_id, day) -> bool:
+        """The distance rule depends only on the truck's last stop that day, so it
+        either rules out the whole truck-day or none of it."""
+        if self.max_distance_miles is None:
+            return False
+        miles = self.last_stop_miles(truck_id, day)
+        return miles is not None and miles > self.max_distance_miles
+
+
+class SchedulingEngine:
+    """
+    Slot search over explicit inputs.
+
+    master: anything with trucks, ramps, boats, customers, truck_hours and
+        ideal_crane_days (a MasterData, or a namespace over live dicts).
+    jobs: the scheduled jobs, or a callable returning the current list (read on
+        every use, like schedule); book() appends to it.
+    schedule: a ScheduleModel over jobs, or a callable returning the current
+        one; compiled from jobs on first use if not given.
+    coords: resolver called like get_location_coords; StaticCoords(master) by default.
+    """
+    def __init__(self, master, jobs=None, *, schedule=None, tide_policy=None, coords=None,
+                 travel_time_matrix=None, booking_rules=None, distances=None):
+        self.master = master
+        self._jobs = jobs if jobs is not None else []
+        self.tide_policy = tide_policy
+        self.coords = coords or StaticCoords(master)
+        self.travel_time_matrix = travel_time_matrix if travel_time_matrix is not None else {}
+        self.booking_rules = booking_rules if booking_rules is not None else BOOKING_RULES
+        self._schedule = schedule
+        self._distances = distances
+
+    @property
+    def jobs(self) -> list:
+        return self._jobs() if callable(self._jobs) else self._jobs
+
+    @property
+    def schedule(self) -> ScheduleModel:
+        if self._schedule is None:
+            self._schedule = ScheduleModel(self.coords)
+            self._schedule.rebuild(self.jobs)
+        return self._schedule() if callable(self._schedule) else self._schedule
+
+    @property
+    def distances(self) -> BoatRampDistances:
+        """Boat-to-ramp miles; like schedule, given (or a callable returning one) or built on first use."""
+        if self._distances is None:
+            self._distances = BoatRampDistances(self.master.boats, self.master.ramps, self.coords, self.travel_time_matrix)
+        return self._distances() if callable(self._distances) else self._distances
+
+    # --- master data lookups ---
+
+    def boat(self, boat_id):
+        return self.master.boats.get(boat_id)
+
+    def ramp(self, ramp_id):
+        return self.master.ramps.get(str(ramp_id))
+
+    def customer(self, customer_id):
+        return self.master.customers.get(customer_id)
+
+    def s17_truck_id(self):
+        """Finds the numeric truck_id for the truck named 'S17'."""
+        for truck_id, truck_obj in self.master.trucks.items():
+            if truck_obj.truck_name == "S17":
+                return truck_id
+        return None # Return None if S17 is not found
+
+    def suitable_trucks(self, boat_len, pref_truck_id=None, force_preferred=False):
+        all_suitable = [t for t in self.master.trucks.values() if not t.is_crane and t.max_boat_length is not None and boat_len <= t.max_boat_length]
+        if force_preferred and pref_truck_id and any(t.truck_name == pref_truck_id for t in all_suitable):
+            return [t for t in all_suitable if t.truck_name == pref_truck_id]
+        return all_suitable
+
+    def station_for_ramp(self, ramp_id):
+        """The ramp's NOAA station, or Scituate if it has none."""
+        if ramp_id:
+            r = self.ramp(ramp_id)
+            if r and getattr(r, "noaa_station_id", None):
+                return str(r.noaa_station_id)
+        return _SCITUATE_STATION
+
+    # --- scoring ---
+
+    def estimate_trip_miles(self, boat_id, pickup_ramp_id):
+        """
+        Estimate miles from the boat's storage (or yard fallback) to the pickup ramp.
+        Prefer the travel matrix (minutes) -> miles; fall back to haversine * 1.3 (road factor).
+        Read from the precomputed distances; pairs outside the master data are worked out here.
+        """
+        try:
+            return self.distances.miles(int(boat_id), pickup_ramp_id)
+        except (KeyError, TypeError, ValueError):
+            return self._estimate_trip_miles_uncached(boat_id, pickup_ramp_id)
+
+    def _estimate_trip_miles_uncached(self, boat_id, pickup_ramp_id):
+        try:
+            boat = self.boat(int(boat_id)) if boat_id is not None else None
+        except Exception:
+            boat = None
+        ramp = self.ramp(pickup_ramp_id) if pickup_ramp_id else None
+
+        # Prefer time matrix if we can map storage town → ramp name
+        if boat and getattr(boat, 'storage_address', None) and ramp and getattr(ramp, 'ramp_name', None):
+            storage_town = _get_town_from_address(boat.storage_address) or _abbreviate_town(boat.storage_address)
+            minutes = (self.travel_time_matrix.get(storage_town, {}) or {}).get(ramp.ramp_name)
+            if isinstance(minutes, (int, float)) and minutes > 0 and minutes != float('inf'):
+                return (minutes / 60.0) * AVERAGE_SPEED_MPH
+
+        # Fall back to coordinates
+        try:
+            origin = self.coords(boat_id=boat_id)
+            dest = self.coords(ramp_id=pickup_ramp_id)
+            miles = _calculate_distance_miles(origin, dest) * ROAD_FACTOR
+            if miles and miles != float('inf'):
+                return miles
+        except Exception:
+            pass
+        return None
+
+    def score_candidate(self, slot, compiled_schedule, daily_last_locations, after_threshold=False, prime_days=None):
+        """
+        Larger is better. Uses DYNAMIC scoring and a new rule to fill "tide poor" days.
+        """
+        try:
+            limit = float(slot.get("max_distance_miles", DEFAULT_MAX_JOB_DISTANCE_MILES))
+        except Exception:
+            limit = float(DEFAULT_MAX_JOB_DISTANCE_MILES)
+        try:
+            est_miles = self.estimate_trip_miles(slot.get("boat_id"), slot.get("ramp_id"))
+            if est_miles is not None and float(est_miles) > limit:
+                slot["reject_reason"] = f"Distance {float(est_miles):.1f} mi > {limit:.0f} mi"
+                return -1e9
+        except Exception:
+            pass
+
+        if prime_days is None:
+            prime_days = set()
+
+        score = 0.0
+        truck_id = str(slot.get("truck_id"))
+        date = slot.get("date")
+        ramp_id = str(slot.get("ramp_id"))
+        boat = self.boat(slot.get("boat_id"))
+
+        # Tide poor days: every high tide before 8am or after 3pm
+        is_tide_poor_day = False
+        tides_today = get_tides_for_day(self.ramp(ramp_id).noaa_station_id, date)
+        high_tides = [t["time"] for t in tides_today if t.get("type") == "H"]
+        if high_tides and all(t.hour < 8 or t.hour > 15 for t in high_tides):
+            is_tide_poor_day = True
+
+        # If it's a tough day, give a huge bonus to easy boats at easy ramps to fill the schedule.
+        if is_tide_poor_day:
+            boat_type = getattr(boat, "boat_type", "")
+            draft = float(getattr(boat, "draft_ft", 99))
+            ramp = self.ramp(ramp_id)
+            is_any_tide_ramp = getattr(ramp, "tide_calculation_method", "") in ("AnyTide", "AnyTideWithDraftRule")
+            if "Powerboat" in boat_type and draft <= 5.0 and is_any_tide_ramp:
+                score += 15.0  # Bonus for being an "easy job" on a "hard day"
+
+        n = _count_jobs_on_truck_day(truck_id, date, compiled_schedule)
+
+        # Dynamic scoring based on schedule density
+        if after_threshold:
+            if n == 0: score -= 50.0
+            elif n == 1: score += 20.0
+            elif n == 2: score += 10.0
+            elif n >= 3: score += 5.0
+        else:
+            if n == 0: score += 2.0
+            if n == 1: score += 6.0
+            if n == 2: score += 10.0
+            if n >= 3: score += 8.0
+
+        if slot.get("is_piggyback"):
+            score += 8.0
+
+        try:
+            ramp_details = self.ramp(ramp_id)
+            if boat and ramp_details and hasattr(boat, 'storage_address'):
+                try:
+                    travel_minutes = self.distances.matrix_minutes(boat.boat_id, ramp_id)
+                except KeyError:
+                    storage_town = _abbreviate_town(boat.storage_address)
+                    travel_minutes = self.travel_time_matrix.get(storage_town, {}).get(ramp_details.ramp_name)
+                if travel_minutes is not None:
+                    proximity_bonus = max(0.0, (60 - travel_minutes) / 10.0)
+                    score += proximity_bonus
+        except Exception as e:
+            _log_debug(f"Could not calculate proximity score: {e}")
+
+        if after_threshold and date in prime_days:
+            tide_method = getattr(ramp_details, "tide_calculation_method", "AnyTide") if ramp_details else "AnyTide"
+            boat_type = getattr(boat, "boat_type", "") if boat else ""
+            if "Powerboat" in boat_type and tide_method == "AnyTide":
+                score += 6.0
+            elif "Sailboat" in boat_type:
+                score -= 5.0
+
+        return score
+
+    def select_best_slots(self, all_found_slots, compiled_schedule, daily_last_locations, requested_date, prime_days, k=3):
+        """
+        Rank slots using score_candidate(...) and return top-k.
+        """
+        total_now = _total_jobs_from_compiled_schedule(compiled_schedule)
+        after_threshold = total_now >= 25
+
+        scored = []
+        for s in (all_found_slots or []):
+            try:
+                sc = self.score_candidate(s, compiled_schedule, daily_last_locations, after_threshold=after_threshold, prime_days=prime_days)
+                sc += _calculate_target_date_score(s.get("date"), requested_date)
+            except Exception:
+                sc = float("-inf")
+
+            if sc == float("-inf"):
+                continue
+
+            scored.append((sc, s))
+
+        if not scored:
+            return []
+
+        scored.sort(key=lambda x: x[0], reverse=True)
+        k = max(1, int(k or 1))
+        return [s for _, s in scored[:k]]
+
+    # --- search ---
+
+    def search_context(self, **kwargs) -> SlotSearchContext:
+        return SlotSearchContext(self, **kwargs)
+
+    def find_slot_on_day(
+        self,
+        day,
+        *,
+        boat,
+        service_type,
+        ramp_id,
+        crane_needed,
+        compiled_schedule,
+        customer_id,
+        trucks=None,
+        trucks_to_check=None,        # older name for trucks
+        daily_last_locations=None,
+        tide_policy=None,
+        max_distance_miles=None,
+        is_opportunistic_search=False,
+        context=None,
+    ):
+        """
+        Single-day scanner that integrates time and distance checks.
+
+        Pass the same SlotSearchContext for every day of a search so the per-search
+        invariants (coords, S17 id, durations, last-stop distances) are computed once.
+        """
+        # normalize trucks input
+        if trucks_to_check is None:
+            trucks_to_check = trucks or []
+        if context is None:
+            context = SlotSearchContext(
+                self, boat=boat, service_type=service_type, ramp_id=ramp_id, crane_needed=crane_needed,
+                daily_last_locations=daily_last_locations, max_distance_miles=max_distance_miles,
+            )
+        ramp = context.ramp
+        if not ramp:
+            return None
+
+        is_sail = context.is_sail
+        job_duration = context.job_duration
+
+        tides_today = get_tides_for_day(ramp.noaa_station_id, day)
+        highs = [t["time"] for t in tides_today if t.get("type") == "H" and isinstance(t.get("time"), dt.time)]
+        shallow = context.shallow
+        windows = minute_windows_to_times(cached_legal_windows(ramp, shallow, day))
+        if not windows:
+            return None
+
+        policy = tide_policy or self.tide_policy or DEFAULT_TIDE_POLICY or {}
+        start_windows = cached_legal_windows(ramp, shallow, day, service_type, is_sail, policy)
+        step = timedelta(minutes=int(policy.get("scan_step_mins", 15)))
+        compiled_schedule = _as_compiled_schedule(compiled_schedule)
+        s17_id = context.s17_id
+        crane_day = compiled_schedule.truck_day(str(s17_id), day) if s17_id else None
+        crane_duration = context.crane_duration
+        truck_hours = self.master.truck_hours
+
+        for truck in (trucks_to_check or []):
+            truck_id_str = str(truck.truck_id)
+            # Hours are keyed by the original truck_id, not its string form
+            hours = (truck_hours.get(truck.truck_id, {}) or {}).get(day.weekday())
+            if not hours:
+                continue
+
+            truck_open  = dt.datetime.combine(day, hours[0], tzinfo=timezone.utc)
+            truck_close = dt.datetime.combine(day, hours[1], tzinfo=timezone.utc)
+            reserve_first_slot = timedelta(minutes=90)
+            earliest = truck_open if getattr(boat, "is_ecm_boat", False) else (truck_open + reserve_first_slot)
+            latest_start = truck_close - job_duration
+            if earliest > latest_start:
+                continue
+
+            candidate_ranges = []
+            if windows:
+                for (w0, w1) in windows:
+                    w_start = max(earliest, dt.datetime.combine(day, w0, tzinfo=timezone.utc))
+                    w_end   = min(latest_start, dt.datetime.combine(day, w1, tzinfo=timezone.utc))
+                    if w_start <= w_end:
+                        candidate_ranges.append((w_start, w_end))
+            else:
+                candidate_ranges.append((earliest, latest_start))
+
+            if context.too_far(truck_id_str, day):
+                continue
+
+            hauler_day = compiled_schedule.truck_day(truck_id_str, day)
+
+            def _earliest_feasible(t):
+                """Earliest start >= t inside a legal start window with hauler (and crane) free, or None."""
+                while True:
+                    t_prev = t
+                    minute = t.hour * 60 + t.minute
+                    window = next(((w0, w1) for w0, w1 in start_windows if w1 >= minute), None)
+                    if window is None:
+                        return None
+                    if window[0] > minute:
+                        t = dt.datetime.combine(day, dt.time(window[0] // 60, window[0] % 60), tzinfo=t.tzinfo)
+                    t = hauler_day.earliest_fit(t, job_duration)
+                    if crane_day is not None:
+                        t = crane_day.earliest_fit(t, crane_duration)
+                    if t == t_prev:
+                        return t
+                    if t.date() != day:
+                        return None
+
+            # Jump straight to the next feasible time, then snap up to the scan grid
+            # (range_start + k * step) -- the same starts a step-by-step scan would test.
+            for (range_start, range_end) in candidate_ranges:
+                start_dt = range_start
+                while start_dt <= range_end:
+                    feasible = _earliest_feasible(start_dt)
+                    if feasible is None or feasible > range_end:
+                        break
+                    if feasible != start_dt:
+                        start_dt = range_start + step * -(-(feasible - range_start) // step)
+                        continue
+
+                    end_dt = start_dt + job_duration
+                    crane_end_dt = start_dt + crane_duration if crane_day is not None else None
+                    return {
+                        "is_piggyback": is_opportunistic_search,
+                        "boat_id": boat.boat_id,
+                        "customer_id": customer_id,
+                        "date": day,
+                        "time": start_dt.time(),
+                        "truck_id": truck.truck_id,
+                        "ramp_id": ramp_id,
+                        "service_type": service_type,
+                        "max_distance_miles": max_distance_miles,   # carry the UI limit into the slot
+                        "S17_needed": bool(crane_needed),
+                        "scheduled_end_datetime": end_dt,
+                        "S17_busy_end_datetime": crane_end_dt,
+                        "tide_rule_concise": context.tide_rule_concise,
+                        "high_tide_times": highs,
+                        "boat_draft": getattr(boat, "draft_ft", None),
+                    }
+        return None
+
+    def search_plan(self, boat, selected_ramp_id, requested_date) -> dict:
+        """
+        Which trucks and days find_slots searches for one request, in search order:
+        preferred_trucks / other_trucks, opp_days (piggyback crane days) then
+        fb_days, plus active_crane_days, prime_days and crane_needed.
+        """
+        crane_needed = "Sailboat" in (boat.boat_type or "")
+
+        # --- Truck Separation ---
+        all_suitable_trucks = self.suitable_trucks(boat.boat_length)
+        preferred_trucks, other_trucks = [], []
+        if boat.preferred_truck_id:
+            for t in all_suitable_trucks:
+                (preferred_trucks if t.truck_name == boat.preferred_truck_id else other_trucks).append(t)
+        else:
+            other_trucks = all_suitable_trucks
+
+        # --- Candidate Day Windows ---
+        opp_window = [requested_date + dt.timedelta(days=i) for i in range(-7, 8)]
+        if crane_needed:
+            potential = [d for r_id, d in self.master.ideal_crane_days
+                         if str(r_id) == str(selected_ramp_id) and d >= requested_date]
+            early = [d for d in potential if d <= requested_date + dt.timedelta(days=21)]
+            fb_days = sorted(early)[:30]
+            if not fb_days:
+                wider = [d for d in potential if d <= requested_date + dt.timedelta(days=45)]
+                fb_days = sorted(wider)[:30]
+        else:
+            season_end_date = dt.date(requested_date.year, 10, 31)
+            days_to_search = (season_end_date - requested_date).days + 1
+            if days_to_search < 14:
+                days_to_search = 14
+            fb_days = [requested_date + dt.timedelta(days=i) for i in range(days_to_search)]
+
+        span_start = min(fb_days) if fb_days else requested_date
+        span_end = max(fb_days) if fb_days else requested_date
+        station_id = self.station_for_ramp(selected_ramp_id)
+        prime_days = get_low_tide_prime_days(station_id, span_start, span_end)
+
+        s17_id = self.s17_truck_id()
+        active_crane_days = {
+            j.scheduled_start_dt.date()
+            for j in self.jobs
+            if j.scheduled_start_datetime
+            and j.scheduled_start_dt.date() in opp_window
+            and j.assigned_crane_truck_id == str(s17_id)
+            and (str(j.pickup_ramp_id) == str(selected_ramp_id) or str(j.dropoff_ramp_id) == str(selected_ramp_id))
+        }
+
+        opp_days = sorted(list(active_crane_days), key=lambda d: abs((d - requested_date).days))
+        opp_days = order_dates_with_low_tide_bias(requested_date, opp_days, prime_days)
+        fb_days = order_dates_with_low_tide_bias(requested_date, fb_days, prime_days)
+
+        return {
+            "crane_needed": crane_needed, "preferred_trucks": preferred_trucks, "other_trucks": other_trucks,
+            "opp_days": opp_days, "fb_days": fb_days, "active_crane_days": active_crane_days, "prime_days": prime_days,
+        }
+
+    def find_slots(
+        self,
+        customer_id,
+        boat_id,
+        service_type,
+        requested_date_str,
+        selected_ramp_id,
+        num_suggestions_to_find=3,
+        tide_policy=None,
+        **kwargs
+    ):
+        """
+        Finds available slots by first searching for the preferred truck, then falling
+        back to other trucks. Integrates distance checks into the core search loop.
+        Returns (slots, message, debug_messages, is_error) like find_available_job_slots.
+        """
+        relax_truck_preference = kwargs.get('relax_truck_preference', False)
+        # If the caller didn't pass a value, leave as None; score_candidate falls back to DEFAULT_MAX_JOB_DISTANCE_MILES
+        max_distance_miles = kwargs.get('max_distance_miles', None)
+
+        # --- Validation & Initial Setup ---
+        if not requested_date_str:
+            return [], "Please select a target date before searching.", [], False
+        try:
+            requested_date = dt.datetime.strptime(requested_date_str, "%Y-%m-%d").date()
+        except ValueError:
+            return [], f"Date '{requested_date_str}' is not valid.", [], True
+
+        compiled_schedule, daily_last_locations = self.schedule.compiled, self.schedule.daily_last_locations
+        boat = self.boat(boat_id)
+        if not boat:
+            return [], f"Could not find boat ID: {boat_id}", [], True
+        plan = self.search_plan(boat, selected_ramp_id, requested_date)
+        crane_needed, prime_days = plan["crane_needed"], plan["prime_days"]
+        preferred_trucks, other_trucks = plan["preferred_trucks"], plan["other_trucks"]
+        opp_days, fb_days, active_crane_days = plan["opp_days"], plan["fb_days"], plan["active_crane_days"]
+
+        def _run_search(trucks_to_search, search_message_type, requested_date, prime_days):
+            found = []
+            POOL_CAP = max(20, num_suggestions_to_find * 20)
+
+            # Parameters passed into the daily scanner
+            search_params = {
+                "boat": boat,
+                "service_type": service_type,
+                "ramp_id": selected_ramp_id,
+                "crane_needed": crane_needed,
+                "compiled_schedule": compiled_schedule,
+                "customer_id": customer_id,
+                "trucks": trucks_to_search,
+                "daily_last_locations": daily_last_locations,
+                "tide_policy": tide_policy,
+                "max_distance_miles": max_distance_miles,   # thread through for hard limit
+            }
+            search_params["context"] = SlotSearchContext(
+                self, boat=boat, service_type=service_type, ramp_id=selected_ramp_id, crane_needed=crane_needed,
+                daily_last_locations=daily_last_locations, max_distance_miles=max_distance_miles,
+            )
+
+            # Opportunistic (piggyback) days first
+            for day in opp_days:
+                slot = self.find_slot_on_day(day, is_opportunistic_search=True, **search_params)
+                if slot:
+                    found.append(slot)
+
+            # Then the full fallback search set
+            if len(found) < POOL_CAP:
+                for day in fb_days:
+                    slot = self.find_slot_on_day(
+                        day,
+                        is_opportunistic_search=(day in active_crane_days),
+                        **search_params
+                    )
+                    if slot:
+                        found.append(slot)
+
+            if found:
+                best = self.select_best_slots(
+                    found,
+                    compiled_schedule,
+                    daily_last_locations,
+                    requested_date,
+                    prime_days,
+                    k=num_suggestions_to_find
+                )
+                return (best, f"Found {len(best)} slot(s) using {search_message_type} truck.")
+            return ([], None)
+
+        # --- Try preferred (or any suitable) trucks first ---
+        found_slots, message = [], None
+        trucks_to_try = preferred_trucks if boat.preferred_truck_id else other_trucks
+        if trucks_to_try:
+            search_type = "preferred" if boat.preferred_truck_id else "any suitable"
+            found_slots, message = _run_search(trucks_to_try, search_type, requested_date, prime_days)
+
+        # --- If nothing, optionally relax preference and try the rest ---
+        if (not found_slots) and relax_truck_preference and other_trucks:
+            found_slots, message = _run_search(other_trucks, "other", requested_date, prime_days)
+
+        if found_slots:
+            return (found_slots, message, [], False)
+
+        return ([], "No slots found after extensive search.", DEBUG_MESSAGES, True)
+
+    # --- booking ---
+
+    def job_from_slot(self, final_slot: dict):
+        """The Job a chosen slot books (not yet saved or added), or None if its boat is unknown."""
+        boat = self.boat(final_slot.get('boat_id'))
+        if not boat:
+            return None
+
+        start_dt = dt.datetime.combine(final_slot['date'], final_slot['time'], tzinfo=timezone.utc)
+
+        # Use the full end datetime from the slot if available, otherwise calculate it
+        end_dt = final_slot.get('scheduled_end_datetime')
+        if not end_dt:
+            rules = self.booking_rules.get(boat.boat_type, {'truck_mins': 90})
+            duration = timedelta(minutes=rules['truck_mins'])
+            end_dt = start_dt + duration
+
+        # Ensure end_dt is timezone-aware
+        if end_dt.tzinfo is None:
+            end_dt = end_dt.replace(tzinfo=timezone.utc)
+
+        # Pickup and dropoff locations follow the service type
+        service_type = final_slot.get('service_type')
+        pickup_addr, dropoff_addr = "", ""
+        pickup_ramp, dropoff_ramp = None, None
+
+        if service_type == "Launch":
+            pickup_addr = boat.storage_address
+            dropoff_ramp = final_slot.get('ramp_id')
+        elif service_type == "Haul":
+            pickup_ramp = final_slot.get('ramp_id')
+            dropoff_addr = boat.storage_address
+
+        return Job(
+            customer_id=final_slot.get('customer_id'),
+            boat_id=final_slot.get('boat_id'),
+            service_type=service_type,
+            scheduled_start_datetime=start_dt,
+            scheduled_end_datetime=end_dt,
+            assigned_hauling_truck_id=final_slot.get('truck_id'),
+            assigned_crane_truck_id=self.s17_truck_id() if final_slot.get('S17_needed') else None,
+            S17_busy_end_datetime=final_slot.get('S17_busy_end_datetime'),
+            pickup_ramp_id=pickup_ramp,
+            dropoff_ramp_id=dropoff_ramp,
+            pickup_street_address=pickup_addr,
+            dropoff_street_address=dropoff_addr,
+            job_status="Scheduled"
+        )
+
+    def book(self, final_slot: dict):
+        """Books a slot in memory only: adds its Job to jobs and the schedule. Returns the Job or None."""
+        job = self.job_from_slot(final_slot)
+        if job is not None:
+            self.add_job(job)
+        return job
+
+    def add_job(self, job):
+        """Adds a built Job to jobs and the schedule (in memory only)."""
+        schedule = self.schedule
+        self.jobs.append(job)
+        schedule.add_job(job)
+
+    def remove_job(self, job):
+        """Takes a job back out of jobs and the schedule (in memory only)."""
+        self.schedule.remove_job(job)
+        self.jobs.remove(job)
+
+    def booking_conflict(self, job, compiled_schedule, tide_policy=None) -> str | None:
+        """
+        Why an already-placed job no longer fits `compiled_schedule` (which must not
+        hold the job itself), or None if it still does: the same ramp tide window,
+        hauler and crane checks find_slot_on_day makes for a new slot.
+        """
+        start_dt, end_dt = job.scheduled_start_datetime, job.scheduled_end_datetime
+        if not start_dt or not end_dt:
+            return "it has no start or end time"
+        compiled_schedule = _as_compiled_schedule(compiled_schedule)
+        day = start_dt.date()
+
+        ramp_id = job.dropoff_ramp_id or job.pickup_ramp_id
+        boat = self.boat(job.boat_id)
+        if ramp_id and boat:
+            context = self.search_context(boat=boat, service_type=job.service_type, ramp_id=ramp_id, crane_needed=False)
+            if not context.ramp:
+                return f"ramp {ramp_id} is no longer in the master data"
+            policy = tide_policy or self.tide_policy or DEFAULT_TIDE_POLICY or {}
+            start_windows = cached_legal_windows(context.ramp, context.shallow, day, job.service_type, context.is_sail, policy)
+            minute = start_dt.hour * 60 + start_dt.minute
+            if not any(w0 <= minute <= w1 for w0, w1 in start_windows):
+                return f"{start_dt:%H:%M} is outside the tide window at {context.ramp.ramp_name}"
+
+        for truck_id, busy_end in (
+            (job.assigned_hauling_truck_id, end_dt),
+            (job.assigned_crane_truck_id, job.S17_busy_end_datetime),
+        ):
+            if truck_id and busy_end and not compiled_schedule.is_free(str(truck_id), start_dt, busy_end):
+                truck = self.master.trucks.get(str(truck_id))
+                return f"truck {getattr(truck, 'truck_name', truck_id)} is already booked then"
+        return None
+
+    def simulate_job_requests(
+        self,
+        total_jobs_to_gen: int = 50,
+        service_type: str = "Haul",
+        year: int = 2025,
+        start_date: dt.date | None = None,
+        end_date: dt.date | None = None,
+        season: str | None = None,
+        *,
+        rng=None,
+        max_distance_miles=10,
+        book=None,
+    ):
+        """
+        Generates requests for boats with no job yet, searches and books each one
+        (in memory unless `book` is given) and returns (summary, failed_requests).
+        `rng` is a random.Random (or the random module) to draw boats and dates from.
+        """
+        rng = rng or random.Random()
+        book = book or self.book
+
+        if not (start_date and end_date):
+            season_norm = (season or "fall").strip().lower()
+            months = (5, 6) if season_norm == "spring" else (9, 10)
+            start_date = dt.date(year, months[0], 1)
+            end_date = dt.date(year, months[1], calendar.monthrange(year, months[1])[1])
+        valid_dates = working_dates(start_date, end_date)
+        if not valid_dates:
+            return "No valid working dates in the selected range.", []
+
+        scheduled_boat_ids = {j.boat_id for j in self.jobs}
+        remaining_boats = [b for b in self.master.boats.values() if b.boat_id not in scheduled_boat_ids]
+        if not remaining_boats:
+            return "No remaining boats to schedule.", []
+
+        num_to_schedule = min(total_jobs_to_gen, len(remaining_boats))
+        boats_to_schedule = rng.sample(remaining_boats, k=num_to_schedule)
+
+        successful = 0
+        failed_requests = []
+
+        for boat in boats_to_schedule:
+            ramp_id_to_use = boat.preferred_ramp_id
+            if not ramp_id_to_use or not self.ramp(ramp_id_to_use):
+                suitable_ramps = list(find_available_ramps_for_boat(boat, self.master.ramps))
+                ramp_id_to_use = rng.choice(suitable_ramps) if suitable_ramps else None
+
+            if not ramp_id_to_use:
+                failed_requests.append({'boat_id': boat.boat_id, 'requested_date': 'N/A', 'reason': 'No suitable ramp found'})
+                continue
+
+            random_date = rng.choice(valid_dates)
+            request = {
+                "customer_id": boat.customer_id, "boat_id": boat.boat_id, "service_type": service_type,
+                "requested_date_str": random_date.strftime("%Y-%m-%d"),
+                "selected_ramp_id": ramp_id_to_use, "relax_truck_preference": True,
+                "max_distance_miles": max_distance_miles,
+            }
+
+            slots, _, _, _ = self.find_slots(**request)
+            if slots:
+                book(slots[0])
+                successful += 1
+            else:
+                failed_requests.append({
+                    'boat_id': boat.boat_id,
+                    'requested_date': random_date.strftime("%b %d, %Y"),
+                    'ramp_name': self.ramp(ramp_id_to_use).ramp_name,
+                    'reason': 'No slot found in search window'
+                })
+
+        total_scheduled_boats = len(self.jobs)
+        total_boats_in_system = len(self.master.boats)
+        total_remaining_boats = total_boats_in_system - total_scheduled_boats
+
+        summary = (
+            f"Batch Requested: {num_to_schedule}, "
+            f"Boats Scheduled (this batch): {successful}, "
+            f"Total Boats Remaining: {total_remaining_boats}, "
+            f"Total Boats Scheduled: {total_scheduled_boats}"
+        )
+        return summary, failed_requests
@@ -2,25 +2,58 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import Optional, List, Union, Tuple, Set
 
-import csv
 import os
 from typing import Optional, List, Union, Tuple, Set, Dict
 import datetime as dt
 from datetime import time, date, timedelta, timezone
-from datetime import datetime as _dt, time as _time, date as _date, timedelta as _td
-import pandas as pd
+from datetime import datetime as _dt, timedelta as _td
 import calendar
-import requests
 import random
 import json
 import streamlit as st
-from st_supabase_connection import SupabaseConnection, execute_query
 from collections import Counter, defaultdict   # pull in defaultdict here
-from geopy.geocoders import Nominatim
-from supabase import create_client
-from requests.adapters import HTTPAdapter, Retry
+from types import MappingProxyType, SimpleNamespace
 import re
 import math
+import hashlib
+import itertools
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+# pandas, requests, geopy, supabase and st_supabase_connection are imported on
+# first use (see execute_query, get_db_connection, _get_geolocator, ...), so
+# importing this module creates no network clients.
+
+# The Streamlit-free core (models, tide store and window engine, truck indexes).
+from ecm_scheduler_core import (
+    DEBUG_MESSAGES, DEFAULT_NOAA_STATION, _log_debug,
+    Truck, Ramp, Customer, Boat, Job,
+    DEFAULT_TIDE_POLICY, _GLOBAL_TIDE_POLICY,
+    _calculate_distance_miles,
+    _local_tide_filepath, _binary_tide_filepath, _indexed_tides_for_range,
+    set_tide_fallback, get_tides,
+    tide_rule_offset_minutes,
+    minute_windows_to_times, get_tide_window_table, is_shallow_draft,
+    cached_legal_windows, invalidate_tide_window_caches,
+    _minute_in_windows, CompiledSchedule,
+    get_geocode_store, haversine_miles_legs,
+)
+# The slot search itself runs on a SchedulingEngine; see _live_engine below.
+from ecm_scheduler_engine import (
+    BOOKING_RULES, YARD_ADDRESS, DEFAULT_MAX_JOB_DISTANCE_MILES,
+    _get_town_from_address, read_travel_time_matrix, town_centroid,
+    ScheduleModel, SchedulingEngine, BoatRampDistances, StaticCoords,
+    StraightLineTravelTimes,
+)
+# Not used here; re-exported for app.py and the benchmarks, which reach them through ecm.*.
+from ecm_scheduler_core import (  # noqa: F401
+    get_tides_for_day, legal_start_windows, ramp_tide_windows, get_legal_window_cache_stats,
+    haversine_miles_pairwise,
+)
+from ecm_scheduler_engine import _abbreviate_town, find_available_ramps_for_boat  # noqa: F401
+from ecm_road_network import ROAD_TRAVEL_TIMES_PATH, RoadTravelTimes
 
 # --- Tide policy knobs (you can tweak these) ---
 LAUNCH_PREP_MIN_POWER = 30        # powerboat time before arriving to ramp
@@ -35,8 +68,8 @@ LAUNCH_EARLY_ALLOW_SAIL_MIN  = 120
 
 
 # --- IN-MEMORY DATA CACHES & GLOBALS (must be defined before any function uses them) ---
-DEBUG_MESSAGES: list[str] = []
 TRAVEL_TIME_MATRIX: dict = {}
+TRAVEL_TIME_PROVIDER = None   # see get_travel_time_provider
 
 
 IDEAL_CRANE_DAYS: set[tuple[str, dt.date]] = set()
@@ -62,19 +95,33 @@ PARKED_JOBS: dict[int, "Job"] = {}
 CRANE_WINDOWS: dict[tuple[str, dt.date], list[tuple[dt.time, dt.time]]] = {}
 ANYTIDE_LOW_TIDE_WINDOWS: dict[tuple[str, dt.date], list[tuple[dt.time, dt.time]]] = {}
 
-# 1) Read whatever the UI handed you
-raw_url = st.secrets["SUPA_URL"]
-raw_key = st.secrets["SUPA_KEY"]
+_SUPABASE_CLIENT = None
+_GEOLOCATOR = None
+
+def get_supabase_client():
+    """Raw supabase-py client from the SUPA_URL / SUPA_KEY secrets, created on first use."""
+    global _SUPABASE_CLIENT
+    if _SUPABASE_CLIENT is None:
+        from supabase import create_client
+        # Clean up whatever the UI handed us into single lines
+        supa_url = st.secrets["SUPA_URL"].strip()
+        supa_key = st.secrets["SUPA_KEY"].strip().replace("\n", "")
+        _SUPABASE_CLIENT = create_client(supa_url, supa_key)
+    return _SUPABASE_CLIENT
+
+def _get_geolocator():
+    """The shared Nominatim geocoder, created on first use."""
+    global _GEOLOCATOR
+    if _GEOLOCATOR is None:
+        from geopy.geocoders import Nominatim
+        _GEOLOCATOR = Nominatim(user_agent="ecm_boat_scheduler_app")
+    return _GEOLOCATOR
+
+def execute_query(query, ttl=None):
+    """st_supabase_connection.execute_query, imported on first use."""
+    from st_supabase_connection import execute_query as _execute_query
+    return _execute_query(query, ttl=ttl)
 
-# 2) Clean them up into single lines
-SUPA_URL = raw_url.strip()
-SUPA_KEY = raw_key.strip().replace("\n", "")
-
-# 3) Now initialize Supabase
-supabase = create_client(SUPA_URL, SUPA_KEY)
-
-# 4) Sanity check
-_geolocator = Nominatim(user_agent="ecm_boat_scheduler_app")
 _location_coords_cache = {} # Ensure this line is present here
 
 # --- PROTECTED WINDOWS & PREFERENCES (precomputed) ---
@@ -85,13 +132,10 @@ ANYTIDE_LOW_TIDE_WINDOWS = {}  # {(ramp_id:str, date:date): [(start_time, end_ti
 # GLOBAL DEFAULTS / SAFE BOOTSTRAP
 # (must exist before any functions use them)
 # ================================
-YARD_ADDRESS = "43 Mattakeesett St, Pembroke, MA 02359"
-DEFAULT_NOAA_STATION = "8445138"  # Scituate Harbor, MA
-
 
 # Pre-initialize global caches and registries
-DEBUG_MESSAGES: list[str] = []
 _town_center_coords_cache = {}
+_ramp_coords_cache = {}   # ramp_id -> geocoded (lat, lon) for ramps without coordinates
 
 
 CRANE_WINDOWS: dict[tuple[str, dt.date], list[tuple[dt.time, dt.time]]] = {}
@@ -115,13 +159,6 @@ TRUCK_OPERATING_HOURS: dict = {}
 SCHEDULED_JOBS: list = []
 PARKED_JOBS: dict = {}
 
-DEBUG_MESSAGES = []
-
-BOOKING_RULES = {
-    'Powerboat':  {'truck_mins': 90,  'crane_mins': 0},
-    'Sailboat DT':{'truck_mins': 180, 'crane_mins': 60},
-    'Sailboat MT':{'truck_mins': 180, 'crane_mins': 90},
-}
 
 # ADD THIS NEW CODE BLOCK
 
@@ -148,38 +185,12 @@ RAMP_ABBREVIATIONS = {
     "Savin HIll Yacht Club": "Savin H",
 }
 
-# === Distance knobs (default if UI doesn't pass one) ===
-DEFAULT_MAX_JOB_DISTANCE_MILES = 10
-AVERAGE_SPEED_MPH = 35  # for minutes→miles when using the time matrix
-
 def _estimate_trip_miles_for_job(boat_id, pickup_ramp_id):
     """
     Estimate miles from the boat's storage (or yard fallback) to the pickup ramp.
     Prefer TRAVEL_TIME_MATRIX (minutes) -> miles; fall back to haversine * 1.3 (road factor).
     """
-    try:
-        boat = get_boat_details(int(boat_id)) if boat_id is not None else None
-    except Exception:
-        boat = None
-    ramp = get_ramp_details(str(pickup_ramp_id)) if pickup_ramp_id else None
-
-    # Prefer time matrix if we can map storage town → ramp name
-    if boat and getattr(boat, 'storage_address', None) and ramp and getattr(ramp, 'ramp_name', None):
-        storage_town = _get_town_from_address(boat.storage_address) or _abbreviate_town(boat.storage_address)
-        minutes = (TRAVEL_TIME_MATRIX.get(storage_town, {}) or {}).get(ramp.ramp_name)
-        if isinstance(minutes, (int, float)) and minutes > 0 and minutes != float('inf'):
-            return (minutes / 60.0) * AVERAGE_SPEED_MPH
-
-    # Fall back to coordinates
-    try:
-        origin = get_location_coords(boat_id=boat_id)
-        dest = get_location_coords(ramp_id=pickup_ramp_id)
-        miles = _calculate_distance_miles(origin, dest) * 1.3
-        if miles and miles != float('inf'):
-            return miles
-    except Exception:
-        pass
-    return None
+    return _live_engine().estimate_trip_miles(boat_id, pickup_ramp_id)
     
 
 def get_ramp_display_name(full_ramp_name):
@@ -188,248 +199,143 @@ def get_ramp_display_name(full_ramp_name):
         return ""
     return RAMP_ABBREVIATIONS.get(full_ramp_name, full_ramp_name)
 
-def _log_debug(msg):
-    """Adds a timestamped message to the global debug log."""
-    # Ensure DEBUG_MESSAGES is treated as a global variable
-    global DEBUG_MESSAGES
-    DEBUG_MESSAGES.insert(0, f"{dt.datetime.now().strftime('%H:%M:%S')}: {msg}")
-
-# --- STRICT ADDRESS PARSERS & FILTERS ---
-
-_POBOX_PATTERNS = (
-    r'\bP\.?\s*O\.?\s*Box\b',
-    r'\bPO\s*Box\b',
-    r'\bPost\s*Office\s*Box\b',
+JOB_QUERY_COLUMNS = (
+    "job_id, customer_id, boat_id, service_type, "
+    "scheduled_start_datetime, scheduled_end_datetime, "
+    "assigned_hauling_truck_id, assigned_crane_truck_id, "
+    "S17_busy_end_datetime, pickup_ramp_id, dropoff_ramp_id, "
+    "pickup_street_address, dropoff_street_address, job_status, notes, "
+    "pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude"
 )
 
-def _looks_like_pobox(s: str) -> bool:
-    if not isinstance(s, str):
-        return False
-    import re
-    s_norm = s.strip()
-    for pat in _POBOX_PATTERNS:
-        if re.search(pat, s_norm, flags=re.IGNORECASE):
-            return True
-    return False
-
-def _get_town_from_address(address: str) -> str | None:
-    """
-    Extract a Massachusetts town/city from a free-form address line.
-    Rules:
-      - If PO Box is present anywhere, return None.
-      - Prefer token immediately before 'MA' or 'Massachusetts'.
-      - Clean trailing state/zip tokens.
-      - Reject obviously bad tokens (too short, numeric-heavy).
+# Delta sync of the jobs table: only rows with updated_at past the watermark are
+# fetched. Hard deletes never show up in a delta, so a full reload still runs
+# every JOB_SYNC_FULL_RELOAD_SECS to drop rows other sessions have deleted.
+JOB_SYNC_FULL_RELOAD_SECS = 15 * 60
+_JOB_SYNC = {"watermark": None, "schema": None, "last_full": None, "refresh_due": False}
+JOB_SYNC_STATS = {"full_reloads": 0, "delta_syncs": 0, "rows_merged": 0}
+
+# SCHEDULED_JOBS / PARKED_JOBS are copy-on-write: writers build new containers
+# and rebind the globals under this lock, never edit them in place, so a script
+# thread iterating the old ones is never disturbed by another session or the
+# background refresh.
+_JOBS_LOCK = threading.RLock()
+
+def _replace_jobs(scheduled=None, parked=None):
+    """Rebinds SCHEDULED_JOBS and/or PARKED_JOBS to new containers (hold _JOBS_LOCK around read-modify-write)."""
+    global SCHEDULED_JOBS, PARKED_JOBS
+    with _JOBS_LOCK:
+        if scheduled is not None:
+            SCHEDULED_JOBS = scheduled
+        if parked is not None:
+            PARKED_JOBS = parked
+
+def _rows_watermark(rows, current=None):
+    """Latest updated_at among rows (kept as the server's string), or current."""
+    import pandas as pd
+    best = current
+    for row in rows:
+        stamp = row.get("updated_at")
+        if stamp and (best is None or pd.Timestamp(stamp) > pd.Timestamp(best)):
+            best = stamp
+    return best
+
+def _fetch_all_job_rows(conn) -> list:
+    try:
+        jobs_resp = execute_query(conn.table("jobs").select(JOB_QUERY_COLUMNS + ", updated_at"), ttl=0)
+    except Exception as e:
+        # No updated_at column: delta sync stays off and every sync is a full reload.
+        _log_debug(f"Job sync: updated_at unavailable ({e}); using full reloads.")
+        jobs_resp = execute_query(conn.table("jobs").select(JOB_QUERY_COLUMNS), ttl=0)
+    return jobs_resp.data if isinstance(jobs_resp.data, list) else []
+
+def _reload_all_jobs(conn, rows=None, read_at=None):
+    """
+    Full reload of the jobs table into SCHEDULED_JOBS / PARKED_JOBS; resets the sync watermark.
+    read_at is when `rows` were read from the table (a snapshot's saved_at), else now.
+    """
+    if rows is None:
+        rows = _fetch_all_job_rows(conn)
+    all_jobs = [Job(**row) for row in rows]
+    scheduled = [job for job in all_jobs if job.job_status == "Scheduled" and job.scheduled_start_datetime]
+    parked = {job.job_id: job for job in all_jobs if job.job_status == "Parked"}
+    watermark = _rows_watermark(rows)
+
+    with _JOBS_LOCK:
+        _replace_jobs(scheduled, parked)
+        invalidate_schedule_model()
+        _JOB_SYNC["watermark"] = watermark
+        _JOB_SYNC["schema"] = tuple(sorted(rows[0])) if rows else None
+        _JOB_SYNC["last_full"] = read_at or dt.datetime.now(timezone.utc)
+        JOB_SYNC_STATS["full_reloads"] += 1
+
+def _merge_job_rows(rows):
+    """Upserts changed job rows into SCHEDULED_JOBS / PARKED_JOBS, patching the schedule model."""
+    with _JOBS_LOCK:
+        scheduled, parked = list(SCHEDULED_JOBS), dict(PARKED_JOBS)
+        scheduled_by_id = {j.job_id: j for j in scheduled}
+        for row in rows:
+            job = Job(**row)
+            old = scheduled_by_id.pop(job.job_id, None)
+            if old is not None:
+                scheduled.remove(old)
+                _schedule_model_changed(old, added=False)
+            parked.pop(job.job_id, None)
+
+            if job.job_status == "Scheduled" and job.scheduled_start_datetime:
+                scheduled.append(job)
+                scheduled_by_id[job.job_id] = job
+                _schedule_model_changed(job, added=True)
+            elif job.job_status == "Parked":
+                parked[job.job_id] = job
+        _replace_jobs(scheduled, parked)
+        JOB_SYNC_STATS["rows_merged"] += len(rows)
+
+def sync_jobs(force_full=False) -> str:
+    """
+    Brings SCHEDULED_JOBS / PARKED_JOBS up to date with the jobs table.
+    Returns "delta" if only changed rows were fetched, "full" if the table was reloaded.
     """
-    import re
-    if not isinstance(address, str):
-        return None
-
-    addr = address.strip()
-    if not addr or addr.upper() == "MISSING":
-        return None
-    if _looks_like_pobox(addr):
-        return None
-
-    # Normalize multiple spaces, strip commas
-    addr = re.sub(r'\s+', ' ', addr.replace(' ,', ',').replace(', ,', ',')).strip()
-
-    # Try to capture "... , <Town> , MA <ZIP>" OR "... <Town> MA <ZIP>"
-    # We only care about the <Town> token.
-    # Examples this handles:
-    #   "18 Creek Road, Marshfield MA 02050"
-    #   "19 Anderson Drive, Marshfield, MA 02050"
-    #   "Hingham MA 02043"
-    #   "69 Old Main Street, Marshfield Hills, MA"
-    town = None
-
-    # 1) Comma-friendly pattern: last token before MA/Massachusetts
-    m = re.search(r',\s*([^,]+?)\s*,\s*(?:MA|Massachusetts)\b', addr, flags=re.IGNORECASE)
-    if m:
-        town = m.group(1).strip()
-    else:
-        # 2) Space-only pattern: token(s) before MA
-        m2 = re.search(r'\b([^,]+?)\s+(?:MA|Massachusetts)\b', addr, flags=re.IGNORECASE)
-        if m2:
-            # This can capture "Marshfield MA" or "Marshfield Hills MA"
-            # We may still have a leading street segment; try to trim that by taking the last 1–3 words.
-            candidate = m2.group(1).strip()
-            parts = candidate.split()
-            # Heuristic: town names are usually last 1–3 words in the run-up to MA
-            town = " ".join(parts[-3:]).strip()
-
-    if not town:
-        return None
+    conn = get_db_connection()
+    last_full = _JOB_SYNC["last_full"]
+    stale = last_full is None or (dt.datetime.now(timezone.utc) - last_full).total_seconds() > JOB_SYNC_FULL_RELOAD_SECS
+    if force_full or stale or _JOB_SYNC["watermark"] is None:
+        _reload_all_jobs(conn)
+        return "full"
 
-    # Clean zip remnants or trailing punctuation
-    town = re.sub(r'\d{5}(-\d{4})?$', '', town).strip(' ,')
+    try:
+        # gte, not gt: rows committed in the same instant as the watermark row are re-read, never missed.
+        query = conn.table("jobs").select(JOB_QUERY_COLUMNS + ", updated_at").gte("updated_at", _JOB_SYNC["watermark"])
+        jobs_resp = execute_query(query, ttl=0)
+    except Exception as e:
+        _log_debug(f"Job sync: delta query failed ({e}); reloading all jobs.")
+        _reload_all_jobs(conn)
+        return "full"
 
-    # Reject bad tokens (too short or clearly not a town)
-    if len(town) < 2:
-        return None
-    # Too many digits means it isn't a town
-    if sum(ch.isdigit() for ch in town) > 0:
-        return None
+    rows = jobs_resp.data if isinstance(jobs_resp.data, list) else []
+    if rows and tuple(sorted(rows[0])) != _JOB_SYNC["schema"]:
+        _log_debug("Job sync: jobs columns changed; reloading all jobs.")
+        _reload_all_jobs(conn)
+        return "full"
 
-    return town
+    _merge_job_rows(rows)
+    _JOB_SYNC["watermark"] = _rows_watermark(rows, _JOB_SYNC["watermark"])
+    JOB_SYNC_STATS["delta_syncs"] += 1
+    return "delta"
 
 def fetch_scheduled_jobs():
     """
-    Fetches and updates the global SCHEDULED_JOBS list from the database
-    with all required columns.
+    Refreshes SCHEDULED_JOBS (and PARKED_JOBS) from the database, fetching only
+    rows changed since the last sync when it can.
     """
-    global SCHEDULED_JOBS
     try:
-        conn = get_db_connection()
-        # CORRECTED: This now includes all columns to create complete Job objects.
-        query_columns = (
-            "job_id, customer_id, boat_id, service_type, "
-            "scheduled_start_datetime, scheduled_end_datetime, "
-            "assigned_hauling_truck_id, assigned_crane_truck_id, "
-            "S17_busy_end_datetime, pickup_ramp_id, dropoff_ramp_id, "
-            "pickup_street_address, dropoff_street_address, job_status, notes, "
-            "pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude"
-        )
-        jobs_resp = execute_query(conn.table("jobs").select(query_columns).eq("job_status", "Scheduled"), ttl=0)
-        
-        SCHEDULED_JOBS.clear()
-        if isinstance(jobs_resp.data, list):
-            SCHEDULED_JOBS.extend([Job(**row) for row in jobs_resp.data if row.get('scheduled_start_datetime')])
-        
-        _log_debug(f"Refreshed schedule: Found {len(SCHEDULED_JOBS)} jobs.")
+        mode = sync_jobs()
+        _log_debug(f"Refreshed schedule ({mode}): Found {len(SCHEDULED_JOBS)} jobs.")
     except Exception as e:
         st.error(f"Error refreshing jobs from database: {e}")
 
 
 
-# --- DATA MODELS (CLASSES) ---
-class Truck:
-    def __init__(self, t_id, name, max_len):
-        self.truck_id = str(t_id) #<-- FIX: Ensure ID is a string
-        self.truck_name = name
-        self.max_boat_length = max_len
-        self.is_crane = "Crane" in name
-
-class Ramp:
-    def __init__(self, r_id, name, station, tide_method="AnyTide", offset=None, boats=None, latitude=None, longitude=None):
-        self.ramp_id = r_id
-        self.ramp_name = name
-        self.noaa_station_id = station
-        self.tide_calculation_method = tide_method
-        self.tide_offset_hours1 = offset
-        self.tide_offset_hours  = offset   # NEW: mirror for compatibility
-        self.allowed_boat_types = boats or ["Powerboat", "Sailboat DT", "Sailboat MT"]
-        self.latitude = float(latitude) if latitude is not None else None
-        self.longitude = float(longitude) if longitude is not None else None
-
-class Customer:
-    def __init__(self, c_id, name):
-        self.customer_id = int(c_id)
-        self.customer_name = name
-
-class Boat:
-    def __init__(self, b_id, c_id, b_type, b_len, draft, storage_addr, pref_ramp, pref_truck, is_ecm, storage_latitude=None, storage_longitude=None): # <--- ADD storage_latitude, storage_longitude
-        self.boat_id = int(b_id)
-        self.customer_id = int(c_id)
-        self.boat_type = b_type
-        self.boat_length = b_len
-        self.draft_ft = draft
-        self.storage_address = storage_addr
-        self.preferred_ramp_id = pref_ramp
-        self.preferred_truck_id = pref_truck
-        self.is_ecm_boat = is_ecm
-        self.storage_latitude = float(storage_latitude) if storage_latitude is not None else None # Convert to float
-        self.storage_longitude = float(storage_longitude) if storage_longitude is not None else None # Convert to float
-
-class Job:
-    def __init__(self, **kwargs):
-        def _parse_int(v):
-            try: return int(v) if v is not None and str(v).strip() != "" else None
-            except (ValueError, TypeError): return None
-        def _parse_float(v):
-            try: return float(v) if v is not None and str(v).strip() != "" else None
-            except (ValueError, TypeError): return None
-
-        self.job_id                     = _parse_int(kwargs.get("job_id"))
-        self.customer_id                = _parse_int(kwargs.get("customer_id"))
-        self.boat_id                    = _parse_int(kwargs.get("boat_id"))
-        self.service_type               = kwargs.get("service_type")
-        self.scheduled_start_datetime   = self._parse_or_get_datetime(kwargs.get("scheduled_start_datetime"))
-        self.scheduled_end_datetime     = self._parse_or_get_datetime(kwargs.get("scheduled_end_datetime"))
-        
-        # FIX: Ensure Truck IDs are always strings
-        self.assigned_hauling_truck_id  = str(kwargs.get("assigned_hauling_truck_id")) if kwargs.get("assigned_hauling_truck_id") else None
-        self.assigned_crane_truck_id    = str(kwargs.get("assigned_crane_truck_id")) if kwargs.get("assigned_crane_truck_id") else None
-
-        self.S17_busy_end_datetime      = self._parse_or_get_datetime(kwargs.get("S17_busy_end_datetime"))
-        self.pickup_ramp_id             = kwargs.get("pickup_ramp_id")
-        self.dropoff_ramp_id            = kwargs.get("dropoff_ramp_id")
-        self.pickup_street_address      = kwargs.get("pickup_street_address", "") or ""
-        self.dropoff_street_address     = kwargs.get("dropoff_street_address", "") or ""
-        self.job_status                 = kwargs.get("job_status", "Scheduled")
-        self.notes                      = kwargs.get("notes", "")
-        self.pickup_latitude            = _parse_float(kwargs.get("pickup_latitude"))
-        self.pickup_longitude           = _parse_float(kwargs.get("pickup_longitude"))
-        self.dropoff_latitude           = _parse_float(kwargs.get("dropoff_latitude"))
-        self.dropoff_longitude          = _parse_float(kwargs.get("dropoff_longitude"))
-
-    def _parse_or_get_datetime(self, dt_value):
-        """Return a timezone-aware (UTC) datetime or None."""
-        parsed = None
-
-        if isinstance(dt_value, dt.datetime):
-            parsed = dt_value
-        elif isinstance(dt_value, str):
-            try:
-                # tolerate "YYYY-MM-DD HH:MM:SS" by replacing the space with "T"
-                parsed = dt.datetime.fromisoformat(dt_value.replace(" ", "T"))
-            except (ValueError, TypeError):
-                return None
-
-        if parsed is None:
-            return None
-
-        # make UTC if naive
-        if parsed.tzinfo is None or parsed.tzinfo.utcoffset(parsed) is None:
-            return parsed.replace(tzinfo=dt.timezone.utc)
-        return parsed
-
-    @property
-    def scheduled_start_dt(self):
-        return self.scheduled_start_datetime
-
-    @property
-    def scheduled_end_dt(self):
-        return self.scheduled_end_datetime
-
-### Helpers
-
-# ---- TIDE POLICY (default, adjustable later from UI) ----
-DEFAULT_TIDE_POLICY = {
-    # Launch: allowed lead *before* the ramp window OPENS
-    "launch_open_lead_power_mins": 30,     # powerboats
-    "launch_open_lead_sail_mins": 120,     # sailboats
-
-    # Haul: job may START this much time *before* the ramp window CLOSES
-    "haul_close_lead_all_mins": 30,
-
-    # Step size when scanning start times
-    "scan_step_mins": 15,
-}
-
-# A process-wide policy you can change at runtime if you want
-_GLOBAL_TIDE_POLICY = DEFAULT_TIDE_POLICY.copy()
-
-def set_global_tide_policy(policy: dict | None):
-    """Optional: let the UI push a policy once. Safe no-op if None."""
-    global _GLOBAL_TIDE_POLICY
-    if isinstance(policy, dict):
-        merged = DEFAULT_TIDE_POLICY.copy()
-        merged.update({k: v for k, v in policy.items() if v is not None})
-        _GLOBAL_TIDE_POLICY = merged
-    return _GLOBAL_TIDE_POLICY
-
-
 ### New rules around truck job sart before and after ramp tide windows
 import datetime as dt
 
@@ -528,9 +434,9 @@ def audit_travel_matrix_and_coords(max_miles=None, auto_fix_missing=False):
             issues.append({"type": "ramp_missing_coords", "ramp_id": r_id, "ramp": getattr(ramp, "ramp_name", r_id)})
             if auto_fix_missing and getattr(ramp, "ramp_name", None):
                 try:
-                    loc = _geocode_with_backoff(_geolocator, f"{ramp.ramp_name}, MA")
-                    if loc:
-                        ramp.latitude, ramp.longitude = float(loc.latitude), float(loc.longitude)
+                    coords = geocode_cached(f"{ramp.ramp_name}, MA")
+                    if coords:
+                        _ramp_coords_cache[str(r_id)] = coords   # get_location_coords picks it up
                 except Exception:
                     pass
             continue
@@ -580,8 +486,7 @@ def probe_requested_date_slot(
     except Exception:
         return None
 
-    fetch_scheduled_jobs()
-    compiled_schedule, _ = _compile_truck_schedules(SCHEDULED_JOBS)
+    compiled_schedule = get_schedule_model().compiled
 
     boat = get_boat_details(boat_id)
     if not boat:
@@ -644,46 +549,6 @@ def _is_anytide_for_boat(method, boat_draft_ft):
             return False
     return False
 
-def _window_offset_for_boat(method, base_offset, boat_draft_ft):
-    """
-    HoursAroundHighTide => base_offset
-    HoursAroundHighTide_WithDraftRule => base_offset (+0.5h if shallow draft)
-    AnyTide / AnyTideWithDraftRule(deep boats) => base_offset
-    """
-    try:
-        draft = float(boat_draft_ft or 0.0)
-    except:
-        draft = 0.0
-
-    if method == "HoursAroundHighTide_WithDraftRule":
-        return (base_offset + 0.5) if draft < 5.0 else base_offset
-    return base_offset
-
-def _day_high_low_tides(ramp, day_date):
-    """
-    Returns (highs, lows) where each is a list of dt.time objects for the given date.
-    Uses the ramp's NOAA station via your existing tide fetcher.
-    """
-    if not ramp or not getattr(ramp, "noaa_station_id", None):
-        return ([], [])
-    data = fetch_noaa_tides_for_range(ramp.noaa_station_id, day_date, day_date) or {}
-    events = data.get(day_date, [])
-    highs = [e["time"] for e in events if e.get("type") == "H"]
-    lows  = [e["time"] for e in events if e.get("type") == "L"]
-    return (highs, lows)
-
-def _within_any_high_tide_window(dt_local, ramp, method, base_offset, boat_draft_ft):
-    if not isinstance(dt_local, dt.datetime):  # <-- was 'datetime'
-        return False
-    offset = _window_offset_for_boat(method, base_offset, boat_draft_ft)
-
-    highs, _ = _day_high_low_tides(ramp, dt_local.date())
-    for ht in highs:
-        ht_dt = dt.datetime.combine(dt_local.date(), ht, tzinfo=timezone.utc)  # <-- was 'datetime'
-        if abs((dt_local - ht_dt).total_seconds()) <= offset * 3600:
-            return True
-    return False
-
 def passes_tide_rules(slot_dict, when_pickup_dt, when_dropoff_dt, boat_obj):
     """
     HARD gate: both ends must be legal at their actual ramp-times.
@@ -695,19 +560,17 @@ def passes_tide_rules(slot_dict, when_pickup_dt, when_dropoff_dt, boat_obj):
     pickup_ramp_id  = _norm_id(slot_dict.get("pickup_ramp_id")) or _norm_id(slot_dict.get("ramp_id"))
     dropoff_ramp_id = _norm_id(slot_dict.get("dropoff_ramp_id"))
     service_type    = slot_dict.get("service_type", "Launch")
-    draft_ft        = getattr(boat_obj, "draft_ft", None)
+    shallow         = is_shallow_draft(boat_obj)
 
-    # Helper to check one ramp/time
+    # Helper to check one ramp/time against the memoized ramp windows (same rule as the slot search)
     def _check_one(ramp_id, at_dt):
         if ramp_id is None or at_dt is None:
             return True  # if missing, do not fail here
         ramp = ECM_RAMPS.get(ramp_id)
-        method, base = _get_ramp_rule(ramp_id)
-        # Any-tide cases
-        if _is_anytide_for_boat(method, draft_ft):
-            return True
-        # Otherwise must be within a high-tide window:
-        return _within_any_high_tide_window(at_dt, ramp, method, base, draft_ft)
+        if not ramp:
+            return True  # unknown ramp has no tide rule
+        windows = cached_legal_windows(ramp, shallow, at_dt.date())
+        return _minute_in_windows(at_dt.hour * 60 + at_dt.minute, windows)
 
     # Compute which timestamps matter (simple, effective model)
     ok_pickup  = _check_one(pickup_ramp_id, when_pickup_dt)
@@ -720,9 +583,12 @@ def passes_tide_rules(slot_dict, when_pickup_dt, when_dropoff_dt, boat_obj):
 # --------------- SCORING ----------------
 
 def _route_distance_minutes(a_latlon, b_latlon):
-    # ~straight-line minutes proxy; replace with your travel matrix if available
+    # ~straight-line minutes proxy; road-network minutes when a road travel-time provider is active
     if not a_latlon or not b_latlon:
         return 25.0
+    provider = get_travel_time_provider()
+    if not isinstance(provider, StraightLineTravelTimes):
+        return float(provider.minutes(a_latlon, b_latlon))
     (ax, ay), (bx, by) = a_latlon, b_latlon
     km = math.hypot(ax - bx, ay - by) * 111.0  # deg->km rough
     return (km / 50.0) * 60.0  # 50 km/h -> minutes
@@ -731,85 +597,8 @@ def _score_candidate(slot, compiled_schedule, daily_last_locations, after_thresh
     """
     Larger is better. Uses DYNAMIC scoring and a new rule to fill "tide poor" days.
     """
-    # ... (Hard limit distance check remains the same) ...
-    try:
-        limit = float(slot.get("max_distance_miles", DEFAULT_MAX_JOB_DISTANCE_MILES))
-    except Exception:
-        limit = float(DEFAULT_MAX_JOB_DISTANCE_MILES)
-    try:
-        est_miles = _estimate_trip_miles_for_job(slot.get("boat_id"), slot.get("ramp_id"))
-        if est_miles is not None and float(est_miles) > limit:
-            slot["reject_reason"] = f"Distance {float(est_miles):.1f} mi > {limit:.0f} mi"
-            return -1e9
-    except Exception:
-        pass
-
-    if prime_days is None:
-        prime_days = set()
-
-    score = 0.0
-    truck_id = str(slot.get("truck_id"))
-    date = slot.get("date")
-    ramp_id = str(slot.get("ramp_id"))
-    boat = get_boat_details(slot.get("boat_id"))
-
-    # --- NEW STRATEGY: Identify "tide poor" days ---
-    is_tide_poor_day = False
-    tides_today = fetch_noaa_tides_for_range(get_ramp_details(ramp_id).noaa_station_id, date, date) or {}
-    high_tides = [t["time"] for t in tides_today.get(date, []) if t.get("type") == "H"]
-    if high_tides and all(t.hour < 8 or t.hour > 15 for t in high_tides):
-        is_tide_poor_day = True
-
-    # If it's a tough day, give a huge bonus to easy boats at easy ramps to fill the schedule.
-    if is_tide_poor_day:
-        boat_type = getattr(boat, "boat_type", "")
-        draft = float(getattr(boat, "draft_ft", 99))
-        ramp = get_ramp_details(ramp_id)
-        is_any_tide_ramp = getattr(ramp, "tide_calculation_method", "") in ("AnyTide", "AnyTideWithDraftRule")
-        if "Powerboat" in boat_type and draft <= 5.0 and is_any_tide_ramp:
-            score += 15.0  # Bonus for being an "easy job" on a "hard day"
-    # --- END NEW STRATEGY ---
-
-    todays = [iv for iv in compiled_schedule.get(truck_id, []) if iv and hasattr(iv[0], "date") and iv[0].date() == date]
-    n = len(todays)
-
-    # Dynamic scoring based on schedule density
-    if after_threshold:
-        if n == 0: score -= 50.0
-        elif n == 1: score += 20.0
-        elif n == 2: score += 10.0
-        elif n >= 3: score += 5.0
-    else:
-        if n == 0: score += 2.0
-        if n == 1: score += 6.0
-        if n == 2: score += 10.0
-        if n >= 3: score += 8.0
-
-    if slot.get("is_piggyback"):
-        score += 8.0
-
-    # ... (Proximity and Prime Day scoring remain the same) ...
-    try:
-        ramp_details = get_ramp_details(ramp_id)
-        if boat and ramp_details and hasattr(boat, 'storage_address'):
-            storage_town = _abbreviate_town(boat.storage_address)
-            ramp_name = ramp_details.ramp_name
-            travel_minutes = TRAVEL_TIME_MATRIX.get(storage_town, {}).get(ramp_name)
-            if travel_minutes is not None:
-                proximity_bonus = max(0.0, (60 - travel_minutes) / 10.0)
-                score += proximity_bonus
-    except Exception as e:
-        _log_debug(f"Could not calculate proximity score: {e}")
-
-    if after_threshold and date in prime_days:
-        tide_method = getattr(ramp_details, "tide_calculation_method", "AnyTide") if ramp_details else "AnyTide"
-        boat_type = getattr(boat, "boat_type", "") if boat else ""
-        if "Powerboat" in boat_type and tide_method == "AnyTide":
-            score += 6.0
-        elif "Sailboat" in boat_type:
-            score -= 5.0
-
-    return score
+    return _live_engine().score_candidate(slot, compiled_schedule, daily_last_locations,
+                                          after_threshold=after_threshold, prime_days=prime_days)
 
     
 def tide_window_for_day(ramp, day):
@@ -818,49 +607,16 @@ def tide_window_for_day(ramp, day):
     - If ramp has NO tide rule (hours <= 0): return [] (no explicit restriction).
     - If ramp HAS a tide rule (>0): compute ±hours around EACH high tide.
       If we cannot fetch a usable high tide time for that day, return [] (no legal start).
+    Served from the shared season window table.
     """
-    from datetime import time as dtime
-
     hours = getattr(ramp, "tide_offset_hours1", None)
     if not hours or hours <= 0:
         return []
 
     station_id = getattr(ramp, "noaa_station_id", None) or DEFAULT_NOAA_STATION
-    events_by_day = fetch_noaa_tides_for_range(station_id, day, day) or {}
-    events = events_by_day.get(day, [])
-
-    def _as_time(x):
-        if isinstance(x, dtime):
-            return x
-        if isinstance(x, str):
-            for fmt in ("%H:%M", "%I:%M %p"):
-                try:
-                    return dt.datetime.strptime(x.strip(), fmt).time()
-                except Exception:
-                    pass
-        return None
-
-    highs = []
-    for e in events:
-        if not isinstance(e, dict) or e.get("type") != "H":
-            continue
-        tval = _as_time(e.get("time"))
-        if tval:
-            highs.append(tval)
-
-    if not highs:
-        return []
-
-    windows = []
-    for ht in highs:
-        start_dt = (dt.datetime.combine(day, ht) - dt.timedelta(hours=hours)).time()
-        end_dt   = (dt.datetime.combine(day, ht) + dt.timedelta(hours=hours)).time()
-        if start_dt <= end_dt:
-            windows.append((start_dt, end_dt))
-        else:
-            windows.append((dtime(0, 0), end_dt))
-            windows.append((start_dt, dtime(23, 59)))
-    return windows
+    offset_minutes = tide_rule_offset_minutes("HoursAroundHighTide", hours, shallow=False)
+    table = get_tide_window_table(station_id, offset_minutes, day.year)
+    return minute_windows_to_times(table.get(day, []))
 
 def time_within_any_window(check_time: dt.time, windows: List[Tuple[dt.time, dt.time]]) -> bool:
     for a,b in windows:
@@ -871,33 +627,8 @@ def time_within_any_window(check_time: dt.time, windows: List[Tuple[dt.time, dt.
 ### This helper function will create a new crane day near the requested date if a grouped slot is not found.
 
 # --- Low-tide prime day helpers (11:00–13:00 local), with Scituate fallback ---
-_SCITUATE_STATION = "8445138"  # permanent fallback per your rules
-
 def _station_for_ramp_or_scituate(ramp_id: str | None) -> str:
-    if ramp_id:
-        r = get_ramp_details(ramp_id)
-        if r and getattr(r, "noaa_station_id", None):
-            return str(r.noaa_station_id)
-    return _SCITUATE_STATION
-
-def get_low_tide_prime_days(station_id: str, start_day: _date, end_day: _date) -> set[_date]:
-    """
-    Returns a set of dates in [start_day, end_day] where there is at least one LOW tide
-    between 11:00 and 13:00 local (rounded times in your data are fine).
-    """
-    prime = set()
-    tides_by_day = fetch_noaa_tides_for_range(station_id, start_day, end_day)  # existing function you already use
-    if not tides_by_day:
-        return prime
-    for d, readings in tides_by_day.items():
-        for t in readings:
-            if t.get("type") == "L":
-                tt = t.get("time")
-                if isinstance(tt, _time):
-                    if _time(11, 0) <= tt <= _time(13, 0):
-                        prime.add(d)
-                        break
-    return prime
+    return _live_engine().station_for_ramp(ramp_id)
 
 def get_prime_tide_days(tides_by_day, tide_type="L", start_hour=11, end_hour=13):
     from datetime import time as dtime
@@ -911,28 +642,10 @@ def get_prime_tide_days(tides_by_day, tide_type="L", start_hour=11, end_hour=13)
                     break
     return prime_days
 
-def order_dates_with_low_tide_bias(requested_date: _date, candidate_dates: list[_date], prime_days: set[_date]) -> list[_date]:
-    """
-    Reorders candidate_dates:
-      1) First: all candidate dates that are prime AND within ±3 days of requested_date,
-         ordered by absolute proximity to requested_date (tie-break: earlier first).
-      2) Then: the remaining candidate dates, ordered by proximity to requested_date.
-    """
-    def _dist(d: _date) -> int:
-        return abs((d - requested_date).days)
-    near_prime = [d for d in candidate_dates if d in prime_days and _dist(d) <= 3]
-    rest = [d for d in candidate_dates if d not in near_prime]
-    near_prime.sort(key=lambda d: (_dist(d), d))
-    rest.sort(key=lambda d: (_dist(d), d))
-    return near_prime + rest
-
 
 def get_s17_truck_id():
     """Finds the numeric truck_id for the truck named 'S17'."""
-    for truck_id, truck_obj in ECM_TRUCKS.items():
-        if truck_obj.truck_name == "S17":
-            return truck_id
-    return None # Return None if S17 is not found
+    return _live_engine().s17_truck_id()
 
 
 
@@ -961,6 +674,7 @@ def get_db_connection():
         or st.secrets.get("SUPA_KEY")
         or os.environ.get("SUPABASE_KEY")
     )
+    from st_supabase_connection import SupabaseConnection
     if url and key:
         return st.connection("supabase", type=SupabaseConnection, url=url.strip(), key=key.strip())
     return st.connection("supabase", type=SupabaseConnection)
@@ -968,6 +682,8 @@ def get_db_connection():
 
 # --- Added robust HTTP session + cached geocoder helpers ---
 def _get_retry_session(_total=3, _backoff=0.5):
+    import requests
+    from requests.adapters import HTTPAdapter, Retry
     s = requests.Session()
     retries = Retry(total=_total, backoff_factor=_backoff, status_forcelist=[500, 502, 503, 504])
     s.mount("https://", HTTPAdapter(max_retries=retries))
@@ -975,16 +691,36 @@ def _get_retry_session(_total=3, _backoff=0.5):
     return s
 
 @st.cache_data(show_spinner=False, ttl=86400)
-def _geocode_with_backoff(geolocator, address: str, timeout=10):
+def _geocode_with_backoff(_geolocator, address: str, timeout=10):
+    # The leading underscore keeps st.cache_data from hashing the Nominatim object.
     import time, random
     delay = 0.5
     for _ in range(4):
         try:
-            return geolocator.geocode(address, timeout=timeout)
+            return _geolocator.geocode(address, timeout=timeout)
         except Exception:
             time.sleep(delay)
             delay *= 2 * (1 + random.random() / 4)
     return None
+
+def geocode_cached(query: str):
+    """
+    (lat, lon) for a geocoder query such as "Marshfield, MA", or None. Answers
+    come from the on-disk geocode store when it has them; otherwise Nominatim is
+    asked (with backoff) and its answer, or the miss, is stored for next time.
+    """
+    store = get_geocode_store()
+    if store is not None:
+        try:
+            return store.get(query)
+        except KeyError:
+            pass
+    _log_debug(f"Geocoding: {query}")
+    loc = _geocode_with_backoff(_get_geolocator(), query)
+    coords = (float(loc.latitude), float(loc.longitude)) if loc else None
+    if store is not None:
+        store.put(query, coords)
+    return coords
     
 # --- End helpers ---
 
@@ -992,10 +728,11 @@ def generate_crane_day_candidates(
     look_ahead_days: int = 60,
     tide_start_hour: int = 10,
     tide_end_hour: int = 14,
-    start_date: date = None
+    start_date: date = None,
+    ramps: dict = None
 ) -> dict:
     """
-    For each ramp, scan the next `look_ahead_days` for a high tide
+    For each ramp (default: ECM_RAMPS), scan the next `look_ahead_days` for a high tide
     between `tide_start_hour` (inclusive) and `tide_end_hour` (exclusive).
     Returns a dict: { ramp_id: [ {date, time, height}, … ], … }.
     """
@@ -1004,10 +741,10 @@ def generate_crane_day_candidates(
     end_date = start_date + timedelta(days=look_ahead_days)
 
     candidates = {}
-    for ramp_id, ramp in ECM_RAMPS.items():
+    for ramp_id, ramp in (ECM_RAMPS if ramps is None else ramps).items():
         candidates[ramp_id] = []
         # fetch all tides for the window
-        tides_by_date = fetch_noaa_tides_for_range(ramp.noaa_station_id, start_date, end_date)
+        tides_by_date = get_tides(ramp.noaa_station_id, start_date, end_date)
         for d, events in sorted(tides_by_date.items()):
             # look for at least one high tide in your preferred window
             for ev in events:
@@ -1054,116 +791,462 @@ def load_travel_time_matrix(filepath: str = "Town_to_Ramp_Matrix.csv"):
              full_path = filepath
              if not os.path.exists(full_path):
                  _log_debug(f"ERROR: Travel time matrix file not found at {filepath}.")
-                 return
-
-        with open(full_path, mode='r', encoding='utf-8') as infile:
-            reader = csv.reader(infile)
-            header = next(reader) # Skip header row
-            for row in reader:
-                from_town, to_ramp, minutes = row
-                if from_town not in TRAVEL_TIME_MATRIX:
-                    TRAVEL_TIME_MATRIX[from_town] = {}
-                TRAVEL_TIME_MATRIX[from_town][to_ramp] = int(minutes)
-        _log_debug(f"Successfully loaded travel times for {len(TRAVEL_TIME_MATRIX)} towns.")
+                 full_path = None
+
+        if full_path:
+            TRAVEL_TIME_MATRIX.update(read_travel_time_matrix(full_path))
+            _log_debug(f"Successfully loaded travel times for {len(TRAVEL_TIME_MATRIX)} towns.")
     except Exception as e:
         _log_debug(f"ERROR: Failed to load or parse travel time matrix: {e}")
-        
 
-def load_all_data_from_sheets():
-    """Loads all data from Supabase, ensuring consistent string types for IDs."""
-    global SCHEDULED_JOBS, PARKED_JOBS, LOADED_CUSTOMERS, LOADED_BOATS, ECM_TRUCKS, ECM_RAMPS, TRUCK_OPERATING_HOURS, CANDIDATE_CRANE_DAYS
-    try:
-        conn = get_db_connection()
-
-        if SCHEDULED_JOBS is None: SCHEDULED_JOBS = []
-        if PARKED_JOBS is None: PARKED_JOBS = {}
-    
-        # --- Jobs ---
-        query_columns = (
-            "job_id, customer_id, boat_id, service_type, scheduled_start_datetime, scheduled_end_datetime, "
-            "assigned_hauling_truck_id, assigned_crane_truck_id, S17_busy_end_datetime, pickup_ramp_id, dropoff_ramp_id, "
-            "pickup_street_address, dropoff_street_address, job_status, notes, "
-            "pickup_latitude, pickup_longitude, dropoff_latitude, dropoff_longitude"
-        )
-        jobs_resp = execute_query(conn.table("jobs").select(query_columns), ttl=0)
-        all_jobs = [Job(**row) for row in jobs_resp.data] if isinstance(jobs_resp.data, list) else []
+    # Town -> ramp pairs the CSV lacks come from the road matrix, if one was built
+    provider = get_travel_time_provider()
+    if isinstance(provider, RoadTravelTimes):
+        added = 0
+        for town, row in provider.town_ramp_matrix().items():
+            known = TRAVEL_TIME_MATRIX.setdefault(town, {})
+            for ramp_name, minutes in row.items():
+                if ramp_name not in known:
+                    known[ramp_name] = minutes
+                    added += 1
+        _log_debug(f"Added {added} town-to-ramp road travel times.")
         
-        SCHEDULED_JOBS.clear() 
-        SCHEDULED_JOBS.extend([job for job in all_jobs if job.job_status == "Scheduled" and job.scheduled_start_datetime])
-        PARKED_JOBS.clear()
-        PARKED_JOBS.update({job.job_id: job for job in all_jobs if job.job_status == "Parked"})
-
-        # --- Trucks ---
-        trucks_resp = execute_query(conn.table("trucks").select("*"), ttl=0)
-        ECM_TRUCKS.clear()
-        ECM_TRUCKS.update({str(row["truck_id"]): Truck(t_id=row["truck_id"], name=row.get("truck_name"), max_len=row.get("max_boat_length")) for row in trucks_resp.data})
-        name_to_id = {t.truck_name: t.truck_id for t in ECM_TRUCKS.values()}
-
-        # --- Ramps ---
-        ramps_resp = execute_query(conn.table("ramps").select("*"), ttl=0)
-        ECM_RAMPS.clear()
-        for row in ramps_resp.data:
-            try:
-                ramp_id_str = str(int(row["ramp_id"]))
-                allowed_boats_raw = row.get("allowed_boat_types")
-                allowed_boats_list = []
-                if isinstance(allowed_boats_raw, str):
-                    allowed_boats_list = allowed_boats_raw.strip('{}').split(',')
-                elif isinstance(allowed_boats_raw, list):
-                    allowed_boats_list = allowed_boats_raw
-                ECM_RAMPS[ramp_id_str] = Ramp(
-                    r_id=row["ramp_id"], name=row.get("ramp_name"), station=row.get("noaa_station_id"),
-                    tide_method=row.get("tide_calculation_method"), offset=row.get("tide_offset_hours"),
-                    boats=allowed_boats_list, latitude=row.get("latitude"), longitude=row.get("longitude")
-                )
-            except (ValueError, TypeError):
-                _log_debug(f"Skipping ramp with invalid ID: {row.get('ramp_id')}")
 
-        # --- Customers ---
-        cust_resp = execute_query(conn.table("customers").select("*"), ttl=0)
-        LOADED_CUSTOMERS.clear()
-        LOADED_CUSTOMERS.update({int(r["customer_id"]): Customer(c_id=r["customer_id"], name=r.get("Customer", "")) for r in cust_resp.data if r.get("customer_id")})
+def get_travel_time_provider():
+    """The provider behind calculate_travel_time(s): the road matrix at ROAD_TRAVEL_TIMES_PATH, once loaded, else straight-line."""
+    global TRAVEL_TIME_PROVIDER
+    if TRAVEL_TIME_PROVIDER is None:
+        road = RoadTravelTimes.load(ROAD_TRAVEL_TIMES_PATH)
+        TRAVEL_TIME_PROVIDER = road or StraightLineTravelTimes()
+        if road:
+            _log_debug(f"Using road travel times for {len(road)} places from {ROAD_TRAVEL_TIMES_PATH}.")
+    return TRAVEL_TIME_PROVIDER
+
+def set_travel_time_provider(provider):
+    """Swaps the travel-time provider (None: pick again on next use)."""
+    global TRAVEL_TIME_PROVIDER
+    TRAVEL_TIME_PROVIDER = provider
+
+# Seconds each startup step took in the last load_all_data_from_sheets run.
+LOAD_TIMINGS: dict[str, float] = {}
+LOAD_MAX_WORKERS = 6
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # older Streamlit: worker threads just run without the script context
+    add_script_run_ctx = get_script_run_ctx = None
+
+def _fetch_tables_concurrently(fetchers: dict) -> dict:
+    """
+    Runs {name: zero-arg fetch} on a thread pool and returns {name: result},
+    recording each fetch's wall time in LOAD_TIMINGS. Re-raises the first failure.
+    """
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+    def _run(name, fetch):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        t0 = perf_counter()
+        try:
+            return fetch()
+        finally:
+            LOAD_TIMINGS[name] = perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max(1, min(LOAD_MAX_WORKERS, len(fetchers)))) as pool:
+        futures = {name: pool.submit(_run, name, fetch) for name, fetch in fetchers.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def _select_all_rows(conn, table):
+    return execute_query(conn.table(table).select("*"), ttl=0).data
+
+# Only the columns the Customer / Boat models read; the QuickBooks export
+# behind these tables is far wider (Bill to 1..5, Ship to 1..5, ...).
+CUSTOMER_COLUMNS = 'customer_id, "Customer"'
+BOAT_COLUMNS = (
+    "boat_id, customer_id, boat_type, boat_length, boat_draft, storage_address, "
+    "preferred_ramp, preferred_truck, is_ecm_boat, storage_latitude, storage_longitude"
+)
+FETCH_PAGE_SIZE = 1000  # PostgREST's default max-rows, so no page is silently truncated
+
+def _iter_table_pages(conn, table, columns, order_by, page_size=FETCH_PAGE_SIZE):
+    """
+    Yields lists of rows from `table`, page_size at a time via range requests.
+    Falls back to select("*") if the projection names a column the table lacks.
+    """
+    offset = 0
+    while True:
+        query = conn.table(table).select(columns).order(order_by).range(offset, offset + page_size - 1)
+        try:
+            page = execute_query(query, ttl=0).data or []
+        except Exception as e:
+            if columns == "*":
+                raise
+            _log_debug(f"Projected fetch of {table} failed ({e}); retrying with all columns.")
+            columns = "*"
+            continue
+        yield page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+def _boat_from_row(row):
+    pref_ramp_val = row.get("preferred_ramp")
+    pref_ramp_str = str(int(pref_ramp_val)) if pref_ramp_val is not None else ""
+    return Boat(
+        b_id=row["boat_id"], c_id=row["customer_id"], b_type=row.get("boat_type"),
+        b_len=row.get("boat_length"), draft=row.get("boat_draft") or row.get("draft_ft"),
+        storage_addr=row.get("storage_address", ""), pref_ramp=pref_ramp_str,
+        pref_truck=row.get("preferred_truck", ""), is_ecm=str(row.get("is_ecm_boat", "no")).lower() == 'yes',
+        storage_latitude=row.get("storage_latitude"), storage_longitude=row.get("storage_longitude")
+    )
 
-        # --- Boats ---
-        boat_resp = execute_query(conn.table("boats").select("*"), ttl=0)
-        LOADED_BOATS.clear()
-        for row in boat_resp.data:
+def _fetch_customers(conn) -> dict:
+    """{customer_id: Customer}, built page by page from the projected columns."""
+    customers = {}
+    for page in _iter_table_pages(conn, "customers", CUSTOMER_COLUMNS, "customer_id"):
+        customers.update({int(r["customer_id"]): Customer(c_id=r["customer_id"], name=r.get("Customer", "")) for r in page if r.get("customer_id")})
+    return customers
+
+def _fetch_boats(conn) -> dict:
+    """{boat_id: Boat}, built page by page from the projected columns."""
+    boats = {}
+    for page in _iter_table_pages(conn, "boats", BOAT_COLUMNS, "boat_id"):
+        for row in page:
             if not row.get("boat_id"): continue
             try:
-                pref_ramp_val = row.get("preferred_ramp")
-                pref_ramp_str = str(int(pref_ramp_val)) if pref_ramp_val is not None else ""
-                LOADED_BOATS[int(row["boat_id"])] = Boat(
-                    b_id=row["boat_id"], c_id=row["customer_id"], b_type=row.get("boat_type"),
-                    b_len=row.get("boat_length"), draft=row.get("boat_draft") or row.get("draft_ft"),
-                    storage_addr=row.get("storage_address", ""), pref_ramp=pref_ramp_str,
-                    pref_truck=row.get("preferred_truck", ""), is_ecm=str(row.get("is_ecm_boat", "no")).lower() == 'yes',
-                    storage_latitude=row.get("storage_latitude"), storage_longitude=row.get("storage_longitude")
-                )
+                boats[int(row["boat_id"])] = _boat_from_row(row)
             except (ValueError, TypeError):
                 _log_debug(f"Skipping boat with invalid data: {row.get('boat_id')}")
+    return boats
+
+def _fetch_master_tables(conn) -> dict:
+    """Fetches every table the app loads at startup; rows, or built objects for customers/boats."""
+    # The tables don't depend on each other, so fetch them all at once; the
+    # load is then bounded by the slowest table rather than the sum.
+    load_start = perf_counter()
+    fetched = _fetch_tables_concurrently({
+        "jobs": lambda: _fetch_all_job_rows(conn),
+        "customers": lambda: _fetch_customers(conn),
+        "boats": lambda: _fetch_boats(conn),
+        **{table: (lambda table=table: _select_all_rows(conn, table))
+           for table in ("trucks", "ramps", "truck_schedules")},
+    })
+    LOAD_TIMINGS["fetch_total"] = perf_counter() - load_start
+    return fetched
+
+class MasterData:
+    """
+    One load of the master tables -- trucks, ramps, customers, boats, truck
+    hours -- plus the crane days derived from them. Never changed once built:
+    a refresh builds a new MasterData and install_master_data swaps it in
+    whole, so a reader sees either the old load or the new one, never a mix.
+    """
+    __slots__ = (
+        "version", "table_hash", "source", "loaded_at", "trucks", "ramps", "customers", "boats",
+        "truck_hours", "candidate_crane_days", "ideal_crane_days",
+    )
 
-        # --- Truck Schedules ---
-        schedules_resp = execute_query(conn.table("truck_schedules").select("*"), ttl=0)
-        processed_schedules = {}
-        for row in schedules_resp.data:
-            truck_id = name_to_id.get(row["truck_name"])
-            if truck_id is None: continue
-            day = row["day_of_week"]
-            start_time = dt.datetime.strptime(row["start_time"], '%H:%M:%S').time()
-            end_time = dt.datetime.strptime(row["end_time"],   '%H:%M:%S').time()
-            processed_schedules.setdefault(truck_id, {})[day] = (start_time, end_time)
-        
-        TRUCK_OPERATING_HOURS.clear()
-        TRUCK_OPERATING_HOURS.update(processed_schedules)
-        
-        CANDIDATE_CRANE_DAYS.clear()
-        CANDIDATE_CRANE_DAYS.update(generate_crane_day_candidates())
-        precalculate_ideal_crane_days()
-        load_travel_time_matrix()
-    
+    def __init__(self, *, version, table_hash, source, loaded_at, trucks, ramps, customers, boats,
+                 truck_hours, candidate_crane_days, ideal_crane_days):
+        self.version = version
+        self.table_hash = table_hash
+        self.source = source
+        self.loaded_at = loaded_at
+        self.trucks = MappingProxyType(trucks)
+        self.ramps = MappingProxyType(ramps)
+        self.customers = MappingProxyType(customers)
+        self.boats = MappingProxyType(boats)
+        self.truck_hours = MappingProxyType(truck_hours)
+        self.candidate_crane_days = MappingProxyType(candidate_crane_days)
+        self.ideal_crane_days = frozenset(ideal_crane_days)
+
+    def derived(self) -> dict:
+        return {"candidate_crane_days": dict(self.candidate_crane_days), "ideal_crane_days": set(self.ideal_crane_days)}
+
+
+def _build_master_data(fetched: dict, derived: dict | None = None, *, version, source, table_hash,
+                       loaded_at=None) -> MasterData:
+    """
+    Builds a MasterData from fetched tables without touching the module globals.
+    `derived` (crane-day candidates and ideal crane days) is reused if given,
+    otherwise recomputed from the new ramps.
+    """
+    build_start = perf_counter()
+
+    # --- Trucks ---
+    trucks = {str(row["truck_id"]): Truck(t_id=row["truck_id"], name=row.get("truck_name"), max_len=row.get("max_boat_length")) for row in fetched["trucks"]}
+    name_to_id = {t.truck_name: t.truck_id for t in trucks.values()}
+
+    # --- Ramps ---
+    ramps = {}
+    for row in fetched["ramps"]:
+        try:
+            ramp_id_str = str(int(row["ramp_id"]))
+            allowed_boats_raw = row.get("allowed_boat_types")
+            allowed_boats_list = []
+            if isinstance(allowed_boats_raw, str):
+                allowed_boats_list = allowed_boats_raw.strip('{}').split(',')
+            elif isinstance(allowed_boats_raw, list):
+                allowed_boats_list = allowed_boats_raw
+            ramps[ramp_id_str] = Ramp(
+                r_id=row["ramp_id"], name=row.get("ramp_name"), station=row.get("noaa_station_id"),
+                tide_method=row.get("tide_calculation_method"), offset=row.get("tide_offset_hours"),
+                boats=allowed_boats_list, latitude=row.get("latitude"), longitude=row.get("longitude")
+            )
+        except (ValueError, TypeError):
+            _log_debug(f"Skipping ramp with invalid ID: {row.get('ramp_id')}")
+
+    # --- Truck Schedules ---
+    truck_hours = {}
+    for row in fetched["truck_schedules"]:
+        truck_id = name_to_id.get(row["truck_name"])
+        if truck_id is None: continue
+        day = row["day_of_week"]
+        start_time = dt.datetime.strptime(row["start_time"], '%H:%M:%S').time()
+        end_time = dt.datetime.strptime(row["end_time"],   '%H:%M:%S').time()
+        truck_hours.setdefault(truck_id, {})[day] = (start_time, end_time)
+
+    LOAD_TIMINGS["build_objects"] = perf_counter() - build_start
+
+    tides_start = perf_counter()
+    if derived:
+        candidate_crane_days, ideal_crane_days = derived["candidate_crane_days"], derived["ideal_crane_days"]
+    else:
+        candidate_crane_days = generate_crane_day_candidates(ramps=ramps)
+        ideal_crane_days = compute_ideal_crane_days(ramps.values())
+    LOAD_TIMINGS["crane_days"] = perf_counter() - tides_start
+
+    return MasterData(
+        version=version, table_hash=table_hash, source=source,
+        loaded_at=loaded_at or dt.datetime.now(timezone.utc),
+        trucks=trucks, ramps=ramps,
+        # customers / boats were built as their pages arrived
+        customers=dict(fetched["customers"]), boats=dict(fetched["boats"]),
+        truck_hours=truck_hours, candidate_crane_days=candidate_crane_days, ideal_crane_days=ideal_crane_days,
+    )
+
+
+@st.cache_resource
+def _shared_master_data() -> dict:
+    """
+    Process-wide home of the current MasterData, shared by every session and
+    surviving module reloads, with the lock that serialises loads and swaps.
+    """
+    return {
+        "current": None,
+        "lock": threading.RLock(),
+        "versions": itertools.count(1),
+        "status": {"refreshing": False, "last_error": None},
+    }
+
+_INSTALLED_MASTER_VERSION = None   # MasterData.version the module globals below point at
+
+def _bind_master_data(md: MasterData):
+    """Points the module globals at (copies of) md; each is rebound, never edited in place."""
+    global ECM_TRUCKS, ECM_RAMPS, LOADED_CUSTOMERS, LOADED_BOATS, TRUCK_OPERATING_HOURS
+    global CANDIDATE_CRANE_DAYS, IDEAL_CRANE_DAYS, _INSTALLED_MASTER_VERSION
+    ECM_TRUCKS = dict(md.trucks)
+    ECM_RAMPS = dict(md.ramps)
+    LOADED_CUSTOMERS = dict(md.customers)
+    LOADED_BOATS = dict(md.boats)
+    TRUCK_OPERATING_HOURS = dict(md.truck_hours)
+    CANDIDATE_CRANE_DAYS = dict(md.candidate_crane_days)
+    IDEAL_CRANE_DAYS = set(md.ideal_crane_days)
+    _INSTALLED_MASTER_VERSION = md.version
+    invalidate_tide_window_caches()
+    invalidate_schedule_model()   # job locations resolve through the ramps
+    load_travel_time_matrix()
+
+def install_master_data(md: MasterData, jobs_rows=None, holder=None):
+    """Makes md the shared current MasterData (copy-on-write swap) and reloads jobs if rows are given."""
+    holder = holder or _shared_master_data()
+    with holder["lock"]:
+        holder["current"] = md
+        _bind_master_data(md)
+        if jobs_rows is not None:
+            _reload_all_jobs(None, rows=jobs_rows, read_at=md.loaded_at)
+
+def get_master_data() -> MasterData | None:
+    return _shared_master_data()["current"]
+
+def get_master_data_status() -> dict:
+    """Where the current master data came from, and the background refresh state."""
+    holder = _shared_master_data()
+    md = holder["current"]
+    return {
+        "version": md.version if md else None,
+        "source": md.source if md else None,
+        "loaded_at": md.loaded_at if md else None,
+        **holder["status"],
+    }
+
+
+# --- Master data snapshot ---
+# The last good load is pickled to disk with a hash of its tables, so a new
+# process starts from the snapshot at once and reconciles with Supabase in a
+# background thread -- and still starts if the database is briefly down.
+SNAPSHOT_PATH = os.environ.get(
+    "ECM_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ecm_snapshot.pkl")
+)
+SNAPSHOT_FORMAT = 2   # 2: tables stored as their pickled bytes, so the hash is over exactly what was written
+
+def _tables_blob(fetched: dict) -> bytes:
+    return pickle.dumps(fetched, protocol=pickle.HIGHEST_PROTOCOL)
+
+# Primary key of each master table's rows; customers / boats arrive as {id: object}.
+_MASTER_TABLE_KEYS = {
+    "trucks": lambda row: str(row.get("truck_id")),
+    "ramps": lambda row: str(row.get("ramp_id")),
+    "truck_schedules": lambda row: (str(row.get("truck_name")), str(row.get("day_of_week"))),
+}
+
+def _tables_hash(fetched: dict) -> str:
+    """
+    Change-detection hash of the master tables only (not jobs, which change on
+    every save and follow the watermark delta sync), with rows in primary-key
+    order so the server's row order doesn't matter. Computed from a fresh
+    fetch: unpickled objects can re-pickle to different bytes, so a snapshot
+    stores this hash rather than having it recomputed.
+    """
+    canonical = []
+    for table in ("customers", "boats"):
+        objects = fetched.get(table) or {}
+        canonical.append([(str(k), sorted(vars(objects[k]).items())) for k in sorted(objects, key=str)])
+    for table, key in _MASTER_TABLE_KEYS.items():
+        canonical.append(sorted((sorted(row.items()) for row in fetched.get(table) or []),
+                                key=lambda items: key(dict(items))))
+    return hashlib.sha256(pickle.dumps(canonical, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+def write_master_snapshot(fetched: dict, derived: dict, path: str | None = None) -> str | None:
+    """Writes the snapshot atomically; returns its path, or None if it could not be written."""
+    path = path or SNAPSHOT_PATH
+    blob = _tables_blob(fetched)
+    payload = {
+        "format": SNAPSHOT_FORMAT,
+        "hash": hashlib.sha256(blob).hexdigest(),        # integrity of the stored blob
+        "master_hash": _tables_hash(fetched),             # MasterData.table_hash
+        "saved_at": dt.datetime.now(timezone.utc),
+        "built_on": dt.date.today(),
+        "tables": blob,
+        "derived": derived,
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as fh:
+            pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        _log_debug(f"WARNING: could not write master data snapshot {path}: {e}")
+        return None
+
+def read_master_snapshot(path: str | None = None) -> dict | None:
+    """The snapshot payload, or None if missing, from another format, or failing its hash."""
+    path = path or SNAPSHOT_PATH
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as fh:
+            payload = pickle.load(fh)
+    except Exception as e:
+        _log_debug(f"WARNING: could not read master data snapshot {path}: {e}")
+        return None
+    blob = payload.get("tables") if isinstance(payload, dict) else None
+    if (not isinstance(blob, bytes) or payload.get("format") != SNAPSHOT_FORMAT
+            or payload.get("hash") != hashlib.sha256(blob).hexdigest()):
+        _log_debug(f"WARNING: master data snapshot {path} is stale or corrupt; ignoring it.")
+        return None
+    try:
+        payload["tables"] = pickle.loads(blob)
     except Exception as e:
-        st.error(f"Error loading data: {e}")
-        raise
+        _log_debug(f"WARNING: could not read master data snapshot {path}: {e}")
+        return None
+    return payload
+
+def master_data_from_snapshot(snapshot: dict, *, version=0, reuse_derived=True) -> MasterData:
+    """A MasterData over a read_master_snapshot payload; its crane-day tables are recomputed unless reuse_derived."""
+    return _build_master_data(
+        snapshot["tables"], snapshot.get("derived") if reuse_derived else None, version=version, source="snapshot",
+        table_hash=snapshot.get("master_hash"), loaded_at=snapshot["saved_at"],
+    )
+
+def _load_from_supabase(conn, holder):
+    fetched = _fetch_master_tables(conn)
+    md = _build_master_data(fetched, version=next(holder["versions"]), source="supabase", table_hash=_tables_hash(fetched))
+    install_master_data(md, jobs_rows=fetched["jobs"], holder=holder)
+    holder["status"]["last_error"] = None
+    write_master_snapshot(fetched, md.derived())
+
+def _refresh_master_data(conn, holder):
+    try:
+        fetched = _fetch_master_tables(conn)
+        table_hash = _tables_hash(fetched)
+        current = holder["current"]
+        # The jobs were just read in full, so install them: a delta sync can't see rows deleted
+        # since the snapshot. The next run's delta sync catches anything written during the fetch.
+        _reload_all_jobs(None, rows=fetched["jobs"])
+        _JOB_SYNC["refresh_due"] = True
+        if current is not None and table_hash == current.table_hash:
+            holder["status"]["last_error"] = None
+            _log_debug("Background refresh: master data unchanged since snapshot.")
+            return
+        md = _build_master_data(fetched, version=next(holder["versions"]), source="supabase", table_hash=table_hash)
+        install_master_data(md, holder=holder)
+        holder["status"]["last_error"] = None
+        write_master_snapshot(fetched, md.derived())
+        _log_debug(f"Background refresh: reconciled master data with Supabase (v{md.version}).")
+    except Exception as e:
+        # Keep serving what we have; the next refresh tries again.
+        holder["status"]["last_error"] = str(e)
+        _log_debug(f"WARNING: background refresh failed, still on v{getattr(holder['current'], 'version', None)}: {e}")
+    finally:
+        holder["status"]["refreshing"] = False
+
+def refresh_master_data_in_background(conn=None):
+    """Starts a daemon thread that re-fetches everything and swaps it in if it changed."""
+    holder = _shared_master_data()
+    with holder["lock"]:
+        if holder["status"]["refreshing"]:
+            return None
+        holder["status"]["refreshing"] = True
+    try:
+        conn = conn or get_db_connection()
+    except Exception as e:
+        holder["status"].update(refreshing=False, last_error=str(e))
+        _log_debug(f"WARNING: no database connection for background refresh: {e}")
+        return None
+    thread = threading.Thread(target=_refresh_master_data, args=(conn, holder), name="ecm-master-refresh", daemon=True)
+    thread.start()
+    return thread
+
+def load_all_data_from_sheets(use_snapshot: bool = True):
+    """
+    Loads all data from Supabase, ensuring consistent string types for IDs.
+    With a valid on-disk snapshot, loads that instead and refreshes from
+    Supabase in the background.
+    """
+    global SCHEDULED_JOBS, PARKED_JOBS
+    if SCHEDULED_JOBS is None: SCHEDULED_JOBS = []
+    if PARKED_JOBS is None: PARKED_JOBS = {}
+    LOAD_TIMINGS.clear()
+    holder = _shared_master_data()
+
+    snapshot = read_master_snapshot() if use_snapshot else None
+    with holder["lock"]:
+        if snapshot:
+            same_day = snapshot.get("built_on") == dt.date.today()
+            md = master_data_from_snapshot(snapshot, version=next(holder["versions"]), reuse_derived=same_day)
+            install_master_data(md, jobs_rows=snapshot["tables"]["jobs"], holder=holder)
+            _log_debug(f"Loaded master data snapshot from {snapshot['saved_at']:%Y-%m-%d %H:%M}; refreshing in background.")
+        else:
+            try:
+                _load_from_supabase(get_db_connection(), holder)
+            except Exception as e:
+                st.error(f"Error loading data: {e}")
+                raise
+    if snapshot:
+        refresh_master_data_in_background()
+    _log_debug("Startup load: " + ", ".join(f"{name} {secs:.2f}s" for name, secs in LOAD_TIMINGS.items()))
 
     try:
         start = dt.date.today()
@@ -1172,6 +1255,25 @@ def load_all_data_from_sheets():
     except Exception as e:
         _log_debug(f"WARNING: could not build protected windows: {e}")
 
+def ensure_master_data() -> MasterData:
+    """
+    The shared MasterData, loading it only if no session has yet. Call at the
+    top of every run: it is a lookup once loaded, and re-points this module's
+    globals if another session (or a refresh) installed a newer version.
+    """
+    holder = _shared_master_data()
+    with holder["lock"]:
+        md = holder["current"]
+        if md is None:
+            load_all_data_from_sheets()
+            md = holder["current"]
+        elif _INSTALLED_MASTER_VERSION != md.version:
+            _bind_master_data(md)
+    if _JOB_SYNC["last_full"] is None or _JOB_SYNC["refresh_due"]:
+        _JOB_SYNC["refresh_due"] = False   # set by the background refresh
+        fetch_scheduled_jobs()
+    return md
+
 def delete_all_jobs():
     """
     Deletes ALL records from the 'jobs' table in the database.
@@ -1187,8 +1289,9 @@ def delete_all_jobs():
         _log_debug("Successfully deleted all jobs from the database.")
         
         # Also clear the in-memory list to reflect the change immediately
-        global SCHEDULED_JOBS
-        SCHEDULED_JOBS.clear()
+        with _JOBS_LOCK:
+            _replace_jobs([])
+            invalidate_schedule_model()
         
         return True, "Success! All jobs have been permanently deleted from the database."
         
@@ -1198,17 +1301,15 @@ def delete_all_jobs():
         return False, f"Error: Could not delete jobs. Details: {e}"
 
 
+def _job_payload(job):
+    """A Job's row for the jobs table, with datetimes serialized to ISO strings."""
+    return {key: value.isoformat() if isinstance(value, dt.datetime) else value
+            for key, value in job.__dict__.items()}
+
+
 def save_job(job_to_save):
     conn = get_db_connection()
-    job_dict = job_to_save.__dict__
-
-    # Build the payload, serializing datetimes to ISO strings
-    payload = {}
-    for key, value in job_dict.items():
-        if isinstance(value, dt.datetime):
-            payload[key] = value.isoformat()
-        else:
-            payload[key] = value
+    payload = _job_payload(job_to_save)
 
     job_id = payload.get('job_id')
     try:
@@ -1237,6 +1338,75 @@ def save_job(job_to_save):
         st.exception(e)
 
 
+JOB_BULK_CHUNK = 500   # rows per request in save_jobs_bulk
+
+def save_jobs_bulk(jobs, chunk_size=JOB_BULK_CHUNK):
+    """
+    Saves many jobs with one request per chunk_size rows instead of one per job:
+    jobs without a job_id are inserted (their new ids are set on the Job objects),
+    jobs with one are upserted on job_id. Then SCHEDULED_JOBS / PARKED_JOBS are
+    updated in a single pass and the schedule model patched, with no re-fetch.
+    Returns the job ids in the order given; None for jobs whose chunk failed.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return []
+    conn = get_db_connection()
+    failed = set()
+
+    new_jobs = [j for j in jobs if not j.job_id]
+    for start in range(0, len(new_jobs), chunk_size):
+        chunk = new_jobs[start:start + chunk_size]
+        rows = [{k: v for k, v in _job_payload(job).items() if k != 'job_id'} for job in chunk]
+        try:
+            response = conn.table("jobs").insert(rows, returning="representation").execute()
+            for job, row in zip(chunk, response.data):
+                job.job_id = row['job_id']
+        except Exception as e:
+            _log_debug(f"ERROR: Bulk insert of {len(chunk)} jobs failed. Details: {e}")
+            failed.update(map(id, chunk))
+
+    new_ids = set(map(id, new_jobs))
+    existing_jobs = [j for j in jobs if id(j) not in new_ids]
+    for start in range(0, len(existing_jobs), chunk_size):
+        chunk = existing_jobs[start:start + chunk_size]
+        try:
+            conn.table("jobs").upsert([_job_payload(job) for job in chunk], on_conflict="job_id").execute()
+        except Exception as e:
+            _log_debug(f"ERROR: Bulk update of {len(chunk)} jobs failed. Details: {e}")
+            failed.update(map(id, chunk))
+
+    if failed:
+        st.error(f"Database save error for {len(failed)} of {len(jobs)} jobs.")
+    saved = [j for j in jobs if id(j) not in failed and j.job_id]
+    _index_saved_jobs(saved)
+    return [None if id(j) in failed else j.job_id for j in jobs]
+
+def _index_saved_jobs(saved):
+    """Puts freshly saved jobs into SCHEDULED_JOBS / PARKED_JOBS, replacing older copies by job_id."""
+    saved_ids = {job.job_id for job in saved}
+    saved_objs = set(map(id, saved))
+    with _JOBS_LOCK:
+        kept, parked = [], dict(PARKED_JOBS)
+        for job in SCHEDULED_JOBS:
+            if job.job_id in saved_ids and id(job) not in saved_objs:
+                _schedule_model_changed(job, added=False)   # an older copy of a saved job
+            elif id(job) in saved_objs and not (job.job_status == "Scheduled" and job.scheduled_start_datetime):
+                _schedule_model_changed(job, added=False)   # saved as parked/cancelled
+            else:
+                kept.append(job)
+        scheduled = set(map(id, kept))
+        for job in saved:
+            parked.pop(job.job_id, None)
+            if job.job_status == "Scheduled" and job.scheduled_start_datetime:
+                if id(job) not in scheduled:
+                    kept.append(job)
+                    _schedule_model_changed(job, added=True)
+            elif job.job_status == "Parked":
+                parked[job.job_id] = job
+        _replace_jobs(kept, parked)
+
+
 def update_truck_schedule(truck_name, new_hours_dict):
     """Deletes all existing schedule entries for a truck and inserts the new ones."""
     try:
@@ -1284,15 +1454,15 @@ def get_location_coords(address=None, ramp_id=None, boat_id=None, service_type=N
         ramp_obj = get_ramp_details(str(ramp_id))
         if ramp_obj and ramp_obj.latitude is not None and ramp_obj.longitude is not None:
             return (ramp_obj.latitude, ramp_obj.longitude)
-# If ramp exists but is missing coords, try to geocode once
+# If ramp exists but is missing coords, try to geocode once (kept aside: Ramp objects are shared, read-only)
+        if str(ramp_id) in _ramp_coords_cache:
+            return _ramp_coords_cache[str(ramp_id)]
         try:
             if getattr(ramp_obj, "ramp_name", None):
-                q = f"{ramp_obj.ramp_name}, MA"
-                loc = _geocode_with_backoff(_geolocator, q)
-                if loc:
-                    ramp_obj.latitude = float(loc.latitude)
-                    ramp_obj.longitude = float(loc.longitude)
-                    return (ramp_obj.latitude, ramp_obj.longitude)
+                coords = geocode_cached(f"{ramp_obj.ramp_name}, MA")
+                if coords:
+                    _ramp_coords_cache[str(ramp_id)] = coords
+                    return coords
         except Exception as e:
             _log_debug(f"RAMP GEOCODE FAIL for {getattr(ramp_obj,'ramp_name',r_id)}: {e}")
 
@@ -1307,16 +1477,18 @@ def get_location_coords(address=None, ramp_id=None, boat_id=None, service_type=N
             # 2. If no specific coords, use the town center as planned
             town = _get_town_from_address(boat_obj.storage_address)
             if town:
-                # 3. Check our town center cache first
+                # 3. Check our town center cache, then the bundled gazetteer
                 if town in _town_center_coords_cache:
                     return _town_center_coords_cache[town]
-                
-                # 4. If not in cache, geocode the town center and store it
+                coords = town_centroid(town)
+                if coords:
+                    _town_center_coords_cache[town] = coords
+                    return coords
+
+                # 4. If not in cache, geocode the town center (via the on-disk store) and keep it
                 try:
-                    _log_debug(f"Geocoding center of town: {town}")
-                    location = _geocode_with_backoff(_geolocator, f"{town}, MA")
-                    if location:
-                        coords = (location.latitude, location.longitude)
+                    coords = geocode_cached(f"{town}, MA")
+                    if coords:
                         _town_center_coords_cache[town] = coords
                         return coords
                 except Exception as e:
@@ -1332,27 +1504,16 @@ def get_location_coords(address=None, ramp_id=None, boat_id=None, service_type=N
     
 def calculate_travel_time(origin_coords, destination_coords):
     """
-    Estimates travel time in minutes based on straight-line distance.
-    This function makes NO external API calls.
+    Estimates travel time in minutes with the active travel-time provider:
+    road-network times if road_travel_times.npz is present (see
+    build_road_matrix.py), else straight-line distance. This function makes
+    NO external API calls.
     """
-    # If coordinates are missing, return a default travel time.
-    if not origin_coords or not destination_coords:
-        return 15 # Default travel time in minutes
-
-    # Calculate straight-line distance in miles
-    straight_line_distance = _calculate_distance_miles(origin_coords, destination_coords)
-
-    # Estimate actual travel distance by applying a circuitry factor
-    # (e.g., 1.3 means we estimate roads are 30% longer than a straight line)
-    travel_distance_miles = straight_line_distance * 1.3
+    return get_travel_time_provider().minutes(origin_coords, destination_coords)
 
-    # Estimate time based on an average speed (e.g., 35 mph)
-    # (travel_distance / mph) gives hours, * 60 gives minutes
-    average_speed_mph = 35
-    travel_time_minutes = (travel_distance_miles / average_speed_mph) * 60
-
-    # Ensure a minimum travel time for very short distances
-    return max(10, int(travel_time_minutes))
+def calculate_travel_times(origins, destinations):
+    """calculate_travel_time for many legs at once: an array of minutes, one per origin/destination pair."""
+    return get_travel_time_provider().minutes_many(origins, destinations)
     
 def get_customer_details(customer_id):
     return LOADED_CUSTOMERS.get(customer_id)
@@ -1361,51 +1522,6 @@ def get_boat_details(boat_id):
 def get_ramp_details(ramp_id):
     return ECM_RAMPS.get(ramp_id)
 
-def _abbreviate_town(address):
-    if not address: return ""
-    if address.isdigit(): return "Pem"
-    abbr_map = { "pembroke": "Pemb", "Brockton": "Brock", "east bridgewater": "E Bridge", "west bridgewater": "W Bridge", "scituate": "Sci", "green harbor": "Grn Harb", "marshfield": "Mfield", "cohasset": "Coh", "weymouth": "Wey", "plymouth": "Ply", "sandwich": "Sand", "duxbury": "Dux", "humarock": "Hum", "hingham": "Hing", "hull": "Hull", "norwell": "Norw", "boston": "Bos", "quincy": "Qui", "kingston": "King", "hanover": "Hnvr", "rockland": "Rock" }
-    if 'HOME' in address.upper(): return "Pem"
-    address_lower = address.lower()
-    for town, abbr in abbr_map.items():
-        if town in address_lower: return abbr
-    return address.title().split(',')[0][:3]
-
-def _calculate_target_date_score(slot_date, target_date):
-    """
-    Calculates a score based on how close the slot_date is to the target_date.
-    A score of 100 is given for the exact date, with the score decreasing for
-    each day further away.
-    """
-    if target_date is None:
-        return 0 # No score if no target date is provided
-
-    days_difference = abs((slot_date - target_date).days)
-    
-    # Give a high score for the target date and a decreasing score for surrounding days
-    # This formula gives 100 for the target date, 90 for +/- 1 day, 80 for +/- 2 days, etc.
-    score = max(0, 100 - (days_difference * 10))
-    return score
-    
-
-def _calculate_distance_miles(coords1, coords2):
-    """Calculates the Haversine distance between two lat/lon points in miles."""
-    import math
-    if not coords1 or not coords2:
-        return float('inf') # Return a large number if coords are missing
-
-    R = 3958.8 # Earth radius in miles
-    lat1, lon1 = math.radians(coords1[0]), math.radians(coords1[1])
-    lat2, lon2 = math.radians(coords2[0]), math.radians(coords2[1])
-
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-
-    a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-    distance = R * c
-    return distance
 
 def _round_time_to_nearest_quarter_hour(ts):
     """Rounds a datetime object UP to the nearest 15-minute interval."""
@@ -1454,7 +1570,9 @@ def get_parked_job_details(job_id):
 def cancel_job(job_id):
     job_to_cancel = get_job_details(job_id)
     if job_to_cancel:
-        SCHEDULED_JOBS.remove(job_to_cancel)
+        with _JOBS_LOCK:
+            _replace_jobs([j for j in SCHEDULED_JOBS if j is not job_to_cancel])
+            _schedule_model_changed(job_to_cancel, added=False)
         delete_job_from_db(job_id)
         return True
     return False
@@ -1462,9 +1580,11 @@ def cancel_job(job_id):
 def park_job(job_id):
     job_to_park = get_job_details(job_id)
     if job_to_park:
-        SCHEDULED_JOBS.remove(job_to_park)
-        job_to_park.job_status = "Parked"
-        PARKED_JOBS[job_id] = job_to_park
+        with _JOBS_LOCK:
+            _replace_jobs([j for j in SCHEDULED_JOBS if j is not job_to_park])
+            _schedule_model_changed(job_to_park, added=False)
+            job_to_park.job_status = "Parked"
+            _replace_jobs(parked={**PARKED_JOBS, job_id: job_to_park})
         save_job(job_to_park)
         return True
     return False
@@ -1475,76 +1595,21 @@ def get_monthly_tides_for_scituate(year, month):
         start_date = dt.date(year, month, 1)
         _, num_days = calendar.monthrange(year, month)
         end_date = dt.date(year, month, num_days)
-        return fetch_noaa_tides_for_range(scituate_station_id, start_date, end_date)
+        return get_tides(scituate_station_id, start_date, end_date)
     except Exception as e:
         print(f"Error fetching monthly tides: {e}")
         return None
 
-def _parse_annual_tide_file(filepath, begin_date, end_date):
-    """
-    Parses an annual NOAA tide prediction text file for a specific date range.
-    """
-    _log_debug(f"Attempting to parse file: {filepath} for dates {begin_date} to {end_date}")
-    grouped_tides = {}
-    
-    try:
-        with open(filepath, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or not line[0].isdigit():
-                    continue
-
-                parts = line.split()
-                if len(parts) < 6:
-                    continue
-
-                try:
-                    # Capture all necessary parts from the line
-                    date_str = parts[0]
-                    day_of_week_str = parts[1]
-                    time_str = parts[2]
-                    am_pm_str = parts[3]
-                    height_str = parts[4]
-                    type_str = parts[-1]
-
-                    # --- FIX 1 of 2: Include the day of the week in the string to be parsed ---
-                    datetime_to_parse = f"{date_str} {day_of_week_str} {time_str} {am_pm_str}"
-                    
-                    # --- FIX 2 of 2: Add '%a' to the format to handle "Mon", "Tue", etc. ---
-                    tide_dt_obj = dt.datetime.strptime(datetime_to_parse, "%Y/%m/%d %a %I:%M %p")
-                    
-                    # This part remains the same
-                    current_date = tide_dt_obj.date()
-
-                    if begin_date <= current_date <= end_date:
-                        tide_info = {
-                            'type': type_str.upper(),
-                            'time': tide_dt_obj.time(),
-                            'height': float(height_str)
-                        }
-                        grouped_tides.setdefault(current_date, []).append(tide_info)
-
-                except (ValueError, IndexError) as e:
-                    _log_debug(f"--> PARSE ERROR on line: '{line}'. Details: {e}")
-                    continue
-    except FileNotFoundError:
-        _log_debug(f"ERROR: Local tide file not found: {filepath}")
-    except Exception as e:
-        _log_debug(f"ERROR: General error reading local tide file {filepath}: {e}")
-
-    _log_debug(f"Finished parsing. Found {len(grouped_tides)} days with valid tides.")
-    return grouped_tides
-
 @st.cache_data(show_spinner=False, ttl=3600)
 
 def fetch_noaa_tides_for_range(station_id, start_date, end_date):
     # Construct local file path
-    local_filepath = f"tide_data/{station_id}_annual.txt" # Adjust folder name if different
+    local_filepath = _local_tide_filepath(station_id)
 
     # --- MODIFIED LOGIC ---
-    if os.path.exists(local_filepath):
+    if os.path.exists(local_filepath) or os.path.exists(_binary_tide_filepath(station_id)):
         DEBUG_MESSAGES.append(f"DEBUG: Reading tides from local file: {local_filepath}")
-        local_tides = _parse_annual_tide_file(local_filepath, start_date, end_date)
+        local_tides = _indexed_tides_for_range(station_id, start_date, end_date)
         
         # This is the crucial change: only return if the local file actually had data for the range.
         if local_tides:
@@ -1586,6 +1651,7 @@ def fetch_noaa_tides_for_range(station_id, start_date, end_date):
     DEBUG_MESSAGES.append(f"DEBUG: NOAA API URL params: {params}")
     DEBUG_MESSAGES.append(f"DEBUG: Request Headers sent: {headers}")
 
+    import requests
     try:
         resp = _get_retry_session().get(
             "https://api.tidesandcurrents.noaa.gov/api/prod/datagetter",
@@ -1638,11 +1704,9 @@ def fetch_noaa_tides_for_range(station_id, start_date, end_date):
     except Exception as e:
         DEBUG_MESSAGES.append(f"ERROR: General error fetching tides for station {station_id}: {e}")
         return {}
-        
-def get_concise_tide_rule(ramp, boat):
-    if ramp.tide_calculation_method == "AnyTide": return "Any Tide"
-    if ramp.tide_calculation_method == "AnyTideWithDraftRule": return "Any Tide (<5' Draft)" if boat.draft_ft and boat.draft_ft < 5.0 else "3 hrs +/- High Tide (≥5' Draft)"
-    return f"{float(ramp.tide_offset_hours1):g} hrs +/- HT" if ramp.tide_offset_hours1 else "Tide Rule N/A"
+
+# The core tide store falls back to the live NOAA API for ranges the local files miss.
+set_tide_fallback(fetch_noaa_tides_for_range)
 
 def _is_anytide(ramp_id: str) -> bool:
     r = ECM_RAMPS.get(str(ramp_id))
@@ -1695,10 +1759,7 @@ def get_final_schedulable_ramp_times(ramp: Ramp, boat: Boat, tides_for_day: dict
         return expand_tide_window(high_tides, hours=3)
         
 def get_suitable_trucks(boat_len, pref_truck_id=None, force_preferred=False):
-    all_suitable = [t for t in ECM_TRUCKS.values() if not t.is_crane and t.max_boat_length is not None and boat_len <= t.max_boat_length]
-    if force_preferred and pref_truck_id and any(t.truck_name == pref_truck_id for t in all_suitable):
-        return [t for t in all_suitable if t.truck_name == pref_truck_id]
-    return all_suitable
+    return _live_engine().suitable_trucks(boat_len, pref_truck_id, force_preferred)
 
 def _diagnose_failure_reasons(req_date, boat, ramp_obj, truck_hours, force_preferred_truck):
     """Provides a step-by-step diagnostic for scheduling failures."""
@@ -1725,7 +1786,7 @@ def _diagnose_failure_reasons(req_date, boat, ramp_obj, truck_hours, force_prefe
         return reasons
     
     # Step 3: Fetch Tides
-    all_tides = fetch_noaa_tides_for_range(ramp_obj.noaa_station_id, req_date, req_date)
+    all_tides = get_tides(ramp_obj.noaa_station_id, req_date, req_date)
     tides_for_day = all_tides.get(req_date, [])
     reasons.append(f"**Step 3: Fetched Tides for {ramp_obj.ramp_name}**")
     reasons.append(json.dumps([{'type': t['type'], 'time': str(t['time'])} for t in tides_for_day]))
@@ -1760,54 +1821,167 @@ def _diagnose_failure_reasons(req_date, boat, ramp_obj, truck_hours, force_prefe
     return reasons
 
 
+
+SCHEDULE_VERSION = 0
+_SCHEDULE_MODEL = ScheduleModel(lambda **kw: get_location_coords(**kw))
+
+def get_schedule_model() -> ScheduleModel:
+    """
+    The shared ScheduleModel, recompiled from SCHEDULED_JOBS only if it has been
+    invalidated. A recompile builds a new model and swaps it in under
+    _JOBS_LOCK, so a search already holding the old one is not disturbed.
+    """
+    global _SCHEDULE_MODEL
+    model = _SCHEDULE_MODEL
+    if model.version != SCHEDULE_VERSION:
+        with _JOBS_LOCK:
+            if _SCHEDULE_MODEL.version != SCHEDULE_VERSION:
+                fresh = ScheduleModel(lambda **kw: get_location_coords(**kw))
+                fresh.rebuild(SCHEDULED_JOBS)
+                fresh.version = SCHEDULE_VERSION
+                _SCHEDULE_MODEL = fresh
+                _log_debug(f"Compiled schedule v{SCHEDULE_VERSION} from {len(SCHEDULED_JOBS)} jobs.")
+            model = _SCHEDULE_MODEL
+    return model
+
+def invalidate_schedule_model():
+    """Call after SCHEDULED_JOBS is replaced wholesale; the next search recompiles it."""
+    global SCHEDULE_VERSION
+    with _JOBS_LOCK:
+        SCHEDULE_VERSION += 1
+
+def _schedule_model_changed(job, added):
+    """Applies one job change to the model if it is current, else leaves it for a rebuild."""
+    global SCHEDULE_VERSION
+    with _JOBS_LOCK:
+        is_current = _SCHEDULE_MODEL.version == SCHEDULE_VERSION
+        SCHEDULE_VERSION += 1
+        if is_current:
+            if added:
+                _SCHEDULE_MODEL.add_job(job)
+            else:
+                _SCHEDULE_MODEL.remove_job(job)
+            _SCHEDULE_MODEL.version = SCHEDULE_VERSION
+
 def _compile_truck_schedules(jobs):
-    schedule = {}
-    daily_truck_last_location = {} 
+    model = ScheduleModel(get_location_coords)
+    model.rebuild(jobs)
+    return model.compiled, model.daily_last_locations
 
-    sorted_jobs = sorted([j for j in jobs if j.scheduled_start_datetime], 
-                         key=lambda j: j.scheduled_start_datetime)
+def _live_engine() -> SchedulingEngine:
+    """
+    A SchedulingEngine over the loaded master data, SCHEDULED_JOBS and the shared
+    schedule model (recompiled on use if invalidated), geocoding as the app does.
+    Cheap enough to build per call, so it always sees the current globals.
+    """
+    return SchedulingEngine(
+        _master_view(), lambda: SCHEDULED_JOBS, schedule=get_schedule_model, tide_policy=_GLOBAL_TIDE_POLICY,
+        coords=get_location_coords, travel_time_matrix=TRAVEL_TIME_MATRIX, booking_rules=BOOKING_RULES,
+        distances=get_boat_ramp_distances,
+    )
 
-    for job in sorted_jobs:
-        if job.job_status != "Scheduled":
-            continue
+_BOAT_RAMP_DISTANCES = {"key": None, "distances": None}
+
+def get_boat_ramp_distances() -> BoatRampDistances:
+    """The shared boat-to-ramp distance matrix, rebuilt only when the master data or travel matrix changes."""
+    key = (_INSTALLED_MASTER_VERSION, id(LOADED_BOATS), len(LOADED_BOATS), id(ECM_RAMPS), len(ECM_RAMPS),
+           len(TRAVEL_TIME_MATRIX))
+    if _BOAT_RAMP_DISTANCES["key"] != key:
+        build_start = perf_counter()
+        # Only coordinates already on hand (master data, gazetteer, geocode cache); boats and ramps
+        # that would need a live geocode are resolved when a job actually asks for them.
+        coords = StaticCoords(_master_view(), town_centers=_town_center_coords_cache,
+                              geocodes=get_geocode_store(), fallback=None)
+        distances = BoatRampDistances(LOADED_BOATS, ECM_RAMPS, coords, TRAVEL_TIME_MATRIX)
+        _BOAT_RAMP_DISTANCES.update(key=key, distances=distances)
+        _log_debug(f"Built {len(LOADED_BOATS)}x{len(ECM_RAMPS)} boat-to-ramp distances in {perf_counter() - build_start:.2f}s.")
+    return _BOAT_RAMP_DISTANCES["distances"]
+
+def _master_view():
+    return SimpleNamespace(
+        trucks=ECM_TRUCKS, ramps=ECM_RAMPS, boats=LOADED_BOATS, customers=LOADED_CUSTOMERS,
+        truck_hours=TRUCK_OPERATING_HOURS, ideal_crane_days=IDEAL_CRANE_DAYS,
+    )
 
-        job_date = job.scheduled_start_dt.date()
-        job_dropoff_coords = get_location_coords(
-            address=job.dropoff_street_address, 
-            ramp_id=job.dropoff_ramp_id
-        )
-        if not job_dropoff_coords:
-            job_dropoff_coords = get_location_coords(address=YARD_ADDRESS)
-
-        # Process hauling truck
-        hauler_id = getattr(job, 'assigned_hauling_truck_id', None)
-        if hauler_id and job.scheduled_start_datetime and job.scheduled_end_datetime:
-            hauler_id_str = str(hauler_id) #<-- FIX: Ensure key is a string
-            schedule.setdefault(hauler_id_str, []).append((job.scheduled_start_datetime, job.scheduled_end_datetime))
-            
-            current_last_for_hauler = daily_truck_last_location.get(hauler_id_str, {}).get(job_date)
-            if not current_last_for_hauler or job.scheduled_end_datetime > current_last_for_hauler[0]:
-                daily_truck_last_location.setdefault(hauler_id_str, {})[job_date] = (job.scheduled_end_datetime, job_dropoff_coords)
-
-        # Process crane truck
-        crane_id = getattr(job, 'assigned_crane_truck_id', None)
-        crane_end_time = getattr(job, 'S17_busy_end_datetime', None)
-        if crane_id and job.scheduled_start_datetime and crane_end_time:
-            crane_id_str = str(crane_id) #<-- FIX: Ensure key is a string
-            schedule.setdefault(crane_id_str, []).append((job.scheduled_start_datetime, crane_end_time))
-            
-            current_last_for_crane = daily_truck_last_location.get(crane_id_str, {}).get(job_date)
-            if not current_last_for_crane or crane_end_time > current_last_for_crane[0]:
-                daily_truck_last_location.setdefault(crane_id_str, {})[job_date] = (crane_end_time, job_dropoff_coords)
-    
-    return schedule, daily_truck_last_location
-def _count_jobs_on_truck_day(truck_id, date_obj, compiled_schedule):
-    """Counts jobs already on a truck's given day using compiled_schedule."""
-    cnt = 0
-    for busy_start, _ in compiled_schedule.get(str(truck_id), []):
-        if busy_start.date() == date_obj:
-            cnt += 1
-    return cnt
+# --- What-if sandbox ---
+# Simulated bookings made with what_if=True live in st.session_state['what_if_jobs'],
+# layered over SCHEDULED_JOBS for this session only. Nothing is written to the
+# database (or to SCHEDULED_JOBS / the shared schedule model) until
+# commit_what_if_jobs() saves the whole overlay at once.
+
+def get_what_if_jobs() -> list:
+    """This session's uncommitted what-if bookings."""
+    return st.session_state.setdefault('what_if_jobs', [])
+
+def discard_what_if_jobs():
+    st.session_state['what_if_jobs'] = []
+
+def _what_if_engine() -> SchedulingEngine:
+    """
+    A SchedulingEngine over SCHEDULED_JOBS plus the what-if overlay, on its own schedule
+    model. The model is kept in the session and reused until the live schedule
+    (SCHEDULE_VERSION) or the overlay changes, so each run doesn't recompile every job.
+    """
+    overlay = get_what_if_jobs()
+    cached = st.session_state.get('what_if_model')
+    if cached and cached[0] == (SCHEDULE_VERSION, len(overlay)):
+        _, jobs, model = cached
+    else:
+        jobs = SCHEDULED_JOBS + overlay
+        model = ScheduleModel(get_location_coords)
+        model.rebuild(jobs)
+    return SchedulingEngine(
+        _master_view(), jobs, schedule=model, tide_policy=_GLOBAL_TIDE_POLICY,
+        coords=get_location_coords, travel_time_matrix=TRAVEL_TIME_MATRIX, booking_rules=BOOKING_RULES,
+        distances=get_boat_ramp_distances,
+    )
+
+def commit_what_if_jobs():
+    """
+    Saves every what-if booking that still fits the live schedule with save_jobs_bulk
+    and adds them to the live schedule. Each one is re-checked first (ramp tide window,
+    hauler and crane, in start order), since SCHEDULED_JOBS may have changed since it
+    was simulated. Returns (number saved, message); bookings that no longer fit or
+    failed to save stay in the overlay.
+    """
+    jobs = get_what_if_jobs()
+    if not jobs:
+        return 0, "No what-if bookings to commit."
+
+    engine = _live_engine()
+    with _JOBS_LOCK:
+        model = ScheduleModel(get_location_coords)
+        model.rebuild(SCHEDULED_JOBS)
+    fits, conflicts = [], []
+    for job in sorted(jobs, key=lambda j: j.scheduled_start_datetime or dt.datetime.max.replace(tzinfo=timezone.utc)):
+        reason = engine.booking_conflict(job, model.compiled)
+        if reason:
+            conflicts.append(job)
+            _log_debug(f"What-if booking for boat {job.boat_id} on {job.scheduled_start_datetime} no longer fits: {reason}.")
+        else:
+            fits.append(job)
+            model.add_job(job)
+    if not fits:
+        return 0, f"None of the {len(jobs)} what-if bookings fit the current schedule any more; they are still pending."
+
+    try:
+        ids = save_jobs_bulk(fits)
+    except Exception as e:
+        _log_debug(f"ERROR: Failed to commit what-if bookings. Details: {e}")
+        st.error(f"Could not save the what-if bookings: {e}")
+        return 0, f"Error: Could not save the what-if bookings. Details: {e}"
+
+    unsaved = [job for job, job_id in zip(fits, ids) if job_id is None]
+    st.session_state['what_if_jobs'] = conflicts + unsaved
+    saved = len(fits) - len(unsaved)
+    notes = []
+    if conflicts:
+        notes.append(f"{len(conflicts)} no longer fit the current schedule")
+    if unsaved:
+        notes.append(f"{len(unsaved)} could not be saved")
+    if notes:
+        return saved, f"Saved {saved} what-if bookings; {' and '.join(notes)} and are still pending."
+    return saved, f"Saved {saved} what-if bookings."
 
 def _geo_cluster_bonus(slot, daily_last_locations):
     """+2 if pickup near last job location, +1 if near yard for first job, else 0."""
@@ -1844,43 +2018,17 @@ def _geo_cluster_bonus(slot, daily_last_locations):
         pass
     return 0
 
-def _total_jobs_from_compiled_schedule(compiled_schedule):
-    """compiled_schedule is {truck_id: [(start_dt, end_dt), ...]}"""
-    try:
-        return sum(len(v) for v in compiled_schedule.values())
-    except Exception:
-        return 0
-
 def _select_best_slots(all_found_slots, compiled_schedule, daily_last_locations, requested_date, prime_days, k=3):
     """
     Rank slots using the _score_candidate(...) and return top-k.
     """
-    total_now = _total_jobs_from_compiled_schedule(compiled_schedule)
-    after_threshold = total_now >= 25
-
-    scored = []
-    for s in (all_found_slots or []):
-        try:
-            # Pass prime_days to the scoring function
-            sc = _score_candidate(s, compiled_schedule, daily_last_locations, after_threshold=after_threshold, prime_days=prime_days)
-            sc += _calculate_target_date_score(s.get("date"), requested_date)
-        except Exception:
-            sc = float("-inf")
-
-        if sc == float("-inf"):
-            continue
-
-        scored.append((sc, s))
-
-    if not scored:
-        return []
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    k = max(1, int(k or 1))
-    return [s for _, s in scored[:k]]
+    return _live_engine().select_best_slots(all_found_slots, compiled_schedule, daily_last_locations,
+                                            requested_date, prime_days, k=k)
 
 
 def check_truck_availability_optimized(truck_id, start_dt, end_dt, compiled_schedule):
+    if isinstance(compiled_schedule, CompiledSchedule):
+        return compiled_schedule.is_free(truck_id, start_dt, end_dt)
     for busy_start, busy_end in compiled_schedule.get(str(truck_id), []):
         
         if start_dt < busy_end and end_dt > busy_start: return False
@@ -1889,34 +2037,38 @@ def check_truck_availability_optimized(truck_id, start_dt, end_dt, compiled_sche
 # PASTE THIS ENTIRE BLOCK INTO YOUR ECM_scheduler_logic.py FILE
 
 # --- NEW HELPER: Pre-calculates ideal crane days based on tides ---
-def precalculate_ideal_crane_days(year=2025):
+def compute_ideal_crane_days(ramps, year=2025) -> set:
     """
-    Analyzes tides for the entire season and stores optimal crane days.
-    An "ideal" day has a high tide between 10 AM and 2 PM.
-    This should be called once after all ramps are loaded.
+    {(ramp_id, day)} for every day of the season (April to October) with a high
+    tide between 10 AM and 2 PM at a ramp that takes sailboats.
     """
-    global IDEAL_CRANE_DAYS
-    IDEAL_CRANE_DAYS.clear()
-    
+    ideal = set()
     # Filter for ramps that allow sailboats
-    sailboat_ramps = [r for r in ECM_RAMPS.values() if "Sailboat" in str(r.allowed_boat_types)]
+    sailboat_ramps = [r for r in ramps if "Sailboat" in str(r.allowed_boat_types)]
     
     # Define the season (e.g., April to October)
     for month in range(4, 11):
         for ramp in sailboat_ramps:
-            # In a real app, this would use your fetch_noaa_tides_for_range.
-            # For this example, we simulate finding ideal tides.
-            # NOTE: You may need to adapt this to use your actual fetch_noaa_tides_for_range
             start_date = dt.date(year, month, 1)
             end_date = dt.date(year, month, calendar.monthrange(year, month)[1])
-            tides_for_month = fetch_noaa_tides_for_range(ramp.noaa_station_id, start_date, end_date)
+            tides_for_month = get_tides(ramp.noaa_station_id, start_date, end_date)
             
             for day, events in tides_for_month.items():
                 for tide in events:
                     if tide['type'] == 'H' and 10 <= tide['time'].hour < 14:
-                        IDEAL_CRANE_DAYS.add((ramp.ramp_id, day))
+                        ideal.add((ramp.ramp_id, day))
                         # Found a good tide for this day, no need to check other tides on the same day
                         break
+    return ideal
+
+def precalculate_ideal_crane_days(year=2025):
+    """
+    Analyzes tides for the entire season and stores optimal crane days.
+    An "ideal" day has a high tide between 10 AM and 2 PM.
+    This should be called once after all ramps are loaded.
+    """
+    global IDEAL_CRANE_DAYS
+    IDEAL_CRANE_DAYS = compute_ideal_crane_days(ECM_RAMPS.values(), year)
     _log_debug(f"Pre-calculated {len(IDEAL_CRANE_DAYS)} ideal crane days for the season.")
 
 # Precompute protected windows for ~90 days (tweak as needed)
@@ -1947,7 +2099,7 @@ def analyze_travel_distances(scheduled_jobs: List[Job]) -> Dict:
             job_date = job.scheduled_start_datetime.date()
             jobs_by_day_then_truck[job_date][job.assigned_hauling_truck_id].append(job)
 
-    all_distances = []
+    leg_starts, leg_ends = [], []
     yard_coords = get_location_coords(address=YARD_ADDRESS)
 
     # CORRECTED: Iterate through the new daily structure
@@ -1968,8 +2120,8 @@ def analyze_travel_distances(scheduled_jobs: List[Job]) -> Dict:
                 )
                 
                 if last_coords and pickup_coords:
-                    distance = _calculate_distance_miles(last_coords, pickup_coords)
-                    all_distances.append(distance)
+                    leg_starts.append(last_coords)
+                    leg_ends.append(pickup_coords)
                 
                 # This job's dropoff becomes the starting point for the next one on the SAME DAY
                 last_coords = get_location_coords(
@@ -1978,13 +2130,15 @@ def analyze_travel_distances(scheduled_jobs: List[Job]) -> Dict:
                     boat_id=job.boat_id
                 )
 
-    if not all_distances:
+    if not leg_starts:
         return {'avg_distance': 0, 'max_distance': 0, 'over_12_miles_count': 0}
 
+    # Every leg of the season in one vectorized call
+    all_distances = haversine_miles_legs(leg_starts, leg_ends)
     return {
-        'avg_distance': sum(all_distances) / len(all_distances),
-        'max_distance': max(all_distances),
-        'over_12_miles_count': sum(1 for d in all_distances if d > 12)
+        'avg_distance': float(all_distances.mean()),
+        'max_distance': float(all_distances.max()),
+        'over_12_miles_count': int((all_distances > 12).sum())
     }
     
 
@@ -1998,102 +2152,42 @@ def simulate_job_requests(
     start_date_str: str | None = None,
     end_date_str: str | None = None,
     season: str | None = None,
+    what_if: bool = False,
     **kwargs,
 ):
     """
     Generates jobs and attempts to schedule them, returning a summary and a list of failures.
+    Each booking is saved through confirm_and_schedule_job, or with what_if=True kept in
+    this session's what-if overlay (see commit_what_if_jobs); the batch debug log goes to
+    st.session_state['last_batch_debug_log'].
     """
-    global DEBUG_MESSAGES; DEBUG_MESSAGES.clear() # <-- Line 1: ADD THIS
-    import datetime as dt
-    import random as _rnd
+    DEBUG_MESSAGES.clear()
 
     if seed is not None:
-        _rnd.seed(seed)
+        random.seed(seed)
 
-    # Date Generation Logic
-    valid_dates = []
+    start_date = end_date = None
     if start_date_str and end_date_str:
         try:
             start_date = dt.datetime.strptime(start_date_str, "%Y-%m-%d").date()
             end_date = dt.datetime.strptime(end_date_str, "%Y-%m-%d").date()
         except (ValueError, TypeError):
             return "Error: Invalid start or end date format.", []
-    else:
-        season_norm = (season or "fall").strip().lower()
-        months = (5, 6) if season_norm == "spring" else (9, 10)
-        start_date = dt.date(year, months[0], 1)
-        end_date = dt.date(year, months[1], calendar.monthrange(year, months[1])[1])
-
-    current_date = start_date
-    while current_date <= end_date:
-        wd = current_date.weekday()
-        is_sun = (wd == 6)
-        is_sat = (wd == 5)
-        if not is_sun and (not is_sat or current_date.month in (5, 9)):
-            valid_dates.append(current_date)
-        current_date += dt.timedelta(days=1)
-
-    if not valid_dates:
-        return "No valid working dates in the selected range.", []
-
-    # Get available boats
-    scheduled_boat_ids = {j.boat_id for j in SCHEDULED_JOBS}
-    remaining_boats = [b for b in LOADED_BOATS.values() if b.boat_id not in scheduled_boat_ids]
-    if not remaining_boats:
-        return "No remaining boats to schedule.", []
-
-    # --- Generate Requests and Track Failures ---
-    num_to_schedule = min(total_jobs_to_gen, len(remaining_boats))
-    boats_to_schedule = _rnd.sample(remaining_boats, k=num_to_schedule)
-    
-    successful = 0
-    failed_requests = [] # New list to track failures
-    
-    for boat in boats_to_schedule:
-        ramp_id_to_use = boat.preferred_ramp_id
-        if not ramp_id_to_use or not get_ramp_details(ramp_id_to_use):
-            suitable_ramps = list(find_available_ramps_for_boat(boat, ECM_RAMPS))
-            ramp_id_to_use = _rnd.choice(suitable_ramps) if suitable_ramps else None
-        
-        if not ramp_id_to_use:
-            failed_requests.append({'boat_id': boat.boat_id, 'requested_date': 'N/A', 'reason': 'No suitable ramp found'})
-            continue
-
-        random_date = _rnd.choice(valid_dates)
-        request = {
-            "customer_id": boat.customer_id, "boat_id": boat.boat_id, "service_type": service_type,
-            "requested_date_str": random_date.strftime("%Y-%m-%d"),
-            "selected_ramp_id": ramp_id_to_use, "relax_truck_preference": True,
-            "max_distance_miles": st.session_state.get('max_job_distance', 10),
-        }
 
-        slots, _, _, _ = find_available_job_slots(**request)
-        if slots:
-            confirm_and_schedule_job(slots[0])
-            successful += 1
-        else:
-            # Add the failed request to our list
-            failed_requests.append({
-                'boat_id': boat.boat_id,
-                'requested_date': random_date.strftime("%b %d, %Y"),
-                'ramp_name': get_ramp_details(ramp_id_to_use).ramp_name,
-                'reason': 'No slot found in search window'
-            })
-
-    # --- NEW: Calculate final statistics for the new summary message ---
-    total_scheduled_boats = len(SCHEDULED_JOBS)
-    total_boats_in_system = len(LOADED_BOATS)
-    total_remaining_boats = total_boats_in_system - total_scheduled_boats
-    
-    summary = (
-        f"Batch Requested: {num_to_schedule}, "
-        f"Boats Scheduled (this batch): {successful}, "
-        f"Total Boats Remaining: {total_remaining_boats}, "
-        f"Total Boats Scheduled: {total_scheduled_boats}"
+    engine = _what_if_engine() if what_if else _live_engine()
+    overlay_start = len(engine.jobs)
+    summary, failed_requests = engine.simulate_job_requests(
+        total_jobs_to_gen, service_type, year, start_date, end_date, season,
+        rng=random,
+        max_distance_miles=kwargs.get("max_distance_miles", st.session_state.get('max_job_distance', 10)),
+        book=None if what_if else confirm_and_schedule_job,
     )
-    
-    st.session_state['last_batch_debug_log'] = "\n".join(DEBUG_MESSAGES) # <-- Line 2: ADD THIS
-    
+    if what_if:
+        get_what_if_jobs().extend(engine.jobs[overlay_start:])
+        # The engine's jobs and model now match the grown overlay; keep them for the next run
+        st.session_state['what_if_model'] = ((SCHEDULE_VERSION, len(get_what_if_jobs())), engine.jobs, engine.schedule)
+
+    st.session_state['last_batch_debug_log'] = "\n".join(DEBUG_MESSAGES)
     return summary, failed_requests
     
 def analyze_job_distribution(scheduled_jobs, all_boats, all_ramps):
@@ -2151,9 +2245,10 @@ def perform_efficiency_analysis(scheduled_jobs):
     low_utilization_days = 0
     excellent_timing_days = 0
     poor_timing_days = 0
-    total_deadhead_minutes = 0
     total_on_clock_minutes = 0
     total_productive_minutes = 0
+    leg_starts, leg_ends = [], []   # deadhead legs, timed together at the end
+    yard_coords = get_location_coords(address=YARD_ADDRESS)
     
     # 3. Analyze each truck's daily performance
     for date, trucks in daily_truck_schedules.items():
@@ -2184,17 +2279,17 @@ def perform_efficiency_analysis(scheduled_jobs):
             day_productive_minutes = sum((j.scheduled_end_datetime - j.scheduled_start_datetime).total_seconds() / 60 for j in jobs)
             total_productive_minutes += day_productive_minutes
 
-            # Deadhead Calculation
+            # Deadhead legs
             # Leg 1: From yard to the first job
-            yard_coords = get_location_coords(address=YARD_ADDRESS)
-            first_pickup_coords = get_location_coords(address=jobs[0].pickup_street_address, ramp_id=jobs[0].pickup_ramp_id)
-            total_deadhead_minutes += calculate_travel_time(yard_coords, first_pickup_coords)
+            leg_starts.append(yard_coords)
+            leg_ends.append(get_location_coords(address=jobs[0].pickup_street_address, ramp_id=jobs[0].pickup_ramp_id))
 
             # Intermediate Legs: From dropoff of job N to pickup of job N+1
             for i in range(num_jobs - 1):
-                prev_job_dropoff_coords = get_location_coords(address=jobs[i].dropoff_street_address, ramp_id=jobs[i].dropoff_ramp_id)
-                next_job_pickup_coords = get_location_coords(address=jobs[i+1].pickup_street_address, ramp_id=jobs[i+1].pickup_ramp_id)
-                total_deadhead_minutes += calculate_travel_time(prev_job_dropoff_coords, next_job_pickup_coords)
+                leg_starts.append(get_location_coords(address=jobs[i].dropoff_street_address, ramp_id=jobs[i].dropoff_ramp_id))
+                leg_ends.append(get_location_coords(address=jobs[i+1].pickup_street_address, ramp_id=jobs[i+1].pickup_ramp_id))
+
+    total_deadhead_minutes = float(calculate_travel_times(leg_starts, leg_ends).sum()) if leg_starts else 0
 
     # 4. Compile final analysis
     analysis = {
@@ -2244,54 +2339,12 @@ def confirm_and_schedule_job(final_slot: dict, parked_job_to_remove: int = None)
     removes an old parked job if rebooking, and refreshes the in-memory schedule.
     """
     try:
-        # 1. Look up the boat object
-        boat = get_boat_details(final_slot.get('boat_id'))
-        if not boat:
+        # 1-4. Build the Job (times, pickup/dropoff by service type, trucks) from the slot
+        new_job = _live_engine().job_from_slot(final_slot)
+        if new_job is None:
             return None, "Error: Could not find boat details for the selected job."
-
-        # 2. Construct datetime objects
-        #    FIX: Use the 'dt' alias for the datetime module
-        start_dt = dt.datetime.combine(final_slot['date'], final_slot['time'], tzinfo=timezone.utc)
-        
-        # Use the full end datetime from the slot if available, otherwise calculate it
-        end_dt = final_slot.get('scheduled_end_datetime')
-        if not end_dt:
-            rules = BOOKING_RULES.get(boat.boat_type, {'truck_mins': 90})
-            duration = timedelta(minutes=rules['truck_mins'])
-            end_dt = start_dt + duration
-        
-        # Ensure end_dt is timezone-aware
-        if end_dt.tzinfo is None:
-            end_dt = end_dt.replace(tzinfo=timezone.utc)
-
-        # 3. Determine pickup and dropoff locations based on service type
-        service_type = final_slot.get('service_type')
-        pickup_addr, dropoff_addr = "", ""
-        pickup_ramp, dropoff_ramp = None, None
-
-        if service_type == "Launch":
-            pickup_addr = boat.storage_address
-            dropoff_ramp = final_slot.get('ramp_id')
-        elif service_type == "Haul":
-            pickup_ramp = final_slot.get('ramp_id')
-            dropoff_addr = boat.storage_address
-        
-        # 4. Create a complete Job object
-        new_job = Job(
-            customer_id=final_slot.get('customer_id'),
-            boat_id=final_slot.get('boat_id'),
-            service_type=service_type,
-            scheduled_start_datetime=start_dt,
-            scheduled_end_datetime=end_dt,
-            assigned_hauling_truck_id=final_slot.get('truck_id'),
-            assigned_crane_truck_id=get_s17_truck_id() if final_slot.get('S17_needed') else None,
-            S17_busy_end_datetime=final_slot.get('S17_busy_end_datetime'),
-            pickup_ramp_id=pickup_ramp,
-            dropoff_ramp_id=dropoff_ramp,
-            pickup_street_address=pickup_addr,
-            dropoff_street_address=dropoff_addr,
-            job_status="Scheduled"
-        )
+        start_dt = new_job.scheduled_start_datetime
+        service_type = new_job.service_type
 
         # 5. Save the new job to the database
         save_job(new_job) # This will also assign the new job_id back to the object
@@ -2299,10 +2352,18 @@ def confirm_and_schedule_job(final_slot: dict, parked_job_to_remove: int = None)
         # 6. If this was a rebooking, delete the old parked job
         if parked_job_to_remove:
             delete_job_from_db(parked_job_to_remove)
+            with _JOBS_LOCK:
+                _replace_jobs(parked={k: v for k, v in PARKED_JOBS.items() if k != parked_job_to_remove})
             _log_debug(f"Removed old parked job ID: {parked_job_to_remove}")
 
-        # 7. Refresh the global jobs list to reflect the changes immediately
-        fetch_scheduled_jobs()
+        # 7. Patch the in-memory schedule; only re-fetch if the save didn't come back with an id
+        if new_job.job_id is None:
+            fetch_scheduled_jobs()
+        else:
+            with _JOBS_LOCK:
+                if new_job not in SCHEDULED_JOBS:
+                    _replace_jobs(SCHEDULED_JOBS + [new_job])
+                _schedule_model_changed(new_job, added=True)
 
         # 8. Return the new Job ID and a success message
         customer = get_customer_details(new_job.customer_id)
@@ -2329,157 +2390,14 @@ def find_available_job_slots(
     """
     Finds available slots by first searching for the preferred truck, then falling
     back to other trucks. Integrates distance checks into the core search loop.
+    Runs SchedulingEngine.find_slots over the loaded data and the shared schedule model.
     """
+    return _live_engine().find_slots(
+        customer_id, boat_id, service_type, requested_date_str, selected_ramp_id,
+        num_suggestions_to_find=num_suggestions_to_find, tide_policy=tide_policy, **kwargs
+    )
 
-    relax_truck_preference = kwargs.get('relax_truck_preference', False)
-    # If UI didn't pass a value, leave as None; _score_candidate will fallback to DEFAULT_MAX_JOB_DISTANCE_MILES
-    max_distance_miles = kwargs.get('max_distance_miles', None)
-
-    fetch_scheduled_jobs()
-
-    # --- Validation & Initial Setup ---
-    if not requested_date_str:
-        return [], "Please select a target date before searching.", [], False
-    try:
-        requested_date = dt.datetime.strptime(requested_date_str, "%Y-%m-%d").date()
-    except ValueError:
-        return [], f"Date '{requested_date_str}' is not valid.", [], True
-
-    compiled_schedule, daily_last_locations = _compile_truck_schedules(SCHEDULED_JOBS)
-    boat = get_boat_details(boat_id)
-    if not boat:
-        return [], f"Could not find boat ID: {boat_id}", [], True
-    crane_needed = "Sailboat" in (boat.boat_type or "")
-
-    # --- Truck Separation ---
-    all_suitable_trucks = get_suitable_trucks(boat.boat_length)
-    preferred_trucks, other_trucks = [], []
-    if boat.preferred_truck_id:
-        for t in all_suitable_trucks:
-            (preferred_trucks if t.truck_name == boat.preferred_truck_id else other_trucks).append(t)
-    else:
-        other_trucks = all_suitable_trucks
-
-    # --- Candidate Day Windows ---
-    opp_window = [requested_date + dt.timedelta(days=i) for i in range(-7, 8)]
-    if crane_needed:
-        potential = [d for r_id, d in IDEAL_CRANE_DAYS
-                     if str(r_id) == str(selected_ramp_id) and d >= requested_date]
-        early = [d for d in potential if d <= requested_date + dt.timedelta(days=21)]
-        fb_days = sorted(early)[:30]
-        if not fb_days:
-            wider = [d for d in potential if d <= requested_date + dt.timedelta(days=45)]
-            fb_days = sorted(wider)[:30]
-    else:
-        season_end_date = dt.date(requested_date.year, 10, 31)
-        days_to_search = (season_end_date - requested_date).days + 1
-        if days_to_search < 14:
-            days_to_search = 14
-        fb_days = [requested_date + dt.timedelta(days=i) for i in range(days_to_search)]
-
-    span_start = min(fb_days) if fb_days else requested_date
-    span_end = max(fb_days) if fb_days else requested_date
-    station_id = _station_for_ramp_or_scituate(selected_ramp_id)
-    prime_days = get_low_tide_prime_days(station_id, span_start, span_end)
-
-    s17_id = get_s17_truck_id()
-    active_crane_days = {
-        j.scheduled_start_dt.date()
-        for j in SCHEDULED_JOBS
-        if j.scheduled_start_datetime
-        and j.scheduled_start_dt.date() in opp_window
-        and j.assigned_crane_truck_id == str(s17_id)
-        and (str(j.pickup_ramp_id) == str(selected_ramp_id) or str(j.dropoff_ramp_id) == str(selected_ramp_id))
-    }
-
-    opp_days = sorted(list(active_crane_days), key=lambda d: abs((d - requested_date).days))
-    opp_days = order_dates_with_low_tide_bias(requested_date, opp_days, prime_days)
-    fb_days = order_dates_with_low_tide_bias(requested_date, fb_days, prime_days)
-
-    def _run_search(trucks_to_search, search_message_type, requested_date, prime_days):
-        found = []
-        POOL_CAP = max(20, num_suggestions_to_find * 20)
-
-        # Parameters passed into the daily scanner
-        search_params = {
-            "boat": boat,
-            "service_type": service_type,
-            "ramp_id": selected_ramp_id,
-            "crane_needed": crane_needed,
-            "compiled_schedule": compiled_schedule,
-            "customer_id": customer_id,
-            "trucks": trucks_to_search,                 # <-- IMPORTANT: key must be 'trucks'
-            "daily_last_locations": daily_last_locations,
-            "tide_policy": tide_policy,                 # keep tide policy plumbed
-            "max_distance_miles": max_distance_miles,   # <-- thread through for hard limit
-        }
-
-        # Opportunistic (piggyback) days first
-        for day in opp_days:
-            slot = _find_slot_on_day(day, is_opportunistic_search=True, **search_params)
-            if slot:
-                found.append(slot)
-
-        # Then the full fallback search set
-        if len(found) < POOL_CAP:
-            for day in fb_days:
-                slot = _find_slot_on_day(
-                    day,
-                    is_opportunistic_search=(day in active_crane_days),
-                    **search_params
-                )
-                if slot:
-                    found.append(slot)
-
-        if found:
-            best = _select_best_slots(
-                found,
-                compiled_schedule,
-                daily_last_locations,
-                requested_date,
-                prime_days,
-                k=num_suggestions_to_find
-            )
-            return (best, f"Found {len(best)} slot(s) using {search_message_type} truck.")
-        return ([], None)
-
-    # --- Try preferred (or any suitable) trucks first ---
-    found_slots, message = [], None
-    trucks_to_try = preferred_trucks if boat.preferred_truck_id else other_trucks
-    if trucks_to_try:
-        search_type = "preferred" if boat.preferred_truck_id else "any suitable"
-        found_slots, message = _run_search(trucks_to_try, search_type, requested_date, prime_days)
-
-    # --- If nothing, optionally relax preference and try the rest ---
-    if (not found_slots) and relax_truck_preference and other_trucks:
-        found_slots, message = _run_search(other_trucks, "other", requested_date, prime_days)
-
-    if found_slots:
-        return (found_slots, message, [], False)
-
-    return ([], "No slots found after extensive search.", DEBUG_MESSAGES, True)
-
-    
-def find_available_ramps_for_boat(boat, all_ramps):
-    """
-    Finds a list of ramp IDs suitable for a given boat by checking the boat's type
-    against a ramp's allowed boat types.
-    """
-    matching_ramp_ids = []
-    for ramp_id, ramp in all_ramps.items():
-        # This check ensures both objects have the attributes we need, preventing crashes.
-        if hasattr(boat, 'boat_type') and hasattr(ramp, 'allowed_boat_types'):
-            # The 'in' operator checks if the boat's type is in the ramp's list of allowed types
-            if boat.boat_type in ramp.allowed_boat_types:
-                matching_ramp_ids.append(ramp_id)
     
-    # If no specific ramps match (e.g., for a rare boat type),
-    # return all ramps to allow for a manual override in the UI.
-    if not matching_ramp_ids:
-        return list(all_ramps.keys())
-
-    return matching_ramp_ids
-
 def get_S17_crane_grouping_slot(boat, customer, ramp_obj, requested_date, trucks, duration, S17_duration, service_type):
     """
     Attempts to group a sailboat crane job with an existing crane job at the same ramp within ±7 days.
@@ -2565,160 +2483,7 @@ def calculate_ramp_windows(ramp, boat, tide_data, date):
     return windows
 
 
-def _find_slot_on_day(
-    day,
-    *,
-    boat,
-    service_type,
-    ramp_id,
-    crane_needed,
-    compiled_schedule,
-    customer_id,
-    trucks=None,                 # NEW: support caller passing 'trucks'
-    trucks_to_check=None,        # keep backward-compat with existing body
-    daily_last_locations=None,
-    tide_policy=None,
-    max_distance_miles=None,
-    is_opportunistic_search=False,
-):
-    # normalize trucks input
-    if trucks_to_check is None:
-        trucks_to_check = trucks or []
-    if daily_last_locations is None:
-        daily_last_locations = {}
-    
-    """Single-day scanner that integrates time and distance checks."""
-    ramp = get_ramp_details(str(ramp_id))
-    if not ramp:
-        return None
-
-    boat_type = (getattr(boat, "boat_type", "") or "").lower()
-    is_sail = "sail" in boat_type
-    duration_mins = 180 if service_type in ("Launch", "Haul") and is_sail else 90
-    job_duration = timedelta(minutes=duration_mins)
-
-    from datetime import time as _dtime
-    windows = []
-    method = getattr(ramp, "tide_calculation_method", "AnyTide")
-    offset_hours = float(getattr(ramp, "tide_offset_hours1", 0.0) or 0.0)
-    try:
-        draft_ft = float(getattr(boat, "draft_ft", 0.0) or 0.0)
-    except (ValueError, TypeError):
-        draft_ft = 0.0
-    is_shallow_draft = draft_ft <= 5.0
-    tides_today = fetch_noaa_tides_for_range(ramp.noaa_station_id, day, day) or {}
-    highs = [t["time"] for t in tides_today.get(day, []) if t.get("type") == "H" and isinstance(t.get("time"), dt.time)]
-    if method in ("AnyTide", "AnyTideWithDraftRule") and is_shallow_draft:
-        windows = [(_dtime(0, 0), _dtime(23, 59))]
-    elif method == 'HoursAroundHighTide_WithDraftRule':
-        if is_shallow_draft:
-            windows = [(_dtime(0, 0), _dtime(23, 59))]
-        else:
-            if highs and offset_hours > 0:
-                for ht in highs:
-                    start_dt = (dt.datetime.combine(day, ht) - dt.timedelta(hours=offset_hours)).time()
-                    end_dt = (dt.datetime.combine(day, ht) + dt.timedelta(hours=offset_hours)).time()
-                    windows.append((start_dt, end_dt))
-    elif method == 'HoursAroundHighTide':
-        if highs and offset_hours > 0:
-            for ht in highs:
-                start_dt = (dt.datetime.combine(day, ht) - dt.timedelta(hours=offset_hours)).time()
-                end_dt = (dt.datetime.combine(day, ht) + dt.timedelta(hours=offset_hours)).time()
-                windows.append((start_dt, end_dt))
-    if method != "AnyTide" and not windows:
-        return None
 
-    policy = (tide_policy or globals().get("_GLOBAL_TIDE_POLICY") or globals().get("DEFAULT_TIDE_POLICY") or {})
-    step = timedelta(minutes=int(policy.get("scan_step_mins", 15)))
-    rules_map = globals().get("BOOKING_RULES", {}) or {}
-    rules = rules_map.get(getattr(boat, "boat_type", None), {}) or {}
-    crane_minutes = int(rules.get("crane_mins", 0))
-
-    for truck in (trucks_to_check or []):
-        truck_id_str = str(truck.truck_id) 
-        # --- THIS IS THE FIX ---
-        # Use the original integer truck.truck_id for TRUCK_OPERATING_HOURS lookup
-        hours = (TRUCK_OPERATING_HOURS.get(truck.truck_id, {}) or {}).get(day.weekday())
-        if not hours:
-            continue
-            
-        truck_open  = dt.datetime.combine(day, hours[0], tzinfo=timezone.utc)
-        truck_close = dt.datetime.combine(day, hours[1], tzinfo=timezone.utc)
-        reserve_first_slot = timedelta(minutes=90)
-        earliest = truck_open if getattr(boat, "is_ecm_boat", False) else (truck_open + reserve_first_slot)
-        latest_start = truck_close - job_duration
-        if earliest > latest_start:
-            continue
-            
-        candidate_ranges = []
-        if windows:
-            for (w0, w1) in windows:
-                w_start = max(earliest, dt.datetime.combine(day, w0, tzinfo=timezone.utc))
-                w_end   = min(latest_start, dt.datetime.combine(day, w1, tzinfo=timezone.utc))
-                if w_start <= w_end:
-                    candidate_ranges.append((w_start, w_end))
-        else:
-            candidate_ranges.append((earliest, latest_start))
-
-        for (range_start, range_end) in candidate_ranges:
-            start_dt = range_start
-            while start_dt <= range_end:
-                end_dt = start_dt + job_duration
-
-                if max_distance_miles is not None:
-                    # Use the string version of the ID for this dictionary, as we corrected it before
-                    last_loc_info = daily_last_locations.get(truck_id_str, {}).get(day)
-                    if last_loc_info:
-                        last_coords = last_loc_info[1]
-                        if service_type == "Launch":
-                             new_coords = get_location_coords(boat_id=boat.boat_id)
-                        else:
-                             new_coords = get_location_coords(ramp_id=ramp_id)
-                        
-                        if last_coords and new_coords:
-                            distance = _calculate_distance_miles(last_coords, new_coords)
-                            if distance > max_distance_miles:
-                                start_dt += step
-                                continue
-
-                # Use the string version of the ID here as well
-                if not check_truck_availability_optimized(truck_id_str, start_dt, end_dt, compiled_schedule):
-                    start_dt += step
-                    continue
-
-                if not tide_policy_ok(service_type, boat, start_dt, end_dt, windows, policy):
-                    start_dt += step
-                    continue
-
-                crane_end_dt = None
-                if crane_needed and crane_minutes > 0:
-                    s17_id = get_s17_truck_id()
-                    if s17_id:
-                        crane_end_dt = start_dt + timedelta(minutes=crane_minutes)
-                        # And use the string version here
-                        if not check_truck_availability_optimized(str(s17_id), start_dt, crane_end_dt, compiled_schedule):
-                            start_dt += step
-                            continue
-                
-                return {
-                    "is_piggyback": is_opportunistic_search,
-                    "boat_id": boat.boat_id,
-                    "customer_id": customer_id,
-                    "date": day,
-                    "time": start_dt.time(),
-                    "truck_id": truck.truck_id,
-                    "ramp_id": ramp_id,
-                    "service_type": service_type,
-                    "max_distance_miles": max_distance_miles,   # <-- NEW: carry the UI limit into the slot
-                    "S17_needed": bool(crane_needed),
-                    "scheduled_end_datetime": end_dt,
-                    "S17_busy_end_datetime": crane_end_dt,
-                    "tide_rule_concise": get_concise_tide_rule(ramp, boat),
-                    "high_tide_times": highs,
-                    "boat_draft": getattr(boat, "draft_ft", None),
-                }
-
-                slot["max_distance_miles"] = max_distance_miles
-
-                start_dt += step
-    return None
+def _find_slot_on_day(day, **kwargs):
+    """Single-day scanner; see SchedulingEngine.find_slot_on_day for the arguments."""
+    return _live_engine().find_slot_on_day(day, **kwargs)
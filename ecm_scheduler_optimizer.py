@@ -0,0 +1,302 @@
+"""
+Batch optimizer for seasonal launch/haul queues.
+
+Booking one request at a time and taking the top-ranked slot leaves
+half-empty truck-days behind. BatchOptimizer assigns a whole set of pending
+requests together. Each one gets a (truck, day, start, ramp) from the same
+per-truck-day scan the slot search runs, so tide windows, truck hours and
+hauler/crane availability are checked exactly as when booking by hand.
+
+Solutions are compared on, in order:
+  1. requests placed
+  2. truck-days used (hauling trucks plus the S17 crane)
+  3. cost: deadhead miles (yard to the first pickup, each drop-off to the
+     next pickup) + DAY_OFF_MILES per day away from the requested date
+     + OTHER_TRUCK_MILES for not using the boat's preferred truck
+
+The first solution inserts requests in arrival order, each at its cheapest
+truck-day. Ruin-and-recreate local search then improves it until the time
+budget runs out: take the jobs off a thinly used truck-day (plus a few at
+random), re-insert them and the unplaced requests in a random order, and
+keep the result unless it is worse.
+
+Everything happens in memory on the engine's jobs and schedule; the engine
+ends up holding the best solution found.
+"""
+import datetime as dt
+import math
+import random
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from time import perf_counter
+
+from ecm_scheduler_core import _calculate_distance_miles
+from ecm_scheduler_engine import DEFAULT_MAX_JOB_DISTANCE_MILES, YARD_ADDRESS
+
+DAY_OFF_MILES = 2.0       # a day away from the requested date costs as much as 2 deadhead miles
+OTHER_TRUCK_MILES = 5.0   # using a truck other than the boat's preferred one
+DEFAULT_MAX_DAYS = 14     # candidate days per request, taken in the slot search's own order
+LOW_UTILIZATION_JOBS = 2  # perform_efficiency_analysis counts truck-days with <= 2 jobs as low
+
+
+def _miles(a, b) -> float:
+    miles = _calculate_distance_miles(a, b)
+    return miles if math.isfinite(miles) else 0.0
+
+
+class TruckDayRoutes:
+    """
+    Every job's hauling truck-day in start order with that truck-day's deadhead
+    miles, plus the crane truck-days in use. Kept in step with engine.jobs, or
+    laid out over just `jobs` when given.
+    """
+    def __init__(self, engine, jobs=None):
+        self.engine = engine
+        self.yard = engine.coords(address=YARD_ADDRESS)
+        self.routes = defaultdict(list)   # (truck_id, day) -> [(start, pickup, dropoff, job), ...]
+        self.deadhead = {}                # (truck_id, day) -> miles
+        self.crane_days = Counter()       # (crane_truck_id, day) -> jobs
+        self._ends = {}                   # job -> (pickup, dropoff)
+        for job in (engine.jobs if jobs is None else jobs):
+            self.add(job)
+
+    def leg_ends(self, service_type, boat_id, ramp_id):
+        """(pickup, drop-off) coords: boat to ramp for a launch, ramp to boat otherwise."""
+        boat_at = self.engine.coords(boat_id=boat_id) if boat_id is not None else self.yard
+        ramp_at = self.engine.coords(ramp_id=ramp_id) if ramp_id else self.yard
+        return (boat_at, ramp_at) if service_type == "Launch" else (ramp_at, boat_at)
+
+    def _job_ends(self, job):
+        if job not in self._ends:
+            self._ends[job] = self.leg_ends(job.service_type, job.boat_id, job.pickup_ramp_id or job.dropoff_ramp_id)
+        return self._ends[job]
+
+    def _route_miles(self, stops) -> float:
+        miles, here = 0.0, self.yard
+        for _, pickup, dropoff, _ in stops:
+            miles += _miles(here, pickup)
+            here = dropoff
+        return miles
+
+    def add(self, job):
+        if not (job.scheduled_start_datetime and job.assigned_hauling_truck_id):
+            return
+        key = (str(job.assigned_hauling_truck_id), job.scheduled_start_dt.date())
+        pickup, dropoff = self._job_ends(job)
+        stops = self.routes[key]
+        at = bisect_right([s[0] for s in stops], job.scheduled_start_datetime)   # no key= on Python 3.9
+        stops.insert(at, (job.scheduled_start_datetime, pickup, dropoff, job))
+        self.deadhead[key] = self._route_miles(self.routes[key])
+        if job.assigned_crane_truck_id:
+            self.crane_days[(str(job.assigned_crane_truck_id), key[1])] += 1
+
+    def remove(self, job):
+        if not (job.scheduled_start_datetime and job.assigned_hauling_truck_id):
+            return
+        key = (str(job.assigned_hauling_truck_id), job.scheduled_start_dt.date())
+        self.routes[key] = [s for s in self.routes[key] if s[3] is not job]
+        if self.routes[key]:
+            self.deadhead[key] = self._route_miles(self.routes[key])
+        else:
+            del self.routes[key]
+            del self.deadhead[key]
+        if job.assigned_crane_truck_id:
+            crane_key = (str(job.assigned_crane_truck_id), key[1])
+            self.crane_days[crane_key] -= 1
+            if self.crane_days[crane_key] <= 0:
+                del self.crane_days[crane_key]
+
+    def insertion(self, truck_id, day, start, pickup, dropoff):
+        """(opens a new truck-day?, extra deadhead miles) for a job at `start` on truck_id's day."""
+        key = (str(truck_id), day)
+        stops = self.routes.get(key)
+        if not stops:
+            return True, _miles(self.yard, pickup)
+        new_stops = sorted(stops + [(start, pickup, dropoff, None)], key=lambda s: s[0])
+        return False, self._route_miles(new_stops) - self.deadhead[key]
+
+    def truck_days(self) -> int:
+        return len(self.routes) + len(self.crane_days)
+
+    def total_deadhead(self) -> float:
+        return sum(self.deadhead.values())
+
+
+class BatchOptimizer:
+    """
+    Jointly assigns a batch of requests on a SchedulingEngine.
+
+    requests: dicts with boat_id, service_type ("Launch"/"Haul"), requested_date
+    (a date) and ramp_id, already checked against the master data.
+    """
+    def __init__(self, engine, requests, *, max_distance_miles=DEFAULT_MAX_JOB_DISTANCE_MILES,
+                 relax_truck_preference=True, max_days=DEFAULT_MAX_DAYS, seed=0):
+        self.engine = engine
+        self.requests = list(requests)
+        self.max_distance_miles = max_distance_miles
+        self.relax_truck_preference = relax_truck_preference
+        self.max_days = max_days
+        self.rng = random.Random(seed)
+        self.routes = TruckDayRoutes(engine)
+        self.assigned = {}   # request index -> Job
+        self.extra = {}      # request index -> day-off / other-truck miles of its assignment
+        self.slots = {}      # request index -> the slot dict it was booked from
+        self.stats = {"iterations": 0, "accepted": 0}
+
+    # --- one request ---
+
+    def _plan(self, i):
+        """Boat, search plan, trucks (with preference flag) and candidate days for request i.
+        Re-planned on every call: the piggyback crane days move as the batch is booked."""
+        req = self.requests[i]
+        boat = self.engine.boat(req["boat_id"])
+        plan = self.engine.search_plan(boat, req["ramp_id"], req["requested_date"])
+        if boat.preferred_truck_id:
+            trucks = [(t, True) for t in plan["preferred_trucks"]]
+            if self.relax_truck_preference or not trucks:
+                trucks += [(t, False) for t in plan["other_trucks"]]
+        else:
+            trucks = [(t, True) for t in plan["other_trucks"]]
+        days = list(dict.fromkeys(plan["opp_days"] + plan["fb_days"]))[:self.max_days]
+        return boat, plan, trucks, days
+
+    def candidates(self, i):
+        """Every feasible (slot, cost) for request i against the current schedule: the earliest
+        start on each candidate truck-day. cost = (opens a truck-day?, miles)."""
+        req = self.requests[i]
+        boat, plan, trucks, days = self._plan(i)
+        schedule = self.engine.schedule
+        context = self.engine.search_context(
+            boat=boat, service_type=req["service_type"], ramp_id=req["ramp_id"], crane_needed=plan["crane_needed"],
+            daily_last_locations=schedule.daily_last_locations, max_distance_miles=self.max_distance_miles,
+        )
+        pickup, dropoff = self.routes.leg_ends(req["service_type"], boat.boat_id, req["ramp_id"])
+        found = []
+        for day in days:
+            for truck, preferred in trucks:
+                slot = self.engine.find_slot_on_day(
+                    day, boat=boat, service_type=req["service_type"], ramp_id=req["ramp_id"],
+                    crane_needed=plan["crane_needed"], compiled_schedule=schedule.compiled,
+                    customer_id=boat.customer_id, trucks=[truck], daily_last_locations=schedule.daily_last_locations,
+                    max_distance_miles=self.max_distance_miles,
+                    is_opportunistic_search=day in plan["active_crane_days"], context=context,
+                )
+                if not slot:
+                    continue
+                start = dt.datetime.combine(day, slot["time"], tzinfo=dt.timezone.utc)
+                new_day, deadhead = self.routes.insertion(truck.truck_id, day, start, pickup, dropoff)
+                if slot["S17_needed"] and context.s17_id:
+                    new_day = new_day or (str(context.s17_id), day) not in self.routes.crane_days
+                extra = DAY_OFF_MILES * abs((day - req["requested_date"]).days) + (0.0 if preferred else OTHER_TRUCK_MILES)
+                found.append((slot, (int(new_day), deadhead + extra), extra))
+        return found
+
+    def insert(self, i) -> bool:
+        """Books request i at its cheapest candidate; False if it has none."""
+        found = self.candidates(i)
+        if not found:
+            return False
+        slot, _, extra = min(found, key=lambda c: c[1])
+        job = self.engine.book(slot)
+        self.routes.add(job)
+        self.assigned[i], self.extra[i], self.slots[i] = job, extra, slot
+        return True
+
+    def remove(self, i):
+        job = self.assigned.pop(i)
+        self.extra.pop(i)
+        self.slots.pop(i)
+        self.routes.remove(job)
+        self.engine.remove_job(job)
+
+    def _restore(self, i, job, extra, slot):
+        self.engine.add_job(job)
+        self.routes.add(job)
+        self.assigned[i], self.extra[i], self.slots[i] = job, extra, slot
+
+    # --- whole batch ---
+
+    def objective(self):
+        """Larger is better: (placed, -truck-days, -(deadhead + day-off/other-truck miles))."""
+        cost = self.routes.total_deadhead() + sum(self.extra.values())
+        return (len(self.assigned), -self.routes.truck_days(), -round(cost, 6))
+
+    def summary(self) -> dict:
+        routes = self.routes.routes
+        n_jobs = sum(len(stops) for stops in routes.values())
+        return {
+            "placed": len(self.assigned),
+            "unplaced": len(self.requests) - len(self.assigned),
+            "truck_days": self.routes.truck_days(),
+            "hauling_truck_days": len(routes),
+            "jobs_per_truck_day": n_jobs / len(routes) if routes else 0.0,
+            "low_utilization_days": sum(1 for stops in routes.values() if len(stops) <= LOW_UTILIZATION_JOBS),
+            "deadhead_miles": round(self.routes.total_deadhead(), 1),
+            "days_off_requested": sum(abs((self.assigned[i].scheduled_start_dt.date() - self.requests[i]["requested_date"]).days)
+                                      for i in self.assigned),
+        }
+
+    def _ruin(self):
+        """Requests to take out: those on a thinly used truck-day, plus up to 3 at random."""
+        by_day = defaultdict(list)
+        for i, job in self.assigned.items():
+            by_day[(str(job.assigned_hauling_truck_id), job.scheduled_start_dt.date())].append(i)
+        removed = set()
+        if by_day:
+            fewest = min(len(self.routes.routes.get(k, ())) for k in by_day)
+            thin = [k for k in by_day if len(self.routes.routes.get(k, ())) == fewest]
+            key = self.rng.choice(thin) if self.rng.random() < 0.7 else self.rng.choice(list(by_day))
+            removed.update(by_day[key])
+        assigned = list(self.assigned)
+        removed.update(self.rng.sample(assigned, k=min(len(assigned), self.rng.randint(0, 3))))
+        return list(removed)
+
+    def run(self, time_budget_s=10.0) -> dict:
+        """Builds and improves the assignment for up to time_budget_s seconds; returns the stats."""
+        t0 = perf_counter()
+        for i in range(len(self.requests)):
+            self.insert(i)
+        self.stats["initial"] = self.summary()
+        self.stats["construct_seconds"] = perf_counter() - t0
+
+        best = self.objective()
+        while perf_counter() - t0 < time_budget_s and self.requests:
+            removed = self._ruin()
+            if not removed and len(self.assigned) == len(self.requests):
+                break
+            self.stats["iterations"] += 1
+            old = {i: (self.assigned[i], self.extra[i], self.slots[i]) for i in removed}
+            for i in removed:
+                self.remove(i)
+            order = removed + [i for i in range(len(self.requests)) if i not in self.assigned and i not in old]
+            self.rng.shuffle(order)
+            for i in order:
+                self.insert(i)
+
+            current = self.objective()
+            if current >= best:
+                best = current
+                self.stats["accepted"] += 1
+                continue
+            for i in order:
+                if i in self.assigned:
+                    self.remove(i)
+            for i, (job, extra, slot) in old.items():
+                self._restore(i, job, extra, slot)
+
+        self.stats["final"] = self.summary()
+        self.stats["seconds"] = perf_counter() - t0
+        return self.stats
+
+
+def optimize_batch(engine, requests, time_budget_s=10.0, **kwargs):
+    """
+    Jointly assigns `requests` on `engine` within time_budget_s seconds.
+    Returns ({request index: (slot, Job)}, [unplaced request indexes], stats);
+    the engine's jobs and schedule hold the assignment.
+    """
+    optimizer = BatchOptimizer(engine, requests, **kwargs)
+    stats = optimizer.run(time_budget_s)
+    assignments = {i: (optimizer.slots[i], optimizer.assigned[i]) for i in sorted(optimizer.assigned)}
+    unplaced = [i for i in range(len(optimizer.requests)) if i not in optimizer.assigned]
+    return assignments, unplaced, stats
@@ -0,0 +1,192 @@
+"""
+Multi-seed, multi-policy simulation runner.
+
+simulate_job_requests in the app runs one seed at a time against the live
+session's globals. This runner loads the master data snapshot once and
+forks worker processes. Each run (scenario x seed) gets its own in-memory
+SchedulingEngine over the snapshot's scheduled jobs, so runs never see each
+other's bookings. The report gives success rate, jobs per hauling truck-day,
+low-utilization days and deadhead miles per truck-day, as distributions per
+scenario; the last three count only the jobs each run booked, not the
+snapshot's.
+
+A scenario is a tide policy (DEFAULT_TIDE_POLICY with overrides) plus a max
+distance. --policy and --max-distance both repeat; every combination runs
+for every seed.
+
+    python simulate_runner.py [--seeds 20] [--first-seed 0] [--workers N]
+        [--jobs 50] [--service Haul] [--season fall] [--year 2025]
+        [--policy NAME='{"scan_step_mins": 30}' ...] [--max-distance 10 ...]
+        [--snapshot PATH] [--travel-matrix Town_to_Ramp_Matrix.csv] [--json report.json]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import statistics
+import sys
+from time import perf_counter
+
+import ecm_scheduler_logic as ecm
+from batch_schedule import load_snapshot_engine
+from ecm_scheduler_engine import SchedulingEngine
+from ecm_scheduler_optimizer import LOW_UTILIZATION_JOBS, TruckDayRoutes
+
+METRICS = ["success_rate", "jobs_per_truck_day", "low_utilization_days", "deadhead_miles_per_truck_day"]
+
+_BASE = None   # the snapshot's SchedulingEngine; loaded once, inherited by forked workers
+
+
+def _init_worker(snapshot_path, travel_matrix_path):
+    global _BASE
+    if _BASE is None:   # spawn start method: nothing was inherited
+        _BASE = load_snapshot_engine(snapshot_path, travel_matrix_path)
+
+
+def run_one(task) -> dict:
+    """
+    One simulate_job_requests run on a private engine. `task` is a dict (see build_tasks).
+    Utilization and deadhead are measured over the run's own bookings only.
+    """
+    policy = dict(ecm.DEFAULT_TIDE_POLICY, **task["policy"])
+    engine = SchedulingEngine(
+        _BASE.master, list(_BASE.jobs), schedule=_BASE.schedule.copy(), tide_policy=policy,
+        coords=_BASE.coords, travel_time_matrix=_BASE.travel_time_matrix,
+    )
+    t0 = perf_counter()
+    before = len(engine.jobs)
+    _, failed = engine.simulate_job_requests(
+        task["jobs"], task["service_type"], task["year"], season=task["season"],
+        rng=random.Random(task["seed"]), max_distance_miles=task["max_distance"],
+    )
+    booked = engine.jobs[before:]
+    scheduled = len(booked)
+    requested = scheduled + len(failed)
+
+    routes = TruckDayRoutes(engine, booked)
+    n_days = len(routes.routes)
+    n_jobs = sum(len(stops) for stops in routes.routes.values())
+    return {
+        "scenario": task["scenario"], "seed": task["seed"],
+        "requested": requested, "scheduled": scheduled,
+        "success_rate": scheduled / requested if requested else 0.0,
+        "truck_days": n_days,
+        "jobs_per_truck_day": n_jobs / n_days if n_days else 0.0,
+        "low_utilization_days": sum(1 for stops in routes.routes.values() if len(stops) <= LOW_UTILIZATION_JOBS),
+        "deadhead_miles_per_truck_day": routes.total_deadhead() / n_days if n_days else 0.0,
+        "seconds": perf_counter() - t0,
+    }
+
+
+def build_tasks(policies, max_distances, seeds, jobs, service_type, season, year):
+    """One task per (policy, max distance, seed); scenario names read '<policy>@<miles>mi'."""
+    return [
+        {"scenario": f"{name}@{miles:g}mi", "policy": overrides, "max_distance": miles, "seed": seed,
+         "jobs": jobs, "service_type": service_type, "season": season, "year": year}
+        for name, overrides in policies.items()
+        for miles in max_distances
+        for seed in seeds
+    ]
+
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def aggregate(results) -> dict:
+    """{scenario: {runs, metric: {mean, stdev, p10, p50, p90, min, max}}} in first-seen scenario order."""
+    by_scenario = {}
+    for r in results:
+        by_scenario.setdefault(r["scenario"], []).append(r)
+    report = {}
+    for scenario, runs in by_scenario.items():
+        entry = {"runs": len(runs), "seconds": sum(r["seconds"] for r in runs)}
+        for metric in METRICS:
+            values = sorted(r[metric] for r in runs)
+            entry[metric] = {
+                "mean": statistics.fmean(values), "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+                "p10": _quantile(values, 0.10), "p50": _quantile(values, 0.50), "p90": _quantile(values, 0.90),
+                "min": values[0], "max": values[-1],
+            }
+        report[scenario] = entry
+    return report
+
+
+def format_report(report) -> str:
+    lines = []
+    for scenario, entry in report.items():
+        lines.append(f"{scenario} ({entry['runs']} runs, {entry['seconds']:.1f} CPU-s)")
+        for metric in METRICS:
+            m = entry[metric]
+            lines.append(
+                f"  {metric:>30}: mean {m['mean']:8.3f} +/- {m['stdev']:.3f}   "
+                f"p10 {m['p10']:8.3f}  p50 {m['p50']:8.3f}  p90 {m['p90']:8.3f}"
+            )
+    return "\n".join(lines)
+
+
+def _parse_policy(text):
+    name, _, overrides = text.partition("=")
+    if not name or not overrides:
+        raise argparse.ArgumentTypeError(f"expected NAME=JSON, got '{text}'")
+    try:
+        overrides = json.loads(overrides)
+    except json.JSONDecodeError as e:
+        raise argparse.ArgumentTypeError(f"bad JSON for policy '{name}': {e}")
+    unknown = set(overrides) - set(ecm.DEFAULT_TIDE_POLICY)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown tide policy keys: {', '.join(sorted(unknown))}")
+    return name, overrides
+
+
+def main(argv=None):
+    global _BASE
+    parser = argparse.ArgumentParser(description="Run simulate_job_requests over many seeds and policies in parallel.")
+    parser.add_argument("--seeds", type=int, default=20, help="runs per scenario (default: %(default)s)")
+    parser.add_argument("--first-seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--jobs", type=int, default=50, help="requests per run (default: %(default)s)")
+    parser.add_argument("--service", default="Haul", choices=["Launch", "Haul"])
+    parser.add_argument("--season", default="fall", choices=["spring", "fall"])
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--policy", type=_parse_policy, action="append", metavar="NAME=JSON",
+                        help="tide policy overrides on DEFAULT_TIDE_POLICY; repeatable (default: the default policy)")
+    parser.add_argument("--max-distance", type=float, action="append", help="repeatable (default: 10)")
+    parser.add_argument("--snapshot", help=f"master data snapshot (default: {ecm.SNAPSHOT_PATH})")
+    parser.add_argument("--travel-matrix", help="town-to-ramp travel time CSV used for scoring")
+    parser.add_argument("--json", help="also write the aggregated report and every run as JSON")
+    args = parser.parse_args(argv)
+
+    policies = dict(args.policy or [("default", {})])
+    tasks = build_tasks(
+        policies, args.max_distance or [10.0], range(args.first_seed, args.first_seed + args.seeds),
+        args.jobs, args.service, args.season, args.year,
+    )
+
+    load_start = perf_counter()
+    _BASE = load_snapshot_engine(args.snapshot, args.travel_matrix)
+    _BASE.schedule  # compile once in the parent; forked workers inherit it and each run patches a copy
+    print(f"Loaded {len(_BASE.master.boats)} boats and {len(_BASE.jobs)} scheduled jobs in "
+          f"{perf_counter() - load_start:.2f}s; {len(tasks)} runs on {args.workers} workers.")
+
+    start = perf_counter()
+    if args.workers <= 1:
+        results = [run_one(task) for task in tasks]
+    else:
+        method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        with mp.get_context(method).Pool(args.workers, _init_worker, (args.snapshot, args.travel_matrix)) as pool:
+            results = pool.map(run_one, tasks, chunksize=1)
+    elapsed = perf_counter() - start
+
+    report = aggregate(results)
+    print(format_report(report))
+    print(f"{len(results)} runs in {elapsed:.1f}s wall.")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"scenarios": report, "runs": results}, fh, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
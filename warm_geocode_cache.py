@@ -0,0 +1,86 @@
+"""
+Pre-populates the on-disk geocode store (GEOCODE_CACHE_PATH, or
+$ECM_GEOCODE_CACHE_PATH) so the app and batch tools never geocode on the
+request path.
+
+Queries come from the master data snapshot: "<town>, MA" for every boat
+storage town not in the bundled gazetteer (ma_town_centroids.csv), and
+"<ramp name>, MA" for every ramp. Ramps that already have
+coordinates in the ramps table are recorded as-is. Everything else is looked
+up on Nominatim, at most one request per second as its usage policy asks.
+With --no-network only the coordinates already known are recorded, and the
+queries still missing are listed.
+
+    python warm_geocode_cache.py [--snapshot PATH] [--no-network] [--refresh]
+"""
+import argparse
+import sys
+import time
+
+import ecm_scheduler_logic as ecm
+from ecm_scheduler_core import GEOCODE_CACHE_PATH
+from ecm_scheduler_engine import _get_town_from_address, town_centroid
+
+NOMINATIM_MIN_INTERVAL_S = 1.0
+
+
+def warm_queries(master):
+    """({query: known coords or None}) for every storage town and ramp in the master data."""
+    queries = {}
+    for boat in master.boats.values():
+        town = _get_town_from_address(boat.storage_address)
+        if town and not town_centroid(town):   # gazetteer towns never reach the geocoder
+            queries.setdefault(f"{town}, MA", None)
+    for ramp in master.ramps.values():
+        if not ramp.ramp_name:
+            continue
+        known = (ramp.latitude, ramp.longitude) if ramp.latitude is not None and ramp.longitude is not None else None
+        queries[f"{ramp.ramp_name}, MA"] = known
+    return queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill the geocode cache from the master data snapshot.")
+    parser.add_argument("--snapshot", help=f"master data snapshot (default: {ecm.SNAPSHOT_PATH})")
+    parser.add_argument("--no-network", action="store_true", help="record known coordinates only; never call Nominatim")
+    parser.add_argument("--refresh", action="store_true", help="look queries up again even if already cached")
+    args = parser.parse_args(argv)
+
+    snapshot = ecm.read_master_snapshot(args.snapshot)
+    if snapshot is None:
+        raise SystemExit(f"No usable master data snapshot at {args.snapshot or ecm.SNAPSHOT_PATH}; open the app once to write one.")
+    master = ecm.master_data_from_snapshot(snapshot)
+    store = ecm.get_geocode_store()
+    if store is None:
+        raise SystemExit(f"Cannot open the geocode cache at {GEOCODE_CACHE_PATH}.")
+
+    queries = warm_queries(master)
+    recorded, looked_up, missing, last_call = 0, 0, [], 0.0
+    for query, known in sorted(queries.items()):
+        if known:
+            store.put(query, known, source="ramps table")
+            recorded += 1
+            continue
+        if query in store and not args.refresh:
+            continue
+        if args.no_network:
+            missing.append(query)
+            continue
+        time.sleep(max(0.0, last_call + NOMINATIM_MIN_INTERVAL_S - time.monotonic()))
+        last_call = time.monotonic()
+        loc = ecm._geocode_with_backoff(ecm._get_geolocator(), query)
+        coords = (float(loc.latitude), float(loc.longitude)) if loc else None
+        store.put(query, coords)
+        looked_up += 1
+        if coords is None:
+            missing.append(query)
+
+    print(f"{len(queries)} queries: {recorded} recorded from the ramps table, {looked_up} looked up, "
+          f"{len(store)} entries in {store.path}.")
+    if missing:
+        print("Still without coordinates:\n  " + "\n  ".join(missing))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())